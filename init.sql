@@ -1,27 +1,182 @@
 -- init.sql
+-- Runs automatically only when the database volume is first created. Every
+-- statement is idempotent: run this file again with psql to upgrade an
+-- existing database (see "Database Schema" in the README).
 CREATE EXTENSION IF NOT EXISTS vector;
+-- Lets the cache warmer load vector indexes into shared buffers
+CREATE EXTENSION IF NOT EXISTS pg_prewarm;
+
+-- Collections (tenants); each one stores its chunks in its own partition
+CREATE TABLE IF NOT EXISTS collections (
+    id SERIAL PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    index_type TEXT NOT NULL DEFAULT 'hnsw',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Collection 1 holds documents uploaded without a collection
+INSERT INTO collections (id, name) VALUES (1, 'default') ON CONFLICT (id) DO NOTHING;
+SELECT setval(pg_get_serial_sequence('collections', 'id'), GREATEST((SELECT max(id) FROM collections), 1));
 
 -- Documents table
 CREATE TABLE IF NOT EXISTS documents (
     id SERIAL PRIMARY KEY,
     filename TEXT,
+    job_id TEXT UNIQUE,
+    collection_id INTEGER NOT NULL DEFAULT 1 REFERENCES collections(id),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- Chunks table with vector support
+-- Existing databases: ingestion job that created each document
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS job_id TEXT;
+CREATE UNIQUE INDEX IF NOT EXISTS documents_job_id_key ON documents (job_id);
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS collection_id INTEGER NOT NULL DEFAULT 1 REFERENCES collections(id);
+CREATE INDEX IF NOT EXISTS documents_collection_id_idx ON documents (collection_id);
+-- Earlier uploads of a file, to reuse their chunks (see DocumentStore.find_previous_version)
+CREATE INDEX IF NOT EXISTS documents_collection_filename_idx ON documents (collection_id, filename);
+
+-- Docling conversion output, stored once per document as compressed JSON
+CREATE TABLE IF NOT EXISTS document_conversions (
+    document_id INTEGER PRIMARY KEY REFERENCES documents(id) ON DELETE CASCADE,
+    format_version INTEGER NOT NULL,
+    docling_version TEXT,
+    encoding TEXT NOT NULL,
+    payload BYTEA NOT NULL,
+    raw_size INTEGER,
+    stored_size INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Existing databases: move the unpartitioned chunks table aside so it can
+-- be copied into the partitioned one below
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_class WHERE relname = 'chunks' AND relkind = 'r') THEN
+        ALTER TABLE chunks ADD COLUMN IF NOT EXISTS chunk_hash TEXT;
+        ALTER TABLE chunks ADD COLUMN IF NOT EXISTS embedding_model TEXT;
+        DROP INDEX IF EXISTS chunks_embedding_idx;
+        DROP INDEX IF EXISTS chunks_document_hash_idx;
+        ALTER TABLE chunks RENAME CONSTRAINT chunks_pkey TO chunks_unpartitioned_pkey;
+        ALTER TABLE chunks RENAME TO chunks_unpartitioned;
+    END IF;
+END $$;
+
+-- Chunks table with vector support, partitioned by collection so scoped
+-- searches only touch (and only keep in memory) their own partition's index
 CREATE TABLE IF NOT EXISTS chunks (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
+    collection_id INTEGER NOT NULL DEFAULT 1,
     document_id INTEGER REFERENCES documents(id),
     chunk_text TEXT,
     embedding vector(1536),
     page_numbers INTEGER[],
     metadata JSONB,
+    -- Content hash and embedding model of each chunk, so unchanged chunks of
+    -- a re-ingested document keep their embeddings
+    chunk_hash TEXT,
+    embedding_model TEXT,
+    -- Section (chunk_parents) the chunk belongs to
+    parent_id INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (collection_id, id)
+) PARTITION BY LIST (collection_id);
+
+-- Existing databases: chunks created before parent sections
+ALTER TABLE chunks ADD COLUMN IF NOT EXISTS parent_id INTEGER;
+
+CREATE INDEX IF NOT EXISTS chunks_document_hash_idx ON chunks (document_id, chunk_hash);
+
+-- Partition of the default collection; others are created with their
+-- collection (see storage/collections.py)
+CREATE TABLE IF NOT EXISTS chunks_c1 PARTITION OF chunks FOR VALUES IN (1);
+CREATE INDEX IF NOT EXISTS chunks_c1_embedding_idx
+ON chunks_c1 USING hnsw (embedding vector_cosine_ops);
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_class WHERE relname = 'chunks_unpartitioned') THEN
+        INSERT INTO chunks (id, collection_id, document_id, chunk_text, embedding, page_numbers,
+                            metadata, chunk_hash, embedding_model, created_at)
+        SELECT c.id, COALESCE(d.collection_id, 1), c.document_id, c.chunk_text, c.embedding, c.page_numbers,
+               c.metadata, c.chunk_hash, c.embedding_model, c.created_at
+        FROM chunks_unpartitioned c LEFT JOIN documents d ON d.id = c.document_id;
+        PERFORM setval(pg_get_serial_sequence('chunks', 'id'),
+                       GREATEST((SELECT max(id) FROM chunks), 1));
+        DROP TABLE chunks_unpartitioned;
+    END IF;
+END $$;
+
+-- Parent sections: consecutive chunks of the same section, returned with
+-- search results for context; only their chunks are embedded
+CREATE TABLE IF NOT EXISTS chunk_parents (
+    id SERIAL PRIMARY KEY,
+    document_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    parent_text TEXT NOT NULL,
+    page_numbers INTEGER[],
+    metadata JSONB,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- Create an index for similarity search
-CREATE INDEX IF NOT EXISTS chunks_embedding_idx 
-ON chunks USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100);
+CREATE INDEX IF NOT EXISTS chunk_parents_document_id_idx ON chunk_parents (document_id);
+
+-- How often each document appeared in search results, decayed over time
+-- (see rag/hot_documents.py); the cache warmer loads the hottest ones
+CREATE TABLE IF NOT EXISTS document_heat (
+    document_id INTEGER PRIMARY KEY REFERENCES documents(id) ON DELETE CASCADE,
+    heat DOUBLE PRECISION NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Existing databases: query_heat was keyed on the raw query text, which
+-- fails for long queries; the counts are rebuilt by later searches
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_class WHERE relname = 'query_heat' AND relkind = 'r')
+       AND NOT EXISTS (SELECT 1 FROM information_schema.columns
+                       WHERE table_name = 'query_heat' AND column_name = 'query_hash') THEN
+        DROP TABLE query_heat;
+    END IF;
+END $$;
+
+-- Most frequent search queries with their embedding, replayed by the cache
+-- warmer to seed the query cache. query_hash is the SHA-256 of the query text
+-- and filters (the search filters as JSON); the text itself is only kept,
+-- truncated, with HOT_QUERIES_TEXT_CHARS > 0
+CREATE TABLE IF NOT EXISTS query_heat (
+    query_hash TEXT PRIMARY KEY,
+    query TEXT,
+    filters JSONB NOT NULL,
+    embedding vector NOT NULL,
+    embedding_model TEXT NOT NULL,
+    heat DOUBLE PRECISION NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Table statistics when each maintained index was last rebuilt, to measure
+-- how far the data has drifted since
+CREATE TABLE IF NOT EXISTS index_maintenance (
+    index_name TEXT PRIMARY KEY,
+    rows_at_rebuild BIGINT NOT NULL,
+    changes_at_rebuild BIGINT NOT NULL,
+    rebuilt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Progress of re-chunk / re-embed migrations, resumable by name
+CREATE TABLE IF NOT EXISTS chunk_migrations (
+    id SERIAL PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    config JSONB,
+    status TEXT NOT NULL,
+    last_document_id INTEGER NOT NULL DEFAULT 0,
+    documents_total INTEGER NOT NULL DEFAULT 0,
+    documents_done INTEGER NOT NULL DEFAULT 0,
+    documents_skipped INTEGER NOT NULL DEFAULT 0,
+    chunks_written INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP
+);
 
 
 -- When implementing S3 uploads:
@@ -0,0 +1,164 @@
+# processing-service/benchmarks/embedding_benchmark.py
+"""
+Local embedding throughput benchmark
+
+Embeds a synthetic corpus of texts with varied lengths through
+OnnxEmbeddingProvider, the way TextEmbedder does (fixed-size calls from one
+or more concurrent callers), and reports texts/s, tokens/s, call latency and
+padding overhead for each worker/thread configuration. No database or
+network is needed. Results are written as JSON so runs can be compared
+across commits and machines.
+
+Usage (from processing-service/):
+    python benchmarks/embedding_benchmark.py --model-dir models/all-MiniLM-L6-v2
+    python benchmarks/embedding_benchmark.py --config 1x4 --config 4x1 --config 8x1
+    python benchmarks/embedding_benchmark.py --no-bucketing --output bench/embed-nobucket.json
+    python benchmarks/embedding_benchmark.py --concurrency 16 --call-size 1
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from dotenv import load_dotenv
+
+from synthetic_pdf import WORDS
+from embeddings.local import OnnxEmbeddingProvider
+
+
+def parse_config(value: str) -> Tuple[int, int]:
+    """Parse a --config argument of the form workers x threads, e.g. 4x1"""
+    workers, threads = value.lower().split('x')
+    return int(workers), int(threads)
+
+
+def synthetic_texts(count: int, min_words: int, max_words: int, seed: int) -> List[str]:
+    """Texts with lengths spread like chunks: many short, some close to the limit"""
+    rng = random.Random(seed)
+    return [
+        ' '.join(rng.choice(WORDS) for _ in range(int(rng.triangular(min_words, max_words, min_words))))
+        for _ in range(count)
+    ]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True).strip()
+    except Exception:
+        return 'unknown'
+
+
+def run_config(provider: OnnxEmbeddingProvider, texts: List[str], call_size: int,
+               concurrency: int, repeat: int) -> Dict[str, Any]:
+    """Embed the corpus `repeat` times and measure throughput and call latency"""
+    calls = [texts[start:start + call_size] for start in range(0, len(texts), call_size)]
+
+    def timed_call(batch):
+        start = time.perf_counter()
+        _, tokens = provider.embed(batch)
+        return (time.perf_counter() - start) * 1000, tokens
+
+    # Warm up the session's allocations before measuring
+    provider.embed(texts[:call_size])
+
+    runs = []
+    for i in range(repeat):
+        before = provider.stats()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(timed_call, calls))
+        wall = time.perf_counter() - start
+        after = provider.stats()
+
+        latencies = np.array([latency for latency, _ in results])
+        tokens = sum(tokens for _, tokens in results)
+        padded = after['padded_tokens'] - before['padded_tokens']
+        run = {
+            'wall_seconds': round(wall, 3),
+            'texts_per_second': round(len(texts) / wall, 1),
+            'tokens_per_second': round(tokens / wall, 1),
+            'batches': after['batches'] - before['batches'],
+            'padding_overhead': round(padded / max(after['tokens'] - before['tokens'], 1) - 1, 4),
+            'call_latency_ms': {
+                'p50': round(float(np.percentile(latencies, 50)), 2),
+                'p99': round(float(np.percentile(latencies, 99)), 2)
+            }
+        }
+        runs.append(run)
+        print(f"  run {i + 1}/{repeat}: {run['texts_per_second']} texts/s, {run['tokens_per_second']} tokens/s, "
+              f"{run['batches']} batches, padding +{run['padding_overhead']:.1%}, latency {run['call_latency_ms']}")
+
+    best = max(runs, key=lambda run: run['texts_per_second'])
+    return {'runs': runs, 'best': best}
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Local ONNX embedding throughput benchmark")
+    parser.add_argument('--model-dir', help="Model directory (defaults to ONNX_MODEL_DIR)")
+    parser.add_argument('--config', action='append', type=parse_config, dest='configs',
+                        help="workers x intra-op threads, e.g. 4x1 (repeatable, defaults to the env settings)")
+    parser.add_argument('--texts', type=int, default=2000, help="Texts in the corpus")
+    parser.add_argument('--min-words', type=int, default=10)
+    parser.add_argument('--max-words', type=int, default=250)
+    parser.add_argument('--call-size', type=int, default=None,
+                        help="Texts per embed() call (defaults to the provider's preferred batch size, like TextEmbedder)")
+    parser.add_argument('--concurrency', type=int, default=1, help="Concurrent callers")
+    parser.add_argument('--max-batch-tokens', type=int, default=None)
+    parser.add_argument('--no-bucketing', action='store_true', help="Batch texts in arrival order")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write machine-readable results to this JSON file")
+    args = parser.parse_args()
+
+    texts = synthetic_texts(args.texts, args.min_words, args.max_words, args.seed)
+    results = {
+        'benchmark': 'embedding',
+        'commit': git_commit(),
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'texts': args.texts,
+        'concurrency': args.concurrency,
+        'bucketing': not args.no_bucketing,
+        'configurations': []
+    }
+
+    for workers, threads in args.configs or [(None, None)]:
+        provider = OnnxEmbeddingProvider(
+            model_dir=args.model_dir, workers=workers, threads=threads,
+            max_batch_tokens=args.max_batch_tokens, bucketing=not args.no_bucketing
+        )
+        print(f"\n{provider.model}: {provider.workers} workers x {provider.threads} threads, "
+              f"max {provider.max_batch_tokens} padded tokens per batch")
+        call_size = args.call_size or provider.preferred_batch_size
+        try:
+            entry = run_config(provider, texts, call_size, args.concurrency, args.repeat)
+        finally:
+            provider.close()
+        entry.update({'model': provider.model, 'workers': provider.workers, 'threads': provider.threads,
+                      'max_batch_tokens': provider.max_batch_tokens, 'call_size': call_size})
+        results['configurations'].append(entry)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
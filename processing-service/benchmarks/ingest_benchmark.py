@@ -0,0 +1,261 @@
+# processing-service/benchmarks/ingest_benchmark.py
+"""
+Offline ingestion benchmark
+
+Generates a synthetic PDF corpus and runs each document through
+DocumentProcessor.process_document against the configured Postgres
+(DB_* environment variables), with deterministic fake embeddings and no
+status notifications. Reports pages/s, chunks/s, peak RSS and per-stage
+time, and writes the results as JSON so runs can be compared across commits.
+
+Usage (from processing-service/):
+    python benchmarks/ingest_benchmark.py --output bench/ingest-$(git rev-parse --short HEAD).json
+    python benchmarks/ingest_benchmark.py --case big:300:450:20 --repeat 1
+    python benchmarks/ingest_benchmark.py --compare bench/ingest-abc123.json
+    python benchmarks/ingest_benchmark.py --extraction full --output bench/full.json
+    python benchmarks/ingest_benchmark.py --extraction auto --compare bench/full.json
+    python benchmarks/ingest_benchmark.py --case big:300:450:20 --shard-pages 50 --max-parallel 4
+    EMBEDDING_RPM_LIMIT=50 python benchmarks/ingest_benchmark.py --embedding-rpm-limit 60
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import statistics
+import subprocess
+import tempfile
+from typing import Dict, Any, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from dotenv import load_dotenv
+from prometheus_client import REGISTRY
+
+from synthetic_pdf import generate_pdf
+from embeddings.providers import FakeEmbeddingProvider
+from notifier.notifier import NullNotifier
+from process_pipeline.embed import TextEmbedder
+from process_pipeline.extract import EXTRACTION_MODES
+from process_pipeline.processor import DocumentProcessor
+from storage.db_manager import get_db_manager
+
+STAGES = ('extract', 'chunk', 'embed', 'store')
+
+# name: (pages, words per page, tables)
+DEFAULT_CASES = {
+    'small': (5, 350, 1),
+    'medium': (30, 400, 5),
+    'large': (120, 450, 15),
+}
+
+BENCHMARK_PREFIX = 'benchmark-'
+
+
+def parse_case(value: str):
+    """Parse a --case argument of the form name:pages:words_per_page:tables"""
+    name, pages, words, tables = value.split(':')
+    return name, (int(pages), int(words), int(tables))
+
+
+def stage_totals() -> Dict[str, float]:
+    """Cumulative seconds spent per pipeline stage in this process"""
+    return {
+        stage: REGISTRY.get_sample_value('pipeline_stage_duration_seconds_sum', {'stage': stage}) or 0.0
+        for stage in STAGES
+    }
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True).strip()
+    except Exception:
+        return 'unknown'
+
+
+def run_case(processor: DocumentProcessor, workdir: str, name: str,
+             pages: int, words_per_page: int, tables: int, repeat: int,
+             extraction: Dict = None) -> Dict[str, Any]:
+    """Generate one synthetic document and process it `repeat` times"""
+    path = generate_pdf(
+        os.path.join(workdir, f"{BENCHMARK_PREFIX}{name}.pdf"),
+        pages=pages, words_per_page=words_per_page, tables=tables, seed=pages
+    )
+
+    runs = []
+    for i in range(repeat):
+        before = stage_totals()
+        start = time.perf_counter()
+        result = processor.process_document(
+            file_id=f"{BENCHMARK_PREFIX}{name}-{i}",
+            file_path=path,
+            metadata={'filename': os.path.basename(path)},
+            extraction=extraction
+        )
+        wall = time.perf_counter() - start
+        after = stage_totals()
+        chunks = result['document_info']['num_chunks']
+
+        run = {
+            'wall_seconds': round(wall, 3),
+            'chunks': chunks,
+            'pages_per_second': round(pages / wall, 3),
+            'chunks_per_second': round(chunks / wall, 3),
+            'stage_seconds': {stage: round(after[stage] - before[stage], 3) for stage in STAGES},
+            'peak_rss_mb': round(peak_rss_mb(), 1)
+        }
+        runs.append(run)
+        print(f"  {name} run {i + 1}/{repeat}: {wall:.2f}s, {run['pages_per_second']} pages/s, "
+              f"{run['chunks_per_second']} chunks/s, stages {run['stage_seconds']}")
+
+    def median(key):
+        return round(statistics.median(run[key] for run in runs), 3)
+
+    return {
+        'name': name,
+        'pages': pages,
+        'words_per_page': words_per_page,
+        'tables': tables,
+        'file_size_bytes': os.path.getsize(path),
+        'runs': runs,
+        'median': {
+            'wall_seconds': median('wall_seconds'),
+            'pages_per_second': median('pages_per_second'),
+            'chunks_per_second': median('chunks_per_second'),
+            'stage_seconds': {
+                stage: round(statistics.median(run['stage_seconds'][stage] for run in runs), 3)
+                for stage in STAGES
+            }
+        },
+        'peak_rss_mb': max(run['peak_rss_mb'] for run in runs)
+    }
+
+
+def cleanup(db_manager) -> None:
+    """Remove documents and chunks created by the benchmark"""
+    pattern = f"{BENCHMARK_PREFIX}%"
+    db_manager.execute_query(
+        "DELETE FROM chunks WHERE document_id IN (SELECT id FROM documents WHERE filename LIKE %s)",
+        (pattern,)
+    )
+    db_manager.execute_query("DELETE FROM documents WHERE filename LIKE %s", (pattern,))
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """Print the change of each case relative to a baseline run"""
+    print(f"\nComparison with {baseline.get('commit', 'baseline')[:12]} "
+          f"({baseline.get('extraction', 'full')} -> {current['extraction']} extraction):")
+    baseline_cases = {case['name']: case for case in baseline['cases']}
+
+    def delta(new, old):
+        return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+    for case in current['cases']:
+        old = baseline_cases.get(case['name'])
+        if old is None:
+            continue
+        print(f"  {case['name']}:")
+        for key in ('pages_per_second', 'chunks_per_second', 'wall_seconds'):
+            print(f"    {key:<18} {old['median'][key]:>10} -> {case['median'][key]:>10} "
+                  f"({delta(case['median'][key], old['median'][key])})")
+        for stage in STAGES:
+            new_s, old_s = case['median']['stage_seconds'][stage], old['median']['stage_seconds'][stage]
+            print(f"    {stage + '_seconds':<18} {old_s:>10} -> {new_s:>10} ({delta(new_s, old_s)})")
+        print(f"    {'peak_rss_mb':<18} {old['peak_rss_mb']:>10} -> {case['peak_rss_mb']:>10} "
+              f"({delta(case['peak_rss_mb'], old['peak_rss_mb'])})")
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Offline ingestion benchmark on a synthetic PDF corpus")
+    parser.add_argument('--case', action='append', type=parse_case, dest='cases',
+                        help="name:pages:words_per_page:tables (repeatable, defaults to small/medium/large)")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per case")
+    parser.add_argument('--embedding-latency-ms', type=float, default=0,
+                        help="Simulated latency per embedding call")
+    parser.add_argument('--embedding-rpm-limit', type=int, default=0,
+                        help="Simulated provider requests-per-minute limit (throttles like a 429)")
+    parser.add_argument('--embedding-tpm-limit', type=int, default=0,
+                        help="Simulated provider tokens-per-minute limit")
+    parser.add_argument('--extraction', choices=EXTRACTION_MODES,
+                        help="Extraction mode for every document (defaults to EXTRACTION_MODE)")
+    parser.add_argument('--shard-pages', type=int, default=None,
+                        help="Convert documents longer than this in parallel page shards")
+    parser.add_argument('--max-parallel', type=int, default=None,
+                        help="Maximum shards of one document converted at once")
+    parser.add_argument('--output', help="Write machine-readable results to this JSON file")
+    parser.add_argument('--compare', help="Compare against a previous results file")
+    parser.add_argument('--keep-data', action='store_true', help="Keep benchmark documents in the database")
+    args = parser.parse_args()
+
+    cases = args.cases or list(DEFAULT_CASES.items())
+    extraction = {'mode': args.extraction, 'shard_pages': args.shard_pages, 'max_parallel': args.max_parallel}
+    extraction = {key: value for key, value in extraction.items() if value is not None}
+
+    db_manager = get_db_manager()
+    provider = FakeEmbeddingProvider(
+        latency_ms=args.embedding_latency_ms,
+        requests_per_minute=args.embedding_rpm_limit,
+        tokens_per_minute=args.embedding_tpm_limit
+    )
+    processor = DocumentProcessor(
+        db_manager,
+        embedder=TextEmbedder(db_manager, provider=provider),
+        notifier=NullNotifier()
+    )
+
+    results = {
+        'benchmark': 'ingest',
+        'commit': git_commit(),
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'embedding_latency_ms': args.embedding_latency_ms,
+        'embedding_rpm_limit': args.embedding_rpm_limit,
+        'embedding_tpm_limit': args.embedding_tpm_limit,
+        'extraction': args.extraction or os.getenv('EXTRACTION_MODE', 'full'),
+        'shard_pages': args.shard_pages,
+        'max_parallel': args.max_parallel,
+        'cases': []
+    }
+
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            for name, (pages, words_per_page, tables) in cases:
+                print(f"Case {name}: {pages} pages, {words_per_page} words/page, {tables} tables")
+                results['cases'].append(
+                    run_case(processor, workdir, name, pages, words_per_page, tables, args.repeat,
+                             extraction)
+                )
+    finally:
+        if not args.keep_data:
+            cleanup(db_manager)
+        db_manager.close()
+
+    results['peak_rss_mb'] = round(peak_rss_mb(), 1)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+# processing-service/benchmarks/prescan_benchmark.py
+"""
+Pre-scan benchmark: what auto extraction would skip on the benchmark corpus
+
+Generates the same synthetic corpus as ingest_benchmark.py and pre-scans
+each document the way EXTRACTION_MODE=auto does, reporting the pre-scan cost
+and which docling models auto would run, per document and per shard. It
+needs neither docling nor Postgres, so it shows where auto can gain before
+ingest_benchmark.py measures the gain itself:
+
+    python benchmarks/ingest_benchmark.py --extraction full --output bench/full.json
+    python benchmarks/ingest_benchmark.py --extraction auto --compare bench/full.json
+
+Usage (from processing-service/):
+    python benchmarks/prescan_benchmark.py
+    python benchmarks/prescan_benchmark.py --case notables:30:400:0 --shard-pages 10
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from typing import Dict, Any
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from synthetic_pdf import generate_pdf
+from process_pipeline.prescan import PdfPrescan, models_for_pages
+
+# name: (pages, words per page, tables); the corpus of ingest_benchmark.py
+DEFAULT_CASES = {
+    'small': (5, 350, 1),
+    'medium': (30, 400, 5),
+    'large': (120, 450, 15),
+}
+
+
+def parse_case(value: str):
+    """Parse a --case argument of the form name:pages:words_per_page:tables"""
+    name, pages, words, tables = value.split(':')
+    return name, (int(pages), int(words), int(tables))
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True).strip()
+    except Exception:
+        return 'unknown'
+
+
+def run_case(prescan: PdfPrescan, workdir: str, name: str, pages: int, words_per_page: int,
+             tables: int, repeat: int, shard_pages: int) -> Dict[str, Any]:
+    """Generate one synthetic document, pre-scan it `repeat` times and resolve auto's models"""
+    path = generate_pdf(os.path.join(workdir, f"{name}.pdf"), pages=pages,
+                        words_per_page=words_per_page, tables=tables, seed=pages)
+
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        scan = prescan.scan(path)
+        seconds.append(time.perf_counter() - start)
+    scanned_pages = scan['pages']
+
+    # Pages converted with each model, in one go and in shards of shard_pages
+    document_models = models_for_pages(scanned_pages)
+    model_pages = {'do_ocr': 0, 'do_table_structure': 0}
+    for first in range(0, pages, shard_pages or pages):
+        shard = scanned_pages[first:first + (shard_pages or pages)]
+        for model, enabled in models_for_pages(shard).items():
+            model_pages[model] += len(shard) if enabled else 0
+
+    wall = statistics.median(seconds)
+    result = {
+        'name': name,
+        'pages': pages,
+        'tables': tables,
+        'prescan_seconds': round(wall, 4),
+        'prescan_ms_per_page': round(wall / pages * 1000, 3),
+        'table_pages': scan['table_pages'],
+        'unsure_table_pages': scan['unsure_table_pages'],
+        'scanned_pages': scan['scanned_pages'],
+        'document_models': document_models,
+        'shard_pages': shard_pages,
+        'ocr_pages': model_pages['do_ocr'],
+        'table_model_pages': model_pages['do_table_structure']
+    }
+    print(f"  {name}: pre-scan {result['prescan_ms_per_page']}ms/page, "
+          f"ocr={document_models['do_ocr']}, tables={document_models['do_table_structure']}, "
+          f"OCR on {result['ocr_pages']}/{pages} pages, table model on {result['table_model_pages']}/{pages}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-scan cost and auto extraction decisions on a synthetic corpus")
+    parser.add_argument('--case', action='append', type=parse_case, dest='cases',
+                        help="name:pages:words_per_page:tables (repeatable, defaults to small/medium/large)")
+    parser.add_argument('--repeat', type=int, default=5, help="Pre-scans per case")
+    parser.add_argument('--shard-pages', type=int, default=0,
+                        help="Resolve models per shard of this many pages, as sharded extraction does")
+    parser.add_argument('--output', help="Write machine-readable results to this JSON file")
+    args = parser.parse_args()
+
+    results = {
+        'benchmark': 'prescan',
+        'commit': git_commit(),
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cases': []
+    }
+    prescan = PdfPrescan()
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, (pages, words_per_page, tables) in args.cases or list(DEFAULT_CASES.items()):
+            results['cases'].append(
+                run_case(prescan, workdir, name, pages, words_per_page, tables, args.repeat, args.shard_pages)
+            )
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,385 @@
+# processing-service/benchmarks/search_benchmark.py
+"""
+Search load test and recall benchmark
+
+Seeds Postgres with N synthetic chunk vectors spread over M documents in a
+dedicated collection, builds each requested vector index configuration on
+that collection's chunks partition, replays a query
+workload against /api/search at a configurable concurrency and compares
+the returned chunks with exact brute-force ground truth computed in NumPy.
+Reports throughput, latency percentiles and recall@k per configuration.
+
+The API under test must run with EMBEDDING_PROVIDER=fake so that query
+embeddings match the ones this tool computes locally.
+
+Usage (from processing-service/):
+    python benchmarks/search_benchmark.py --vectors 100000 --documents 200 \\
+        --index ivfflat:lists=100:probes=1 --index ivfflat:lists=100:probes=10 \\
+        --index hnsw:m=16:ef_construction=64 --index none --output bench/search.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Tuple
+
+import numpy as np
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from dotenv import load_dotenv
+from psycopg2.extras import execute_values
+
+from embeddings.providers import FakeEmbeddingProvider
+from storage.db_manager import get_db_manager
+from storage.collections import CollectionStore, partition_name, vector_index_name
+
+BENCHMARK_PREFIX = 'search-benchmark-'
+BENCHMARK_COLLECTION = 'search-benchmark'
+
+
+def parse_index(value: str) -> Dict[str, Any]:
+    """Parse --index kind[:key=value...], e.g. ivfflat:lists=100:probes=10"""
+    kind, *options = value.split(':')
+    config = {'kind': kind, 'label': value}
+    for option in options:
+        key, val = option.split('=')
+        config[key] = int(val)
+    return config
+
+
+def query_texts(count: int, seed: int) -> List[str]:
+    rng = np.random.default_rng(seed)
+    return [f"benchmark query {i} {rng.integers(1 << 30)}" for i in range(count)]
+
+
+def synthetic_vectors(count: int, dimensions: int, clusters: int, seed: int) -> np.ndarray:
+    """
+    Unit vectors drawn around random cluster centres
+
+    Real embeddings are far from uniformly distributed, and uniform random
+    vectors would make every ANN index look unrealistically bad.
+    """
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dimensions)).astype(np.float32)
+    assignment = rng.integers(clusters, size=count)
+    vectors = centres[assignment] + 0.5 * rng.standard_normal((count, dimensions)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def to_vector_literal(vector: np.ndarray) -> str:
+    return '[' + ','.join(f"{x:.6f}" for x in vector) + ']'
+
+
+def seed_database(db_manager, collection_id: int, vectors: np.ndarray, documents: int,
+                  batch_size: int = 1000) -> np.ndarray:
+    """
+    Insert the synthetic vectors as chunks of the benchmark collection
+
+    Returns:
+        Array of chunk ids in the same order as `vectors`
+    """
+    conn = db_manager.get_connection()
+    try:
+        with conn.cursor() as cur:
+            document_ids = [
+                row[0] for row in execute_values(
+                    cur,
+                    "INSERT INTO documents (filename, collection_id) VALUES %s RETURNING id",
+                    [(f"{BENCHMARK_PREFIX}{i}.pdf", collection_id) for i in range(documents)],
+                    fetch=True
+                )
+            ]
+            chunk_ids = []
+            for start in range(0, len(vectors), batch_size):
+                batch = vectors[start:start + batch_size]
+                rows = [
+                    (collection_id, document_ids[(start + i) % documents], f"synthetic chunk {start + i}",
+                     to_vector_literal(vector), json.dumps({'benchmark': True}))
+                    for i, vector in enumerate(batch)
+                ]
+                chunk_ids.extend(row[0] for row in execute_values(
+                    cur,
+                    "INSERT INTO chunks (collection_id, document_id, chunk_text, embedding, metadata) "
+                    "VALUES %s RETURNING id",
+                    rows,
+                    template="(%s, %s, %s, %s::vector, %s::jsonb)",
+                    page_size=batch_size,
+                    fetch=True
+                ))
+                print(f"  seeded {start + len(batch)}/{len(vectors)} vectors", end='\r')
+        conn.commit()
+        print()
+        return np.array(chunk_ids)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        db_manager.return_connection(conn)
+
+
+def build_index(db_manager, collection_id: int, config: Dict[str, Any]) -> float:
+    """
+    Replace the vector index of the benchmark partition with the given configuration
+
+    Returns:
+        Seconds spent building the index
+    """
+    conn = db_manager.get_connection()
+    try:
+        conn.autocommit = True
+        index_name, table = vector_index_name(collection_id), partition_name(collection_id)
+        with conn.cursor() as cur:
+            cur.execute(f"DROP INDEX IF EXISTS {index_name}")
+            start = time.perf_counter()
+            if config['kind'] == 'ivfflat':
+                cur.execute(
+                    f"CREATE INDEX {index_name} ON {table} USING ivfflat (embedding vector_cosine_ops) "
+                    f"WITH (lists = {config.get('lists', 100)})"
+                )
+            elif config['kind'] == 'hnsw':
+                cur.execute(
+                    f"CREATE INDEX {index_name} ON {table} USING hnsw (embedding vector_cosine_ops) "
+                    f"WITH (m = {config.get('m', 16)}, ef_construction = {config.get('ef_construction', 64)})"
+                )
+            elif config['kind'] != 'none':
+                raise ValueError(f"Unknown index kind: {config['kind']}")
+            cur.execute(f"ANALYZE {table}")
+            return time.perf_counter() - start
+    finally:
+        conn.autocommit = False
+        db_manager.return_connection(conn)
+
+
+def search_settings(config: Dict[str, Any]) -> str:
+    """Query-time index setting for a configuration as 'name = value', if any"""
+    if config['kind'] == 'ivfflat':
+        return f"ivfflat.probes = {config.get('probes', 1)}"
+    if config['kind'] == 'hnsw':
+        return f"hnsw.ef_search = {config.get('ef_search', 40)}"
+    return ''
+
+
+def apply_search_settings(db_manager, config: Dict[str, Any]) -> None:
+    """
+    Apply query-time index settings for new connections
+
+    The API keeps its own pool, so settings are applied at the database
+    level and the API has to be restarted (or its pool recycled) for them
+    to take effect on existing connections.
+    """
+    setting = search_settings(config)
+    if not setting:
+        return
+    name, value = [part.strip() for part in setting.split('=')]
+    conn = db_manager.get_connection()
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("SELECT current_database()")
+            database = cur.fetchone()[0]
+            cur.execute(f'ALTER DATABASE "{database}" SET {name} = {value}')
+    finally:
+        conn.autocommit = False
+        db_manager.return_connection(conn)
+
+
+def reset_search_settings(db_manager) -> None:
+    conn = db_manager.get_connection()
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("SELECT current_database()")
+            database = cur.fetchone()[0]
+            cur.execute(f'ALTER DATABASE "{database}" RESET ivfflat.probes')
+            cur.execute(f'ALTER DATABASE "{database}" RESET hnsw.ef_search')
+    finally:
+        conn.autocommit = False
+        db_manager.return_connection(conn)
+
+
+def ground_truth(vectors: np.ndarray, chunk_ids: np.ndarray,
+                 queries: np.ndarray, k: int) -> List[set]:
+    """Exact top-k chunk ids by cosine similarity (vectors are unit length)"""
+    truth = []
+    for start in range(0, len(queries), 256):
+        scores = queries[start:start + 256] @ vectors.T
+        top = np.argpartition(-scores, k, axis=1)[:, :k]
+        truth.extend(set(chunk_ids[row].tolist()) for row in top)
+    return truth
+
+
+def run_workload(api_url: str, collection_id: int, warmup_queries: List[str], queries: List[str], k: int,
+                 concurrency: int) -> Tuple[List[float], List[set], float, int]:
+    """
+    Replay the query workload against the search API
+
+    Warmup queries run first and are not measured.
+
+    Returns:
+        Tuple of (latencies in ms, returned ids per query, wall seconds, errors)
+    """
+    session_local = threading.local()
+
+    def session():
+        if not hasattr(session_local, 'session'):
+            session_local.session = requests.Session()
+        return session_local.session
+
+    def run_query(query: str):
+        start = time.perf_counter()
+        response = session().post(f"{api_url}/api/search", json={'query': query, 'top_k': k, 'collection_id': collection_id}, timeout=60)
+        latency = (time.perf_counter() - start) * 1000
+        response.raise_for_status()
+        return latency, {result['id'] for result in response.json()['results']}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(run_query, warmup_queries))
+
+        start = time.perf_counter()
+        futures = [pool.submit(run_query, query) for query in queries]
+        latencies, returned, errors = [], [], 0
+        for future in futures:
+            try:
+                latency, ids = future.result()
+                latencies.append(latency)
+                returned.append(ids)
+            except Exception:
+                errors += 1
+                returned.append(set())
+        wall = time.perf_counter() - start
+
+    return latencies, returned, wall, errors
+
+
+def cleanup(db_manager) -> None:
+    """Drop the benchmark collection, its documents and its chunks partition"""
+    row = db_manager.execute_query("SELECT id FROM collections WHERE name = %s", (BENCHMARK_COLLECTION,), fetch_one=True)
+    if row is not None:
+        CollectionStore(db_manager).delete(row[0])
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True).strip()
+    except Exception:
+        return 'unknown'
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Search load test and recall benchmark")
+    parser.add_argument('--api-url', default=os.getenv('SEARCH_API_URL', 'http://localhost:8000'))
+    parser.add_argument('--vectors', type=int, default=50000, help="Synthetic chunks to seed (N)")
+    parser.add_argument('--documents', type=int, default=100, help="Documents to spread them over (M)")
+    parser.add_argument('--clusters', type=int, default=200, help="Clusters in the synthetic data")
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--index', action='append', type=parse_index, dest='indexes',
+                        help="kind[:key=value...] with kind ivfflat, hnsw or none (repeatable)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write machine-readable results to this JSON file")
+    parser.add_argument('--keep-data', action='store_true')
+    parser.add_argument('--no-wait', action='store_true',
+                        help="Don't pause for an API restart after changing query-time index settings")
+    args = parser.parse_args()
+
+    indexes = args.indexes or [parse_index('ivfflat:lists=100:probes=1')]
+    db_manager = get_db_manager()
+    provider = FakeEmbeddingProvider()
+
+    print(f"Generating {args.vectors} vectors in {args.clusters} clusters")
+    vectors = synthetic_vectors(args.vectors, provider.dimensions, args.clusters, args.seed)
+    queries = query_texts(args.queries + args.warmup, args.seed)
+    query_vectors = np.stack([provider.embed_one(query) for query in queries[args.warmup:]])
+
+    # Queries embed to random directions, so steer the corpus towards them:
+    # replace a slice of the corpus with perturbed copies of the queries so
+    # every query has true near neighbours
+    rng = np.random.default_rng(args.seed + 1)
+    neighbours = min(len(vectors) // 2, len(query_vectors) * args.top_k)
+    sources = query_vectors[np.arange(neighbours) % len(query_vectors)]
+    noisy = sources + 0.5 * rng.standard_normal(sources.shape).astype(np.float32) / np.sqrt(provider.dimensions)
+    vectors[:neighbours] = noisy / np.linalg.norm(noisy, axis=1, keepdims=True)
+
+    results = {
+        'benchmark': 'search',
+        'commit': git_commit(),
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'vectors': args.vectors,
+        'documents': args.documents,
+        'queries': args.queries,
+        'concurrency': args.concurrency,
+        'top_k': args.top_k,
+        'configurations': []
+    }
+
+    try:
+        # Leftovers of an interrupted run would collide with the collection name
+        cleanup(db_manager)
+        print("Seeding database")
+        # Indexes are built per configuration below, so start without one
+        collection_id = CollectionStore(db_manager).create(BENCHMARK_COLLECTION, 'none')['id']
+        chunk_ids = seed_database(db_manager, collection_id, vectors, args.documents)
+        truth = ground_truth(vectors, chunk_ids, query_vectors, args.top_k)
+        # Searches are scoped to the benchmark collection; keep the filter as a safeguard
+        benchmark_ids = set(chunk_ids.tolist())
+
+        for config in indexes:
+            print(f"\nIndex {config['label']}")
+            build_seconds = build_index(db_manager, collection_id, config)
+            apply_search_settings(db_manager, config)
+            if search_settings(config) and not args.no_wait:
+                input(f"  Set {search_settings(config)}; restart the search API, then press Enter...")
+
+            latencies, returned, wall, errors = run_workload(
+                args.api_url, collection_id, queries[:args.warmup], queries[args.warmup:],
+                args.top_k, args.concurrency
+            )
+            recalls = [
+                len((ids & benchmark_ids) & expected) / args.top_k
+                for ids, expected in zip(returned, truth)
+            ]
+            latencies_array = np.array(latencies) if latencies else np.array([0.0])
+            entry = {
+                'index': config,
+                'build_seconds': round(build_seconds, 2),
+                'throughput_qps': round(len(latencies) / wall, 2),
+                'latency_ms': {
+                    'p50': round(float(np.percentile(latencies_array, 50)), 2),
+                    'p90': round(float(np.percentile(latencies_array, 90)), 2),
+                    'p99': round(float(np.percentile(latencies_array, 99)), 2),
+                    'max': round(float(latencies_array.max()), 2)
+                },
+                f'recall_at_{args.top_k}': round(float(np.mean(recalls)), 4),
+                'errors': errors
+            }
+            results['configurations'].append(entry)
+            print(f"  {entry['throughput_qps']} qps, latency {entry['latency_ms']}, "
+                  f"recall@{args.top_k} {entry[f'recall_at_{args.top_k}']}, errors {errors}")
+    finally:
+        reset_search_settings(db_manager)
+        if not args.keep_data:
+            cleanup(db_manager)
+        db_manager.close()
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+# processing-service/benchmarks/synthetic_pdf.py
+"""
+Generate synthetic PDFs with a controllable shape for benchmarks
+
+The PDFs are written by hand (no extra dependencies) and contain a real
+text layer: headings, paragraphs and ruled tables drawn with lines, which
+is enough to exercise docling's layout, table-structure and chunking paths.
+The same arguments always produce byte-identical files.
+"""
+import random
+from typing import List
+
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+MARGIN = 72
+FONT_SIZE = 10
+LEADING = 13
+HEADING_SIZE = 16
+CHARS_PER_LINE = 90
+
+TABLE_ROWS = 6
+TABLE_COLS = 4
+TABLE_ROW_HEIGHT = 18
+TABLE_COL_WIDTH = 117
+
+WORDS = (
+    "system document process data model vector search index query result "
+    "embedding chunk page table section report analysis value method service "
+    "request response latency throughput memory storage cache queue worker "
+    "network protocol server client database schema record field column row "
+    "metric sample average median percentile budget revenue quarter growth "
+    "customer product market strategy policy review summary detail context "
+    "configuration deployment release version change update feature support "
+    "the of and to in for with on by from at as is are was were be this that "
+    "which an or not but all can will more most other some such only also"
+).split()
+
+
+def _escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    text = ' '.join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + '.'
+
+
+def _wrap(words: List[str]) -> List[str]:
+    lines, current = [], ''
+    for word in words:
+        if current and len(current) + 1 + len(word) > CHARS_PER_LINE:
+            lines.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        lines.append(current)
+    return lines
+
+
+def _page_content(rng: random.Random, page_no: int, words_per_page: int,
+                  with_heading: bool, with_table: bool) -> bytes:
+    ops = []
+    y = PAGE_HEIGHT - MARGIN
+
+    if with_heading:
+        ops.append(f"BT /F2 {HEADING_SIZE} Tf {MARGIN} {y} Td ({_escape(f'Section {page_no}: ' + _sentence(rng, 4))}) Tj ET")
+        y -= HEADING_SIZE * 2
+
+    table_top = MARGIN + TABLE_ROWS * TABLE_ROW_HEIGHT + LEADING
+    bottom = table_top + LEADING if with_table else MARGIN
+
+    # Paragraphs of 40-80 words, separated by a blank line
+    words = []
+    while len(words) < words_per_page:
+        words.extend(_sentence(rng, rng.randint(40, 80)).split())
+        words.append('\n')
+    paragraph = []
+    for word in words[:words_per_page] + ['\n']:
+        if word != '\n':
+            paragraph.append(word)
+            continue
+        for line in _wrap(paragraph):
+            if y < bottom:
+                break
+            ops.append(f"BT /F1 {FONT_SIZE} Tf {MARGIN} {y} Td ({_escape(line)}) Tj ET")
+            y -= LEADING
+        paragraph = []
+        y -= LEADING
+
+    if with_table:
+        ops.append("0.5 w")
+        for row in range(TABLE_ROWS):
+            row_y = table_top - LEADING - (row + 1) * TABLE_ROW_HEIGHT
+            for col in range(TABLE_COLS):
+                x = MARGIN + col * TABLE_COL_WIDTH
+                ops.append(f"{x} {row_y} {TABLE_COL_WIDTH} {TABLE_ROW_HEIGHT} re S")
+                cell = f"Column {col + 1}" if row == 0 else (
+                    rng.choice(WORDS) if col == 0 else f"{rng.uniform(0, 1000):.2f}"
+                )
+                font = 'F2' if row == 0 else 'F1'
+                ops.append(f"BT /{font} {FONT_SIZE} Tf {x + 4} {row_y + 5} Td ({_escape(cell)}) Tj ET")
+
+    return '\n'.join(ops).encode('latin-1')
+
+
+def generate_pdf(path: str, pages: int = 10, words_per_page: int = 350,
+                 tables: int = 0, seed: int = 0) -> str:
+    """
+    Write a synthetic PDF
+
+    Args:
+        path: Output file path
+        pages: Number of pages
+        words_per_page: Body text density (a full page holds about 600 words)
+        tables: Number of tables, spread evenly over the pages
+        seed: Seed for the generated text
+
+    Returns:
+        The output path
+    """
+    rng = random.Random(seed)
+    table_pages = {int(i * pages / tables) for i in range(tables)} if tables else set()
+
+    # Object numbers: 1 catalog, 2 page tree, 3-4 fonts, then page/content pairs
+    objects = {
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        4: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold >>",
+    }
+    kids = []
+    for i in range(pages):
+        page_obj, content_obj = 5 + 2 * i, 6 + 2 * i
+        content = _page_content(rng, i + 1, words_per_page,
+                                with_heading=(i % 3 == 0), with_table=(i in table_pages))
+        objects[content_obj] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content)
+        objects[page_obj] = (
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] "
+            b"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>"
+            % (PAGE_WIDTH, PAGE_HEIGHT, content_obj)
+        )
+        kids.append(b"%d 0 R" % page_obj)
+
+    objects[1] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[2] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b' '.join(kids), pages)
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for number in sorted(objects):
+        offsets[number] = len(output)
+        output += b"%d 0 obj\n%s\nendobj\n" % (number, objects[number])
+
+    xref_offset = len(output)
+    size = max(objects) + 1
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % size
+    for number in range(1, size):
+        output += b"%010d 00000 n \n" % offsets[number]
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, xref_offset)
+
+    with open(path, 'wb') as f:
+        f.write(bytes(output))
+    return path
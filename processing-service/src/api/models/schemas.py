@@ -9,6 +9,8 @@ class SearchResult(BaseModel):
     text: str
     score: float
     metadata: Optional[Dict[str, Any]] = None
+    parent_id: Optional[int] = Field(default=None, description="Parent section of the chunk (see SearchResponse.parents)")
+    embedding: Optional[str] = Field(default=None, description="Base64 of the chunk embedding as little-endian float32 (raw bytes in MessagePack), if requested")
     
     class Config:
         json_schema_extra = {
@@ -29,8 +31,11 @@ class SearchRequest(BaseModel):
     """Request for vector search"""
     query: str
     document_id: Optional[int] = None
+    collection_id: Optional[int] = None
     top_k: int = Field(default=5, ge=1, le=20, description="Number of results to return")
     min_score: float = Field(default=0.0, ge=0.0, le=1.0, description="Minimum similarity score threshold")
+    include_embeddings: bool = Field(default=False, description="Return each result's embedding, e.g. for client-side reranking")
+    expand_parents: bool = Field(default=False, description="Also return the parent sections of the matched chunks")
     
     @validator('query')
     def query_must_not_be_empty(cls, v):
@@ -43,16 +48,30 @@ class SearchRequest(BaseModel):
             "example": {
                 "query": "How does the system process documents?",
                 "document_id": 1,
+                "collection_id": 1,
                 "top_k": 5,
                 "min_score": 0.6
             }
         }
     
+class ParentSection(BaseModel):
+    """Section containing one or more matched chunks"""
+    id: int
+    document_id: int
+    text: str
+    page_numbers: Optional[List[int]] = None
+    metadata: Optional[Dict[str, Any]] = None
+
+class StreamSearchRequest(SearchRequest):
+    """Request for a streamed vector search"""
+    top_k: int = Field(default=5, ge=1, le=200, description="Number of results to return")
+
 class SearchResponse(BaseModel):
     """Response from vector search"""
     results: List[SearchResult]
     query: str
     total: int
+    parents: Optional[List[ParentSection]] = Field(default=None, description="Parent sections of the results, if expand_parents was set")
     
     class Config:
         json_schema_extra = {
@@ -86,6 +105,19 @@ class SearchResponse(BaseModel):
             }
         }
 
+class CollectionRequest(BaseModel):
+    """Request to create a collection"""
+    name: str = Field(min_length=1, max_length=200)
+    index_type: Optional[str] = Field(default=None, description="hnsw, ivfflat or none (defaults to COLLECTION_INDEX_TYPE)")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "name": "acme-contracts",
+                "index_type": "hnsw"
+            }
+        }
+
 # Additional models for future endpoints
 
 class HealthResponse(BaseModel):
@@ -1 +1 @@
-from . import search, health
+from . import search, health, metrics, profiles, documents, migrations, collections
@@ -0,0 +1,51 @@
+# processing-service/src/api/routes/collections.py
+from fastapi import APIRouter, HTTPException, Depends
+import logging
+import psycopg2
+
+from storage.db_manager import DatabaseManager, get_db_manager
+from storage.collections import CollectionStore
+from ..models.schemas import CollectionRequest
+
+logger = logging.getLogger(__name__)
+
+# Create router
+router = APIRouter(prefix="/api/collections", tags=["collections"])
+
+# Dependency for the collection store
+def get_collection_store(db_manager: DatabaseManager = Depends(get_db_manager)) -> CollectionStore:
+    """Dependency to get the collection store"""
+    return CollectionStore(db_manager)
+
+@router.get("")
+async def list_collections(collection_store: CollectionStore = Depends(get_collection_store)):
+    """List collections with their document counts"""
+    collections = collection_store.list()
+    return {"collections": collections, "total": len(collections)}
+
+@router.post("", status_code=201)
+async def create_collection(
+    request: CollectionRequest,
+    collection_store: CollectionStore = Depends(get_collection_store)
+):
+    """Create a collection with its own chunks partition and vector index"""
+    try:
+        return collection_store.create(request.name, request.index_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except psycopg2.errors.UniqueViolation:
+        raise HTTPException(status_code=409, detail=f"Collection {request.name} already exists")
+
+@router.delete("/{collection_id}")
+def delete_collection(
+    collection_id: int,
+    collection_store: CollectionStore = Depends(get_collection_store)
+):
+    """Delete a collection with all its documents; its chunks partition is dropped"""
+    try:
+        deleted = collection_store.delete(collection_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not deleted:
+        raise HTTPException(status_code=404, detail=f"Collection {collection_id} not found")
+    return {"status": "deleted", "collection_id": collection_id}
@@ -0,0 +1,50 @@
+# processing-service/src/api/routes/documents.py
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import Response
+import logging
+
+from storage.db_manager import DatabaseManager, get_db_manager
+from storage.document_store import DocumentStore
+
+logger = logging.getLogger(__name__)
+
+# Create router
+router = APIRouter(prefix="/api/documents", tags=["documents"])
+
+# Dependency for the document store
+def get_document_store(db_manager: DatabaseManager = Depends(get_db_manager)) -> DocumentStore:
+    """Dependency to get the document store"""
+    return DocumentStore(db_manager)
+
+@router.get("/{document_id}/structure")
+async def get_document_structure(
+    document_id: int,
+    document_store: DocumentStore = Depends(get_document_store)
+):
+    """
+    Get the docling structure of a processed document
+
+    The stored JSON is decompressed and returned as-is, without building
+    the document object graph.
+    """
+    payload = document_store.load_json(document_id)
+    if payload is None:
+        raise HTTPException(status_code=404, detail=f"No stored structure for document {document_id}")
+    return Response(content=payload, media_type="application/json")
+
+
+@router.delete("/{document_id}")
+def delete_document(
+    document_id: int,
+    document_store: DocumentStore = Depends(get_document_store)
+):
+    """
+    Delete a document with its chunks and stored structure
+
+    Declared without async so the batched delete runs in the threadpool
+    instead of blocking the event loop.
+    """
+    result = document_store.delete(document_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Document {document_id} not found")
+    return {"status": "deleted", **result}
@@ -22,6 +22,7 @@ async def health_check(db_manager: DatabaseManager = Depends(get_db_manager)):
         return {
             "status": "healthy",
             "database": "connected",
+            "pool": db_manager.pool_stats(),
             "timestamp": time.time()
         }
     
@@ -33,6 +34,7 @@ async def health_check(db_manager: DatabaseManager = Depends(get_db_manager)):
                 "status": "unhealthy",
                 "database": "disconnected",
                 "error": str(e),
+                "pool": db_manager.pool_stats(),
                 "timestamp": time.time()
             }
         )
\ No newline at end of file
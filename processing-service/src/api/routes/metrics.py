@@ -0,0 +1,14 @@
+# processing-service/src/api/routes/metrics.py
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from monitoring.metrics import render_metrics
+
+# Create router
+router = APIRouter(tags=["metrics"])
+
+@router.get("/metrics")
+async def metrics():
+    """Expose pipeline, search, database pool and queue metrics for Prometheus"""
+    payload, content_type = render_metrics()
+    return Response(content=payload, media_type=content_type)
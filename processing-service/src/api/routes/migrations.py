@@ -0,0 +1,17 @@
+# processing-service/src/api/routes/migrations.py
+from fastapi import APIRouter, Depends
+
+from storage.db_manager import DatabaseManager, get_db_manager
+
+# Create router
+router = APIRouter(prefix="/api/migrations", tags=["migrations"])
+
+@router.get("")
+def get_migrations(db_manager: DatabaseManager = Depends(get_db_manager)):
+    """Progress of re-chunk / re-embed migrations, most recent first"""
+    # The migration engine imports docling's chunker; keep it out of the API
+    # workers until this endpoint is actually called
+    from process_pipeline.migration import list_migrations
+
+    migrations = list_migrations(db_manager)
+    return {"migrations": migrations, "total": len(migrations)}
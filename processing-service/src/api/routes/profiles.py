@@ -0,0 +1,30 @@
+# processing-service/src/api/routes/profiles.py
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+
+from monitoring.profiler import ProfileReports
+
+# Create router
+router = APIRouter(prefix="/api/profiles", tags=["profiles"])
+
+@router.get("")
+async def list_profiles():
+    """List profiled jobs, most recent first"""
+    reports = ProfileReports().list_reports()
+    return {"profiles": reports, "total": len(reports)}
+
+@router.get("/{job_id}")
+async def get_profile(job_id: str):
+    """Get the per-stage summary of a profiled job"""
+    summary = ProfileReports().get_summary(job_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail=f"No profile for job {job_id}")
+    return summary
+
+@router.get("/{job_id}/{file_name}")
+async def get_profile_file(job_id: str, file_name: str):
+    """Download one report file (.prof, .txt or .mem.txt) of a profiled job"""
+    path = ProfileReports().get_file_path(job_id, file_name)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"No file {file_name} for job {job_id}")
+    return FileResponse(path, filename=file_name)
@@ -1,11 +1,16 @@
 # processing-service/src/api/routes/search.py
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List, Dict, Any
+from fastapi import APIRouter, HTTPException, Depends, Header
+from fastapi.responses import StreamingResponse
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+import itertools
 import logging
 
 from rag.search import VectorSearch
 from storage.db_manager import DatabaseManager, get_db_manager
-from ..models.schemas import SearchRequest, SearchResponse, SearchResult# from models.schemas import SearchRequest, SearchResponse, SearchResult
+from ..models.schemas import SearchRequest, SearchResponse, SearchResult, StreamSearchRequest# from models.schemas import SearchRequest, SearchResponse, SearchResult
+from ..serialization import (
+    search_response, encode_event, wants_sse, MSGPACK_MEDIA_TYPE, NDJSON_MEDIA_TYPE, SSE_MEDIA_TYPE
+)
 
 logger = logging.getLogger(__name__)
 
@@ -17,16 +22,28 @@ def get_vector_search(db_manager: DatabaseManager = Depends(get_db_manager)) ->
     """Dependency to get vector search service"""
     return VectorSearch(db_manager)
 
-@router.post("/search", response_model=SearchResponse)
-async def search(
+@router.post(
+    "/search",
+    response_model=SearchResponse,
+    responses={200: {"content": {MSGPACK_MEDIA_TYPE: {}}}}
+)
+def search(
     request: SearchRequest,
-    vector_search: VectorSearch = Depends(get_vector_search)
+    vector_search: VectorSearch = Depends(get_vector_search),
+    accept: Optional[str] = Header(default=None)
 ):
     """
     Search for relevant text chunks using vector similarity
     
     This endpoint takes a search query and returns the most relevant chunks
-    from the document store based on semantic similarity.
+    from the document store based on semantic similarity. Results are
+    encoded straight from the database rows: JSON by default, MessagePack
+    with `Accept: application/msgpack`. With `expand_parents`, the sections
+    the matched chunks belong to are returned once each in `parents`.
+
+    Runs in the threadpool: embedding the query can wait on the embedding
+    rate limiter (Retry-After or backoff), the ONNX workers or the
+    connection pool, which must not block the event loop.
     """
     try:
         logger.info(f"Search request received: {request.query}")
@@ -40,31 +57,92 @@ async def search(
             query=request.query,
             document_id=request.document_id,
             top_k=request.top_k,
-            min_score=request.min_score
+            min_score=request.min_score,
+            collection_id=request.collection_id,
+            include_embeddings=request.include_embeddings
         )
         
-        # Convert to response model format
-        search_results = []
-        for result in results:
-            search_results.append(
-                SearchResult(
-                    id=result["id"],
-                    document_id=result["document_id"],
-                    text=result["text"],
-                    score=result["score"],
-                    metadata=result.get("metadata")
-                )
-            )
+        parents = vector_search.get_parents(results) if request.expand_parents else None
         
-        return SearchResponse(
-            results=search_results,
-            query=request.query,
-            total=len(search_results)
-        )
+        # Rows already have the SearchResult fields; skip the model round trip
+        return search_response(results, request.query, accept, parents)
         
     except HTTPException:
         # Re-raise HTTP exceptions
         raise
     except Exception as e:
         logger.error(f"Search error: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
+
+def _search_events(request: StreamSearchRequest, vector_search: VectorSearch) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Events of a streamed search, produced as the results come in
+
+    Parent sections are loaded in one query once the results are done: the
+    stream holds its pooled connection until then, and checking out a second
+    one per section could deadlock the pool under concurrent streams.
+    """
+    results = vector_search.search_stream(
+        query=request.query,
+        document_id=request.document_id,
+        top_k=request.top_k,
+        min_score=request.min_score,
+        collection_id=request.collection_id,
+        include_embeddings=request.include_embeddings
+    )
+    parent_refs = []
+    total = 0
+    for result in results:
+        total += 1
+        yield 'result', result
+        if request.expand_parents and result.get('parent_id') is not None:
+            parent_refs.append({'parent_id': result['parent_id']})
+    # The stream's cursor is closed and its connection returned by now
+    for parent in vector_search.get_parents(parent_refs):
+        yield 'parent', parent
+    yield 'done', {'query': request.query, 'total': total}
+
+@router.post(
+    "/search/stream",
+    responses={200: {"content": {NDJSON_MEDIA_TYPE: {}, SSE_MEDIA_TYPE: {}}}}
+)
+def search_stream(
+    request: StreamSearchRequest,
+    vector_search: VectorSearch = Depends(get_vector_search),
+    accept: Optional[str] = Header(default=None)
+):
+    """
+    Search like /api/search, streaming results as they are read from the database
+    
+    Sends one event per line as NDJSON (`{"event": "result", ...}`), or
+    server-sent events with `Accept: text/event-stream`: a `result` per
+    chunk, best first, then a `parent` per distinct section of the results
+    when `expand_parents` is set, then `done` with the total (or `error`
+    if the search fails midway).
+    
+    Declared without async so the query embedding and the cursor setup run
+    in the threadpool instead of blocking the event loop; the body is a
+    plain generator, which the response also iterates in the threadpool.
+    """
+    logger.info(f"Streaming search request received: {request.query}")
+    sse = wants_sse(accept)
+    events = _search_events(request, vector_search)
+    
+    # Fail with a status code if the search can't start (embedding or query errors)
+    try:
+        first = next(events)
+    except Exception as e:
+        logger.error(f"Search error: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
+    
+    def body():
+        try:
+            for event, data in itertools.chain([first], events):
+                yield encode_event(event, data, sse)
+        except Exception as e:
+            logger.error(f"Search stream error: {str(e)}", exc_info=True)
+            yield encode_event('error', {'detail': f"Search failed: {str(e)}"}, sse)
+        finally:
+            events.close()
+    
+    return StreamingResponse(body(), media_type=SSE_MEDIA_TYPE if sse else NDJSON_MEDIA_TYPE)
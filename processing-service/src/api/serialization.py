@@ -0,0 +1,103 @@
+# processing-service/src/api/serialization.py
+"""
+Response encoding for the search endpoint
+
+Search results are already plain dicts (built from RealDictCursor rows), so
+they are encoded to bytes directly instead of being copied into pydantic
+models and validated again on the way out:
+
+- JSON with orjson (the default)
+- MessagePack when the request sends `Accept: application/msgpack`, which
+  is smaller and cheaper to decode for internal callers
+
+Streamed searches send one event per line as NDJSON, or as server-sent
+events when the request sends `Accept: text/event-stream`.
+
+Embeddings (float32 arrays) are sent as base64 of their little-endian bytes
+in JSON and as raw bytes in MessagePack; decode with
+np.frombuffer(data, dtype='<f4') or a Float32Array.
+"""
+import base64
+from typing import Any, Dict, List, Optional
+
+import msgpack
+import numpy as np
+import orjson
+from fastapi.responses import Response
+
+JSON_MEDIA_TYPE = 'application/json'
+MSGPACK_MEDIA_TYPE = 'application/msgpack'
+MSGPACK_MEDIA_TYPES = (MSGPACK_MEDIA_TYPE, 'application/x-msgpack')
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+SSE_MEDIA_TYPE = 'text/event-stream'
+
+
+def wants_msgpack(accept: Optional[str]) -> bool:
+    """Whether an Accept header asks for MessagePack"""
+    return bool(accept) and any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES)
+
+
+def wants_sse(accept: Optional[str]) -> bool:
+    """Whether an Accept header asks for server-sent events"""
+    return bool(accept) and SSE_MEDIA_TYPE in accept
+
+
+def _float32_bytes(value: np.ndarray) -> bytes:
+    return np.ascontiguousarray(value, dtype='<f4').tobytes()
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, np.ndarray):
+        return base64.b64encode(_float32_bytes(value)).decode('ascii')
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def _msgpack_default(value: Any) -> Any:
+    if isinstance(value, np.ndarray):
+        return _float32_bytes(value)
+    raise TypeError(f"Type is not MessagePack serializable: {type(value).__name__}")
+
+
+def encode_response(payload: Dict[str, Any], accept: Optional[str] = None) -> Response:
+    """
+    Encode a response payload in the format the client accepts
+
+    Args:
+        payload: JSON-compatible dict (numpy arrays allowed)
+        accept: Accept header of the request
+
+    Returns:
+        Response with the encoded body
+    """
+    if wants_msgpack(accept):
+        return Response(content=msgpack.packb(payload, default=_msgpack_default),
+                        media_type=MSGPACK_MEDIA_TYPE)
+    return Response(content=orjson.dumps(payload, default=_json_default),
+                    media_type=JSON_MEDIA_TYPE)
+
+
+def search_response(results: List[Dict[str, Any]], query: str, accept: Optional[str] = None,
+                    parents: Optional[List[Dict[str, Any]]] = None) -> Response:
+    """Encode search results (and their parent sections, if expanded) with the same shape as SearchResponse"""
+    payload = {'results': results, 'query': query, 'total': len(results)}
+    if parents is not None:
+        payload['parents'] = parents
+    return encode_response(payload, accept)
+
+
+def encode_event(event: str, data: Dict[str, Any], sse: bool = False) -> bytes:
+    """
+    Encode one event of a streamed response
+
+    Args:
+        event: Event type (result, parent, done or error)
+        data: Event payload
+        sse: Encode as a server-sent event instead of an NDJSON line
+
+    Returns:
+        Encoded event, including its terminator
+    """
+    if sse:
+        return b'event: ' + event.encode('ascii') + b'\ndata: ' + \
+            orjson.dumps(data, default=_json_default) + b'\n\n'
+    return orjson.dumps({'event': event, **data}, default=_json_default) + b'\n'
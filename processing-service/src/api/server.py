@@ -5,9 +5,15 @@ from fastapi.responses import JSONResponse
 import os
 import time
 import logging
+from typing import Optional
 
-from .routes import search, health
+from .routes import search, health, metrics, profiles, documents, migrations, collections
 from storage.db_manager import get_db_manager
+from storage.vectors import check_corpus_model
+from embeddings.providers import get_embedding_provider
+from monitoring.metrics import register_pool_collector, mark_process_dead
+from rag.hot_documents import SearchHeatTracker
+from rag.warmer import CacheWarmer
 
 # Configure logging
 logging.basicConfig(
@@ -31,6 +37,14 @@ app.add_middleware(
 # Include routers
 app.include_router(search.router)
 app.include_router(health.router)
+app.include_router(documents.router)
+app.include_router(collections.router)
+app.include_router(metrics.router)
+app.include_router(profiles.router)
+app.include_router(migrations.router)
+
+# Pool utilization is read from the database manager only when scraped
+register_pool_collector(get_db_manager)
 
 # Middleware for request logging and timing
 @app.middleware("http")
@@ -61,22 +75,54 @@ async def global_exception_handler(request: Request, exc: Exception):
         content={"error": "Internal server error", "detail": str(exc)}
     )
 
+@app.on_event("startup")
+async def startup_event():
+    """Open this worker's connection pool before the first request and start warming caches"""
+    db_manager = get_db_manager()
+    # Query embeddings must be comparable with the stored chunks'
+    check_corpus_model(db_manager, get_embedding_provider().model)
+    # Loads the hottest documents' pages and seeds this worker's query cache
+    warmer = CacheWarmer(db_manager)
+    if warmer.enabled:
+        warmer.start()
+        app.state.warmer = warmer
+
 @app.on_event("shutdown")
 async def shutdown_event():
     """Clean up resources on shutdown"""
     logger.info("Shutting down API server")
+    if getattr(app.state, 'warmer', None) is not None:
+        app.state.warmer.stop()
+    # Keep the search heat counted since the last flush
+    if SearchHeatTracker._instance is not None:
+        SearchHeatTracker._instance.stop()
     db_manager = get_db_manager()
     db_manager.close()
+    # This worker's live gauges (pool, cache, rate factor) stop counting
+    mark_process_dead()
+
+def start_api_server(workers: Optional[int] = None):
+    """
+    Start the FastAPI server using uvicorn
 
-def start_api_server():
-    """Start the FastAPI server using uvicorn"""
+    Args:
+        workers: Number of worker processes (defaults to 1). With more than
+            one, uvicorn spawns fresh processes that import the app on their
+            own, so every worker opens its own database pool (of
+            DB_MAX_CONNECTIONS) and has its own search cache.
+    """
     import uvicorn
     
     port = int(os.environ.get("API_PORT", 8000))
     host = os.environ.get("API_HOST", "0.0.0.0")
+    workers = workers or 1
     
-    logger.info(f"Starting API server on {host}:{port}")
-    uvicorn.run(app, host=host, port=port)
+    logger.info(f"Starting API server on {host}:{port} ({workers} worker{'s' if workers > 1 else ''})")
+    if workers > 1:
+        # Workers need an import string, not the app object
+        uvicorn.run("api.server:app", host=host, port=port, workers=workers)
+    else:
+        uvicorn.run(app, host=host, port=port)
 
 if __name__ == "__main__":
     start_api_server()
\ No newline at end of file
@@ -0,0 +1,285 @@
+# processing-service/src/embeddings/local.py
+"""
+Local CPU embeddings with ONNX Runtime
+
+Runs a small sentence-embedding model (for example all-MiniLM-L6-v2
+exported to ONNX) in-process, so ingestion and search work without a
+remote API. Throughput comes from three things:
+
+- Dynamic batching: embed() calls are queued and a dispatcher thread merges
+  whatever arrives within ONNX_BATCH_WAIT_MS, so concurrent search queries
+  share one model run instead of each paying for their own
+- Length bucketing: texts are sorted by token count and grouped under a
+  padded-token budget, so each batch is only padded to its own longest text
+- A thread pool running batches in parallel on one shared session (ONNX
+  Runtime releases the GIL and sessions are safe to share across threads)
+
+The model directory must contain model.onnx and its tokenizer.json. Vectors
+are mean-pooled, L2-normalized and zero-padded to EMBEDDING_DIMENSIONS so
+they fit the chunks.embedding column; zero padding leaves cosine distances
+unchanged, but the vectors are only comparable with this model's own, so
+the services refuse to start on a corpus embedded by another model until a
+migration has re-embedded it (see storage.vectors.check_corpus_model).
+
+A call waits at most ONNX_CALL_TIMEOUT_SECONDS for its vectors; calls that
+can't be run (the provider was closed or a batch failed) fail instead of
+waiting forever.
+"""
+import os
+import queue
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from typing import List, Tuple, Optional, Dict
+
+import numpy as np
+import onnxruntime as ort
+from tokenizers import Tokenizer
+
+from embeddings.providers import EmbeddingProvider, EmbeddingTransientError, DEFAULT_DIMENSIONS
+
+logger = logging.getLogger(__name__)
+
+
+class _Request:
+    """One embed() call waiting for the batches that contain its texts"""
+
+    def __init__(self, encodings):
+        self.encodings = encodings
+        self.vectors: List[Optional[np.ndarray]] = [None] * len(encodings)
+        self.remaining = len(encodings)
+        self.future = Future()
+        # Batches of one call can finish on several pool threads at once
+        self.lock = threading.Lock()
+
+    def fail(self, error: BaseException) -> None:
+        """Fail the call unless it already has its result"""
+        with self.lock:
+            if not self.future.done():
+                self.future.set_exception(error)
+
+
+class OnnxEmbeddingProvider(EmbeddingProvider):
+    """Sentence embeddings computed on the CPU with ONNX Runtime"""
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls) -> 'OnnxEmbeddingProvider':
+        """Singleton access method; ingestion and search share one loaded model"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = OnnxEmbeddingProvider()
+            return cls._instance
+
+    def __init__(self, model_dir: Optional[str] = None, dimensions: Optional[int] = None,
+                 workers: Optional[int] = None, threads: Optional[int] = None,
+                 max_batch_tokens: Optional[int] = None, max_batch_size: Optional[int] = None,
+                 max_length: Optional[int] = None, batch_wait_ms: Optional[float] = None,
+                 bucketing: bool = True, call_timeout: Optional[float] = None):
+        """
+        Args:
+            model_dir: Directory with model.onnx and tokenizer.json (defaults to ONNX_MODEL_DIR)
+            dimensions: Size of the returned vectors (defaults to EMBEDDING_DIMENSIONS)
+            workers: Batches run in parallel (defaults to ONNX_WORKERS, or CPUs / threads)
+            threads: Intra-op threads per batch (defaults to ONNX_THREADS)
+            max_batch_tokens: Padded tokens per batch, i.e. batch size x longest text
+            max_batch_size: Texts per batch
+            max_length: Tokens per text; longer texts are truncated
+            batch_wait_ms: How long the dispatcher waits for more calls to batch together
+            bucketing: Group texts of similar length (disable to measure its effect)
+            call_timeout: Seconds an embed() call waits for its vectors
+                (defaults to ONNX_CALL_TIMEOUT_SECONDS)
+        """
+        self.model_dir = model_dir or os.getenv('ONNX_MODEL_DIR', './models/all-MiniLM-L6-v2')
+        self.model = os.getenv('ONNX_MODEL_NAME') or os.path.basename(os.path.normpath(self.model_dir))
+        self.dimensions = dimensions or int(os.getenv('EMBEDDING_DIMENSIONS', str(DEFAULT_DIMENSIONS)))
+        self.threads = threads or int(os.getenv('ONNX_THREADS', '1'))
+        self.workers = workers or int(os.getenv('ONNX_WORKERS', '0')) or max(1, (os.cpu_count() or 1) // self.threads)
+        self.max_batch_tokens = max_batch_tokens or int(os.getenv('ONNX_MAX_BATCH_TOKENS', '4096'))
+        self.max_batch_size = max_batch_size or int(os.getenv('ONNX_MAX_BATCH_SIZE', '32'))
+        # Enough texts per call to keep every worker busy and leave room to bucket
+        self.preferred_batch_size = self.max_batch_size * self.workers
+        self.max_length = max_length or int(os.getenv('ONNX_MAX_LENGTH', '256'))
+        wait_ms = batch_wait_ms if batch_wait_ms is not None else float(os.getenv('ONNX_BATCH_WAIT_MS', '2'))
+        self.batch_wait = wait_ms / 1000
+        self.bucketing = bucketing
+        self.call_timeout = call_timeout if call_timeout is not None \
+            else float(os.getenv('ONNX_CALL_TIMEOUT_SECONDS', '120'))
+        self._closed = False
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(self.model_dir, 'tokenizer.json'))
+        self.tokenizer.enable_truncation(self.max_length)
+        self.tokenizer.no_padding()
+        pad_id = self.tokenizer.token_to_id('[PAD]')
+        self.pad_id = pad_id if pad_id is not None else 0
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = self.threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            os.path.join(self.model_dir, 'model.onnx'),
+            sess_options=options,
+            providers=['CPUExecutionProvider']
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+        self.stats_lock = threading.Lock()
+        self.batches = 0
+        self.tokens = 0
+        self.padded_tokens = 0
+
+        self.native_dimensions = self._infer([self.tokenizer.encode("dimension probe")]).shape[1]
+        if self.native_dimensions > self.dimensions:
+            raise ValueError(
+                f"Model {self.model} produces {self.native_dimensions}-dimensional vectors, "
+                f"more than EMBEDDING_DIMENSIONS={self.dimensions}"
+            )
+
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='onnx-embedding')
+        self.requests = queue.Queue()
+        self.dispatcher = threading.Thread(target=self._dispatch, name='onnx-embedding-dispatcher', daemon=True)
+        self.dispatcher.start()
+        logger.info(f"✓ Loaded ONNX embedding model {self.model} ({self.native_dimensions} dimensions, "
+                    f"{self.workers} workers x {self.threads} threads)")
+
+    def _infer(self, encodings) -> np.ndarray:
+        """Run one padded batch through the model and return unit vectors"""
+        width = max(len(encoding.ids) for encoding in encodings)
+        input_ids = np.full((len(encodings), width), self.pad_id, dtype=np.int64)
+        attention_mask = np.zeros((len(encodings), width), dtype=np.int64)
+        for row, encoding in enumerate(encodings):
+            input_ids[row, :len(encoding.ids)] = encoding.ids
+            attention_mask[row, :len(encoding.ids)] = 1
+
+        feeds = {'input_ids': input_ids, 'attention_mask': attention_mask}
+        if 'token_type_ids' in self.input_names:
+            feeds['token_type_ids'] = np.zeros_like(input_ids)
+        output = self.session.run(None, feeds)[0]
+
+        # Token embeddings: average over the real (unpadded) tokens
+        if output.ndim == 3:
+            weights = attention_mask[..., None].astype(np.float32)
+            output = (output * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+        output = output / np.maximum(np.linalg.norm(output, axis=1, keepdims=True), 1e-12)
+
+        with self.stats_lock:
+            self.batches += 1
+            self.tokens += int(attention_mask.sum())
+            self.padded_tokens += input_ids.size
+        return output.astype(np.float32)
+
+    def _plan_batches(self, lengths: List[int]) -> List[List[int]]:
+        """
+        Group text indices into batches under the padded-token budget
+
+        Args:
+            lengths: Token count of each text
+
+        Returns:
+            Lists of indices, one per batch
+        """
+        order = sorted(range(len(lengths)), key=lengths.__getitem__) if self.bucketing else range(len(lengths))
+        batches, current, longest = [], [], 0
+        for index in order:
+            widest = max(longest, lengths[index])
+            if current and (len(current) >= self.max_batch_size
+                            or widest * (len(current) + 1) > self.max_batch_tokens):
+                batches.append(current)
+                current, widest = [], lengths[index]
+            current.append(index)
+            longest = widest
+        if current:
+            batches.append(current)
+        return batches
+
+    def _dispatch(self):
+        """Collect queued calls into one group and hand its batches to the pool, until closed"""
+        closing = False
+        while not closing:
+            request = self.requests.get()
+            if request is None:
+                break
+            pending = [request]
+            try:
+                texts = len(request.encodings)
+                try:
+                    while texts < self.preferred_batch_size:
+                        request = self.requests.get(timeout=self.batch_wait) if self.batch_wait else self.requests.get_nowait()
+                        if request is None:
+                            closing = True
+                            break
+                        pending.append(request)
+                        texts += len(request.encodings)
+                except queue.Empty:
+                    pass
+
+                owners = [(request, i) for request in pending for i in range(len(request.encodings))]
+                for batch in self._plan_batches([len(request.encodings[i].ids) for request, i in owners]):
+                    batch_owners = [owners[index] for index in batch]
+                    future = self.pool.submit(self._infer, [request.encodings[i] for request, i in batch_owners])
+                    future.add_done_callback(lambda done, batch_owners=batch_owners: self._batch_done(done, batch_owners))
+            except Exception as e:
+                # Keep dispatching later calls; these ones fail instead of waiting forever
+                logger.error(f"✗ ONNX embedding dispatch failed: {e}", exc_info=True)
+                for request in pending:
+                    request.fail(e)
+
+        # Calls queued while the provider was closing
+        while True:
+            try:
+                request = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None:
+                request.fail(RuntimeError("ONNX embedding provider is closed"))
+
+    def _batch_done(self, done: Future, owners: List[Tuple[_Request, int]]):
+        error = done.exception()
+        if error is not None:
+            for request, _ in owners:
+                request.fail(error)
+            return
+
+        for (request, i), vector in zip(owners, done.result()):
+            with request.lock:
+                request.vectors[i] = vector
+                request.remaining -= 1
+                if request.remaining == 0 and not request.future.done():
+                    request.future.set_result(request.vectors)
+
+    def embed_array(self, texts: List[str]) -> Tuple[np.ndarray, int]:
+        if not texts:
+            return np.zeros((0, self.dimensions), dtype=np.float32), 0
+        if self._closed or not self.dispatcher.is_alive():
+            raise RuntimeError("ONNX embedding provider is closed")
+        request = _Request(self.tokenizer.encode_batch(texts))
+        self.requests.put(request)
+        try:
+            vectors = np.stack(request.future.result(timeout=self.call_timeout))
+        except FuturesTimeoutError:
+            request.fail(EmbeddingTransientError(f"timed out after {self.call_timeout:g}s"))
+            raise EmbeddingTransientError(
+                f"ONNX embedding call of {len(texts)} texts timed out after {self.call_timeout:g}s"
+            )
+
+        padded = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        padded[:, :self.native_dimensions] = vectors
+        return padded, sum(len(encoding.ids) for encoding in request.encodings)
+
+    def embed(self, texts: List[str]) -> Tuple[List[List[float]], int]:
+        vectors, tokens = self.embed_array(texts)
+        return vectors.tolist(), tokens
+
+    def stats(self) -> Dict[str, int]:
+        """Batches run and real vs padded tokens processed so far"""
+        with self.stats_lock:
+            return {'batches': self.batches, 'tokens': self.tokens, 'padded_tokens': self.padded_tokens}
+
+    def close(self):
+        """Stop the dispatcher and wait for running batches; later calls fail"""
+        self._closed = True
+        self.requests.put(None)
+        self.dispatcher.join()
+        self.pool.shutdown(wait=True)
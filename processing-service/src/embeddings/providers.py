@@ -0,0 +1,187 @@
+# processing-service/src/embeddings/providers.py
+import os
+import time
+import hashlib
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import List, Tuple, Optional
+import numpy as np
+import openai
+from openai import OpenAI
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "text-embedding-3-large"
+DEFAULT_DIMENSIONS = 1536
+
+
+class EmbeddingRateLimitError(Exception):
+    """Raised by a provider when a call was rejected by its rate limits"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        # Seconds the provider asked us to wait, if it said
+        self.retry_after = retry_after
+
+
+class EmbeddingTransientError(Exception):
+    """Raised by a provider when a call failed in a way worth retrying (server error, connection, timeout)"""
+
+
+def estimate_tokens(texts: List[str]) -> int:
+    """Roughly 4 characters per token, like the OpenAI tokenizers on English text"""
+    return sum(max(1, len(text) // 4) for text in texts)
+
+
+class EmbeddingProvider(ABC):
+    """Interface shared by all embedding backends"""
+
+    model: str = DEFAULT_MODEL
+    dimensions: int = DEFAULT_DIMENSIONS
+    # Texts per embed() call when the caller doesn't choose a batch size
+    preferred_batch_size: int = 1
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> Tuple[List[List[float]], int]:
+        """
+        Generate embeddings for a batch of texts
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            Tuple of (one embedding per text, total tokens used)
+        """
+
+    def embed_array(self, texts: List[str]) -> Tuple[np.ndarray, int]:
+        """
+        Generate embeddings for a batch of texts as a float32 matrix
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            Tuple of (matrix with one row per text, total tokens used)
+        """
+        embeddings, tokens = self.embed(texts)
+        return np.asarray(embeddings, dtype=np.float32), tokens
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """Embeddings from the OpenAI API"""
+
+    def __init__(self):
+        """Initialize the OpenAI client"""
+        api_key = os.getenv('OPENAI_API_KEY')
+        if not api_key:
+            logger.warning("OPENAI_API_KEY environment variable not set")
+
+        # Throttled and failed calls are retried by the embedding scheduler,
+        # which backs off for every caller at once on throttling instead of
+        # each client on its own
+        self.client = OpenAI(api_key=api_key, max_retries=0)
+        self.model = os.getenv('EMBEDDING_MODEL', DEFAULT_MODEL)
+        self.dimensions = int(os.getenv('EMBEDDING_DIMENSIONS', str(DEFAULT_DIMENSIONS)))
+
+    def embed(self, texts: List[str]) -> Tuple[List[List[float]], int]:
+        try:
+            response = self.client.embeddings.create(
+                model=self.model,
+                input=texts,
+                dimensions=self.dimensions
+            )
+        except openai.RateLimitError as e:
+            retry_after = e.response.headers.get('retry-after') if e.response is not None else None
+            try:
+                retry_after = float(retry_after) if retry_after else None
+            except ValueError:
+                retry_after = None
+            raise EmbeddingRateLimitError(str(e), retry_after) from e
+        except (openai.APIConnectionError, openai.InternalServerError) as e:
+            # APITimeoutError is an APIConnectionError
+            raise EmbeddingTransientError(str(e)) from e
+        return [item.embedding for item in response.data], response.usage.total_tokens
+
+
+class FakeEmbeddingProvider(EmbeddingProvider):
+    """
+    Deterministic embeddings for benchmarks and offline development
+
+    The same text always maps to the same unit vector, so search results are
+    reproducible, and no network calls are made. An optional latency and
+    per-minute request and token limits can be configured to approximate a
+    remote provider; calls over the limits raise EmbeddingRateLimitError.
+    """
+
+    def __init__(self, dimensions: int = None, latency_ms: float = None,
+                 requests_per_minute: int = None, tokens_per_minute: int = None):
+        """
+        Args:
+            dimensions: Size of the generated vectors
+            latency_ms: Simulated latency per call in milliseconds
+            requests_per_minute: Simulated request limit (0 for none)
+            tokens_per_minute: Simulated token limit (0 for none)
+        """
+        self.model = "fake"
+        self.dimensions = dimensions or int(os.getenv('EMBEDDING_DIMENSIONS', str(DEFAULT_DIMENSIONS)))
+        self.latency_ms = latency_ms if latency_ms is not None else float(os.getenv('FAKE_EMBEDDING_LATENCY_MS', '0'))
+        self.requests_per_minute = (requests_per_minute if requests_per_minute is not None
+                                    else int(os.getenv('FAKE_EMBEDDING_RPM_LIMIT', '0')))
+        self.tokens_per_minute = (tokens_per_minute if tokens_per_minute is not None
+                                  else int(os.getenv('FAKE_EMBEDDING_TPM_LIMIT', '0')))
+        # (timestamp, tokens) of the calls accepted in the last minute
+        self.window = deque()
+        self.window_lock = threading.Lock()
+
+    def _check_limits(self, tokens: int) -> None:
+        """Accept a call or raise like a provider over its sliding one-minute limits"""
+        if not self.requests_per_minute and not self.tokens_per_minute:
+            return
+        with self.window_lock:
+            now = time.monotonic()
+            while self.window and now - self.window[0][0] >= 60:
+                self.window.popleft()
+            used = sum(call_tokens for _, call_tokens in self.window)
+            if ((self.requests_per_minute and len(self.window) + 1 > self.requests_per_minute)
+                    or (self.tokens_per_minute and used + tokens > self.tokens_per_minute)):
+                retry_after = 60 - (now - self.window[0][0]) if self.window else 1.0
+                raise EmbeddingRateLimitError("Fake provider rate limit exceeded", retry_after)
+            self.window.append((now, tokens))
+
+    def embed_one(self, text: str) -> np.ndarray:
+        """Deterministic unit vector for a text"""
+        seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+        vector = np.random.default_rng(seed).standard_normal(self.dimensions).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def embed_array(self, texts: List[str]) -> Tuple[np.ndarray, int]:
+        tokens = estimate_tokens(texts)
+        self._check_limits(tokens)
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        return np.stack([self.embed_one(text) for text in texts]), tokens
+
+    def embed(self, texts: List[str]) -> Tuple[List[List[float]], int]:
+        vectors, tokens = self.embed_array(texts)
+        return vectors.tolist(), tokens
+
+
+def get_embedding_provider() -> EmbeddingProvider:
+    """
+    Create the embedding provider configured by EMBEDDING_PROVIDER
+
+    Returns:
+        The configured provider (openai by default)
+    """
+    name = os.getenv('EMBEDDING_PROVIDER', 'openai').lower()
+    if name == 'openai':
+        return OpenAIEmbeddingProvider()
+    if name == 'fake':
+        return FakeEmbeddingProvider()
+    if name == 'onnx':
+        # Imported here so deployments using the API don't need onnxruntime
+        from embeddings.local import OnnxEmbeddingProvider
+        return OnnxEmbeddingProvider.get_instance()
+    raise ValueError(f"Unknown embedding provider: {name}")
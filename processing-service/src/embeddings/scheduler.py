@@ -0,0 +1,223 @@
+# processing-service/src/embeddings/scheduler.py
+"""
+Process-wide scheduling of embedding calls under provider rate limits
+
+Ingestion lanes, migrations and search queries all embed through the same
+provider account, so with several documents in flight their calls collide
+with its requests-per-minute and tokens-per-minute limits. Every embedding
+call goes through one EmbeddingScheduler per process, which:
+
+- Accounts requests and estimated tokens in two token buckets refilled at
+  EMBEDDING_RPM_LIMIT / EMBEDDING_TPM_LIMIT per minute (0 disables a limit);
+  the estimate is corrected with the real token count after each call
+- Serves waiting calls in priority order, so a search query never queues
+  behind a bulk ingestion backlog
+- Backs off adaptively when the provider throttles anyway: every caller is
+  paused (for Retry-After when the provider sends it, otherwise an
+  exponential delay) and the rate drops to half, then recovers step by step
+  on successful calls
+- Retries calls that failed on a server error, connection error or timeout
+  (EMBEDDING_TRANSIENT_RETRIES times, with an exponential delay for that
+  call only)
+
+The limits are per process; when the API and the consumer share an account,
+give each one its share.
+"""
+import os
+import time
+import heapq
+import random
+import logging
+import itertools
+import threading
+from typing import List, Tuple, Optional, Union
+
+import numpy as np
+
+from embeddings.providers import EmbeddingProvider, EmbeddingRateLimitError, EmbeddingTransientError, estimate_tokens
+from monitoring.metrics import (
+    EMBEDDING_QUEUE_WAIT_SECONDS, EMBEDDING_QUEUE_DEPTH, EMBEDDING_THROTTLED, EMBEDDING_RATE_FACTOR
+)
+
+logger = logging.getLogger(__name__)
+
+QUERY = 'query'
+INGEST = 'ingest'
+
+# Lower is served first
+PRIORITIES = {QUERY: 0, INGEST: 1}
+
+# The rate never drops below this share of the configured limits
+MIN_RATE_FACTOR = 0.1
+RATE_FACTOR_STEP = 0.05
+
+
+class TokenBucket:
+    """Capacity refilled continuously at a per-minute rate"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float, factor: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate * factor)
+        self.updated = now
+
+    def wait_time(self, amount: float, factor: float) -> float:
+        """Seconds until `amount` is available (a call larger than the bucket waits for a full one)"""
+        needed = min(amount, self.capacity) - self.level
+        return max(0.0, needed / (self.rate * factor))
+
+
+class EmbeddingScheduler:
+    """Rate-limit-aware, prioritized gate in front of the embedding provider"""
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls) -> 'EmbeddingScheduler':
+        """Singleton access method; all embedding callers of the process share the limits"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = EmbeddingScheduler()
+            return cls._instance
+
+    def __init__(self, requests_per_minute: Optional[int] = None, tokens_per_minute: Optional[int] = None,
+                 max_retries: Optional[int] = None, transient_retries: Optional[int] = None):
+        """
+        Args:
+            requests_per_minute: Request limit (defaults to EMBEDDING_RPM_LIMIT, 0 for none)
+            tokens_per_minute: Token limit (defaults to EMBEDDING_TPM_LIMIT, 0 for none)
+            max_retries: Retries of a throttled call before giving up
+            transient_retries: Retries of a call that failed on a server or
+                connection error (defaults to EMBEDDING_TRANSIENT_RETRIES)
+        """
+        requests_per_minute = (requests_per_minute if requests_per_minute is not None
+                               else int(os.getenv('EMBEDDING_RPM_LIMIT', '0')))
+        tokens_per_minute = (tokens_per_minute if tokens_per_minute is not None
+                             else int(os.getenv('EMBEDDING_TPM_LIMIT', '0')))
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('EMBEDDING_THROTTLE_RETRIES', '5'))
+        self.transient_retries = (transient_retries if transient_retries is not None
+                                  else int(os.getenv('EMBEDDING_TRANSIENT_RETRIES', '2')))
+        self.backoff_base = int(os.getenv('EMBEDDING_BACKOFF_BASE_MS', '1000')) / 1000
+        self.backoff_max = int(os.getenv('EMBEDDING_BACKOFF_MAX_MS', '60000')) / 1000
+
+        self.condition = threading.Condition()
+        # Heap of (priority, arrival) tickets of the calls waiting for capacity
+        self.waiting = []
+        self.arrivals = itertools.count()
+        self.rate_factor = 1.0
+        self.paused_until = 0.0
+        self.consecutive_throttles = 0
+        EMBEDDING_RATE_FACTOR.set(self.rate_factor)
+
+    def _wait_time(self, now: float, estimated: int) -> float:
+        wait = max(0.0, self.paused_until - now)
+        if self.requests is not None:
+            self.requests.refill(now, self.rate_factor)
+            wait = max(wait, self.requests.wait_time(1, self.rate_factor))
+        if self.tokens is not None:
+            self.tokens.refill(now, self.rate_factor)
+            wait = max(wait, self.tokens.wait_time(estimated, self.rate_factor))
+        return wait
+
+    def _acquire(self, priority: str, estimated: int) -> None:
+        """Block until this call is first in line and the limits have room for it"""
+        ticket = (PRIORITIES[priority], next(self.arrivals))
+        start = time.monotonic()
+        EMBEDDING_QUEUE_DEPTH.labels(priority=priority).inc()
+        with self.condition:
+            heapq.heappush(self.waiting, ticket)
+            try:
+                while True:
+                    if self.waiting[0] != ticket:
+                        self.condition.wait()
+                        continue
+                    wait = self._wait_time(time.monotonic(), estimated)
+                    if wait <= 0:
+                        break
+                    self.condition.wait(timeout=wait)
+                if self.requests is not None:
+                    self.requests.level -= 1
+                if self.tokens is not None:
+                    self.tokens.level -= estimated
+            finally:
+                self.waiting.remove(ticket)
+                heapq.heapify(self.waiting)
+                # The next call in line may be able to go now
+                self.condition.notify_all()
+        EMBEDDING_QUEUE_DEPTH.labels(priority=priority).dec()
+        EMBEDDING_QUEUE_WAIT_SECONDS.labels(priority=priority).observe(time.monotonic() - start)
+
+    def _throttled(self, priority: str, retry_after: Optional[float]) -> float:
+        """Pause every caller and halve the rate after the provider throttled a call"""
+        EMBEDDING_THROTTLED.labels(priority=priority).inc()
+        with self.condition:
+            self.consecutive_throttles += 1
+            delay = retry_after
+            if delay is None:
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (self.consecutive_throttles - 1))
+                delay *= random.uniform(0.8, 1.2)
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+            self.rate_factor = max(MIN_RATE_FACTOR, self.rate_factor / 2)
+            EMBEDDING_RATE_FACTOR.set(self.rate_factor)
+            self.condition.notify_all()
+        logger.warning(f"Embedding provider throttled a call ({priority}), pausing for {delay:.1f}s "
+                       f"at {self.rate_factor:.0%} of the configured rate")
+        return delay
+
+    def _succeeded(self, estimated: int, tokens: int) -> None:
+        with self.condition:
+            self.consecutive_throttles = 0
+            if self.rate_factor < 1.0:
+                self.rate_factor = min(1.0, self.rate_factor + RATE_FACTOR_STEP)
+                EMBEDDING_RATE_FACTOR.set(self.rate_factor)
+            if self.tokens is not None:
+                self.tokens.level -= tokens - estimated
+
+    def embed(self, provider: EmbeddingProvider, texts: List[str],
+              priority: str = INGEST, as_array: bool = False) -> Tuple[Union[List[List[float]], np.ndarray], int]:
+        """
+        Embed texts once the rate limits allow, retrying throttled calls
+
+        Args:
+            provider: Provider to call
+            texts: Texts to embed
+            priority: QUERY or INGEST
+            as_array: Return a float32 matrix instead of lists of floats
+
+        Returns:
+            Tuple of (one embedding per text, total tokens used)
+
+        Raises:
+            EmbeddingRateLimitError: If the call is still throttled after max_retries retries
+            EmbeddingTransientError: If the call still fails after transient_retries retries
+        """
+        estimated = estimate_tokens(texts)
+        throttles = failures = 0
+        while True:
+            self._acquire(priority, estimated)
+            try:
+                embeddings, tokens = provider.embed_array(texts) if as_array else provider.embed(texts)
+            except EmbeddingRateLimitError as e:
+                self._throttled(priority, e.retry_after)
+                if throttles == self.max_retries:
+                    raise
+                throttles += 1
+                continue
+            except EmbeddingTransientError as e:
+                if failures == self.transient_retries:
+                    raise
+                # Not a capacity problem: only this call waits, the rate stays
+                delay = min(self.backoff_max, self.backoff_base * 2 ** failures) * random.uniform(0.5, 1.0)
+                failures += 1
+                logger.warning(f"Embedding call failed ({e}), retry {failures}/{self.transient_retries} "
+                               f"in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            self._succeeded(estimated, tokens)
+            return embeddings, tokens
@@ -1,15 +1,33 @@
 # processing-service/src/main.py
+"""
+Entry point of the processing service
+
+The service has two roles that can run together or as separate processes
+sharing the same configuration (.env):
+
+- ingest: the RabbitMQ consumer (docling conversion, embedding, storage)
+  and the maintenance scheduler
+- api: the search API, as API_WORKERS uvicorn worker processes, each with
+  its own database pool
+
+Running both in one process (role "all", the default) keeps the API in a
+background thread next to the consumer, where conversions compete with
+searches for the GIL and CPU. Run them separately to keep search latency
+flat during ingestion and to scale each role on its own:
+
+    python src/main.py --role ingest
+    python src/main.py --role api --workers 4
+"""
 import logging
 import os
+import argparse
+import atexit
+import tempfile
 import threading
 import time
 import sys
 from dotenv import load_dotenv
 
-from queue_consumer import QueueConsumer
-from api.server import start_api_server
-from storage.db_manager import get_db_manager
-
 # Load environment variables
 load_dotenv()
 
@@ -20,21 +38,73 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def main():
-    """Main entry point for the processing service"""
+ROLES = ('all', 'api', 'ingest')
+
+# Modules using prometheus_client (storage.db_manager included) are imported
+# after the role is known: multi-worker metrics need PROMETHEUS_MULTIPROC_DIR
+# to be set first
+
+def close_database():
+    """Close this process's connection pool, if it opened one"""
+    from storage.db_manager import DatabaseManager
+    if DatabaseManager._instance is not None:
+        DatabaseManager._instance.close()
+        logger.info("Database connections closed")
+
+def prepare_metrics_dir() -> str:
+    """
+    Create or empty the directory of multi-worker metrics, and empty it again at exit
+
+    Samples left by an earlier run (or by one that crashed) would otherwise
+    be added to this run's. Without PROMETHEUS_MULTIPROC_DIR, a fixed
+    directory per API port under the system temp dir is used, so a crashed
+    run's files are wiped by the next start instead of piling up.
+    """
+    path = os.getenv('PROMETHEUS_MULTIPROC_DIR') or os.path.join(
+        tempfile.gettempdir(), f"processing-service-metrics-{os.getenv('API_PORT', '8000')}"
+    )
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = path
+
+    def clear():
+        for name in os.listdir(path):
+            if name.endswith('.db'):
+                os.remove(os.path.join(path, name))
+
+    os.makedirs(path, exist_ok=True)
+    clear()
+    atexit.register(clear)
+    return path
+
+def run_api(workers: int):
+    """Run the search API in this process, with `workers` worker processes"""
+    if workers > 1:
+        # Each worker is a fresh process; size their pools for the API's load
+        if os.getenv('API_DB_MAX_CONNECTIONS'):
+            os.environ['DB_MAX_CONNECTIONS'] = os.environ['API_DB_MAX_CONNECTIONS']
+        # Aggregate metrics across workers (must be set before prometheus_client is imported)
+        prepare_metrics_dir()
+    from api.server import start_api_server
+    start_api_server(workers=workers)
+
+def start_ingest_metrics():
+    """Serve /metrics for the ingest role, which has no API to expose them"""
+    port = int(os.getenv('INGEST_METRICS_PORT', '8001'))
+    if port <= 0:
+        return
+    from prometheus_client import start_http_server
+    from monitoring.metrics import register_pool_collector
+    from storage.db_manager import get_db_manager
+    register_pool_collector(get_db_manager)
+    start_http_server(port)
+    logger.info(f"✓ Ingest metrics served on port {port}")
+
+def run_ingest():
+    """Run the queue consumer, retrying the broker connection"""
+    from queue_consumer import QueueConsumer
+
     max_retries = 5
     retry_delay = 5  # seconds
     attempt = 0
-    
-    # Initialize database connection manager first
-    db_manager = get_db_manager()
-    logger.info("Database connection manager initialized")
-    
-    # Start the API server in a separate thread
-    api_thread = threading.Thread(target=start_api_server)
-    api_thread.daemon = True
-    api_thread.start()
-    logger.info("API server started in background thread")
 
     # Start the queue consumer with retry logic
     while attempt < max_retries:
@@ -53,22 +123,57 @@ def main():
             else:
                 logger.error("✗ Max retries reached. Exiting.")
                 # Close database connections on exit
-                db_manager.close()
-                logger.info("Database connections closed")
+                close_database()
                 sys.exit(1)
 
+def main():
+    """Main entry point for the processing service"""
+    parser = argparse.ArgumentParser(description="Processing service")
+    parser.add_argument('--role', choices=ROLES, default=os.getenv('SERVICE_ROLE', 'all'),
+                        help="What to run in this process (default: SERVICE_ROLE or all)")
+    parser.add_argument('--workers', type=int, default=int(os.getenv('API_WORKERS', '1')),
+                        help="API worker processes for the api role (default: API_WORKERS or 1)")
+    args = parser.parse_args()
+    logger.info(f"Starting processing service (role: {args.role})")
+
+    if args.role == 'api':
+        # The workers open their own pools; nothing to share from this process
+        run_api(args.workers)
+        return
+
+    # Initialize database connection manager first
+    from storage.db_manager import get_db_manager
+    db_manager = get_db_manager()
+    logger.info("Database connection manager initialized")
+
+    # Keep tables vacuumed and the vector index trained on current data
+    from storage.maintenance import MaintenanceScheduler
+    maintenance = MaintenanceScheduler(db_manager)
+    if maintenance.interval > 0:
+        maintenance.start()
+
+    if args.role == 'all':
+        # Start the API server in a separate thread (single worker, shares this process)
+        from api.server import start_api_server
+        api_thread = threading.Thread(target=start_api_server)
+        api_thread.daemon = True
+        api_thread.start()
+        logger.info("API server started in background thread")
+    else:
+        start_ingest_metrics()
+
+    run_ingest()
+
 if __name__ == "__main__":
     try:
         main()
     except KeyboardInterrupt:
         logger.info("\n=== Service Shutdown Requested ===")
         # Close database connections on exit
-        get_db_manager().close()
-        logger.info("Database connections closed")
+        close_database()
         sys.exit(0)
     except Exception as e:
         logger.error(f"\n✗ Fatal error: {e}")
         # Close database connections on exit
-        get_db_manager().close()
-        logger.info("Database connections closed")
-        sys.exit(1)
\ No newline at end of file
+        close_database()
+        sys.exit(1)
@@ -0,0 +1,259 @@
+# processing-service/src/monitoring/metrics.py
+"""
+Prometheus metrics for the processing service
+
+Counters and histograms are updated in-process with a lock-protected add,
+which costs well under a microsecond per observation. Values that have to
+be read from other objects (like the database pool) are only computed when
+/metrics is scraped.
+
+When the API runs as several worker processes, PROMETHEUS_MULTIPROC_DIR is
+set before any worker starts and every process writes its samples there;
+/metrics then aggregates all workers instead of reporting whichever one
+served the scrape. Gauges say how worker values combine (multiprocess_mode:
+summed, or the lowest / highest live worker); "live" modes drop a worker's
+values once it calls mark_process_dead on shutdown.
+"""
+import os
+
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client import CollectorRegistry, multiprocess
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, REGISTRY
+
+# Set by main.py before this module is imported when the API runs several workers
+MULTIPROCESS = bool(os.getenv('PROMETHEUS_MULTIPROC_DIR'))
+
+# Pipeline stages take from milliseconds (chunking a memo) to many minutes
+# (converting a book), so the buckets span a wide range
+PIPELINE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+# Search stages are expected to stay well below a second
+SEARCH_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+PIPELINE_STAGE_SECONDS = Histogram(
+    'pipeline_stage_duration_seconds',
+    'Time spent in each document processing stage, per document',
+    ['stage'],
+    buckets=PIPELINE_BUCKETS
+)
+
+PAGES_PROCESSED = Counter(
+    'pipeline_pages_processed_total',
+    'Pages converted by the extraction stage'
+)
+
+EXTRACTION_PAGES = Counter(
+    'pipeline_extraction_pages_total',
+    'Pages converted, by whether the OCR and table-structure models ran',
+    ['ocr', 'tables']
+)
+
+CHUNKS_PROCESSED = Counter(
+    'pipeline_chunks_processed_total',
+    'Chunks embedded and stored'
+)
+
+CHUNKS_REUSED = Counter(
+    'pipeline_chunks_reused_total',
+    'Chunks whose stored embedding was reused because their text was unchanged'
+)
+
+EMBEDDING_TOKENS = Counter(
+    'embedding_tokens_total',
+    'Tokens sent to the embedding provider',
+    ['source']
+)
+
+EMBEDDING_QUEUE_WAIT_SECONDS = Histogram(
+    'embedding_queue_wait_seconds',
+    'Time embedding calls waited in the scheduler for rate-limit capacity',
+    ['priority'],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+)
+
+EMBEDDING_QUEUE_DEPTH = Gauge(
+    'embedding_queue_depth',
+    'Embedding calls waiting in the scheduler',
+    ['priority'],
+    multiprocess_mode='livesum'
+)
+
+EMBEDDING_THROTTLED = Counter(
+    'embedding_throttled_total',
+    'Embedding calls rejected by the provider\'s rate limits',
+    ['priority']
+)
+
+EMBEDDING_RATE_FACTOR = Gauge(
+    'embedding_rate_factor',
+    'Share of the configured embedding rate limits the scheduler currently uses (lowered after throttling)',
+    multiprocess_mode='livemin'
+)
+
+SEARCH_STAGE_SECONDS = Histogram(
+    'search_stage_duration_seconds',
+    'Time spent in each vector search stage',
+    ['stage'],
+    buckets=SEARCH_BUCKETS
+)
+
+SEARCH_CACHE_LOOKUPS = Counter(
+    'search_cache_lookups_total',
+    'Semantic query cache lookups by result (hit rate = hit / all)',
+    ['result']
+)
+
+SEARCH_CACHE_INVALIDATIONS = Counter(
+    'search_cache_invalidations_total',
+    'Semantic query cache entries dropped because their chunks changed'
+)
+
+SEARCH_CACHE_ENTRIES = Gauge(
+    'search_cache_entries',
+    'Queries currently held by the semantic query cache',
+    multiprocess_mode='livesum'
+)
+
+SEARCH_PREWARM_PROBE_SECONDS = Gauge(
+    'search_prewarm_probe_seconds',
+    'First-query latency of a hot query not replayed, run before (cold) and after the last cache warming run',
+    ['phase'],
+    multiprocess_mode='livemax'
+)
+
+SEARCH_PREWARM_BLOCKS = Counter(
+    'search_prewarm_blocks_total',
+    'Index blocks loaded into shared buffers by the cache warmer',
+    ['relation']
+)
+
+DB_POOL_WAIT_SECONDS = Histogram(
+    'db_pool_wait_seconds',
+    'Time spent waiting for a connection from the database pool',
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+)
+
+DB_MAINTENANCE_OPERATIONS = Counter(
+    'db_maintenance_operations_total',
+    'VACUUM, ANALYZE and REINDEX runs started by the maintenance scheduler',
+    ['operation', 'target']
+)
+
+DB_TABLE_DEAD_TUPLES = Gauge(
+    'db_table_dead_tuples',
+    'Dead tuples per table at the last maintenance check',
+    ['table'],
+    multiprocess_mode='max'
+)
+
+DB_INDEX_CHANGE_RATIO = Gauge(
+    'db_index_change_ratio',
+    'Rows changed since the last rebuild of an index, relative to the rows it was built on',
+    ['index'],
+    multiprocess_mode='max'
+)
+
+QUEUE_JOBS_IN_FLIGHT = Gauge(
+    'queue_jobs_in_flight',
+    'Jobs currently being processed by the queue consumer',
+    ['lane'],
+    multiprocess_mode='livesum'
+)
+
+
+# Pool utilization of every worker in multi-process mode, where a scrape-time
+# collector would only see the worker serving the scrape; kept out of the
+# default registry, which has DatabasePoolCollector under the same names
+DB_POOL_CONNECTIONS = Gauge(
+    'db_pool_connections',
+    'Connections in the database pool by state (waiting counts queued callers)',
+    ['state'],
+    multiprocess_mode='livesum',
+    registry=None
+)
+
+DB_POOL_CHECKOUT_TIMEOUTS = Counter(
+    'db_pool_checkout_timeouts',
+    'Connection checkouts that timed out waiting for the pool',
+    registry=None
+)
+
+
+def record_pool_state(in_use: int, idle: int, max_connections: int, waiting: int) -> None:
+    """Publish a worker's pool utilization (multi-process mode only)"""
+    if not MULTIPROCESS:
+        return
+    DB_POOL_CONNECTIONS.labels(state='in_use').set(in_use)
+    DB_POOL_CONNECTIONS.labels(state='idle').set(idle)
+    DB_POOL_CONNECTIONS.labels(state='max').set(max_connections)
+    DB_POOL_CONNECTIONS.labels(state='waiting').set(waiting)
+
+
+def record_pool_timeout() -> None:
+    """Count a checkout timeout (multi-process mode only)"""
+    if MULTIPROCESS:
+        DB_POOL_CHECKOUT_TIMEOUTS.inc()
+
+
+class DatabasePoolCollector:
+    """Reads pool utilization from the database manager at scrape time"""
+
+    def __init__(self, get_db_manager):
+        """
+        Args:
+            get_db_manager: Callable returning the database manager
+        """
+        self.get_db_manager = get_db_manager
+
+    def describe(self):
+        # Registering calls describe, or else collect, which would open the pool
+        yield GaugeMetricFamily('db_pool_connections', '', labels=['state'])
+        yield CounterMetricFamily('db_pool_checkout_timeouts', '')
+
+    def collect(self):
+        stats = self.get_db_manager().pool_stats()
+        connections = GaugeMetricFamily(
+            'db_pool_connections',
+            'Connections in the database pool by state (waiting counts queued callers)',
+            labels=['state']
+        )
+        connections.add_metric(['in_use'], stats['in_use'])
+        connections.add_metric(['idle'], stats['idle'])
+        connections.add_metric(['max'], stats['max'])
+        connections.add_metric(['waiting'], stats['waiting'])
+        yield connections
+
+        timeouts = CounterMetricFamily(
+            'db_pool_checkout_timeouts',
+            'Connection checkouts that timed out waiting for the pool'
+        )
+        timeouts.add_metric([], stats['timeouts'])
+        yield timeouts
+
+
+def register_pool_collector(get_db_manager) -> None:
+    """Expose database pool utilization on /metrics"""
+    if MULTIPROCESS:
+        # Workers publish it through record_pool_state instead
+        return
+    REGISTRY.register(DatabasePoolCollector(get_db_manager))
+
+
+def mark_process_dead() -> None:
+    """Drop this worker's live gauge values (call when a worker shuts down)"""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def render_metrics():
+    """
+    Render all metrics in the Prometheus text format
+
+    Returns:
+        Tuple of (payload bytes, content type)
+    """
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,269 @@
+# processing-service/src/monitoring/profiler.py
+import os
+import io
+import json
+import time
+import random
+import pstats
+import cProfile
+import logging
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Pipeline jobs running in this process (lane workers run them in threads).
+# cProfile and tracemalloc would mix other jobs' work into a profiled job's
+# reports, so a profiled job runs alone: jobs starting meanwhile wait for it,
+# a requested profile waits for the running jobs to finish (holding back new
+# ones), and a sampled job is only profiled when no other job is running.
+_jobs = threading.Condition()
+_running_jobs = 0
+_profiling = False
+_profiles_waiting = 0
+
+# What the reports cover, written to every summary
+SCOPE = {
+    'cpu': "thread running the job; work in other threads and processes (page shards, "
+           "ONNX workers) is not included",
+    'memory': "whole process; no other job runs while a job is profiled, but allocations of "
+              "other threads (the API with role all) are included"
+}
+
+
+def _job_started(job_id: str, requested: bool, sampled: bool) -> bool:
+    """
+    Count a starting job, waiting while a profiled job runs
+
+    Returns:
+        Whether the job is profiled
+    """
+    global _running_jobs, _profiling, _profiles_waiting
+    with _jobs:
+        if requested:
+            if _running_jobs or _profiling:
+                logger.info(f"Job {job_id} waits for {_running_jobs} running jobs to finish before being profiled")
+            _profiles_waiting += 1
+            _jobs.wait_for(lambda: _running_jobs == 0 and not _profiling)
+            _profiles_waiting -= 1
+        else:
+            _jobs.wait_for(lambda: not _profiling and _profiles_waiting == 0)
+            if sampled and _running_jobs:
+                logger.info(f"Job {job_id} was sampled for profiling but other jobs are running; not profiled")
+        profiled = requested or (sampled and _running_jobs == 0)
+        _running_jobs += 1
+        _profiling = profiled
+        return profiled
+
+
+def _job_finished(profiled: bool) -> None:
+    global _running_jobs, _profiling
+    with _jobs:
+        _running_jobs -= 1
+        if profiled:
+            _profiling = False
+        _jobs.notify_all()
+
+
+def get_profile_dir() -> str:
+    """Directory where profiling reports are written"""
+    return os.path.abspath(os.getenv('PROFILE_DIR', './profiles'))
+
+
+class NullProfiler:
+    """Profiler used for jobs that aren't profiled; every call is a no-op"""
+
+    enabled = False
+
+    def __init__(self):
+        self._finished = False
+
+    @contextmanager
+    def stage(self, name: str):
+        yield
+
+    def flag(self, stage: str, limitation: str) -> None:
+        pass
+
+    def write_summary(self, status: str) -> None:
+        if not self._finished:
+            self._finished = True
+            _job_finished(False)
+
+
+class JobProfiler:
+    """
+    Captures a cProfile report and tracemalloc peak for each pipeline stage
+
+    Reports are written to PROFILE_DIR/<job_id>/:
+        <stage>.prof      raw cProfile stats (open with snakeviz or pstats)
+        <stage>.txt       top functions by cumulative time
+        <stage>.mem.txt   top allocation sites at the end of the stage
+        summary.json      wall time and peak memory per stage
+
+    No other pipeline job runs in the process while a job is profiled (see
+    for_job). cProfile only sees the thread running the job: page shards
+    converted in other processes and work handed to other threads show up as
+    time spent waiting. tracemalloc is process-wide, so peak memory includes
+    allocations of other threads, such as the API's with role all. Stages the
+    pipeline flagged (e.g. sharded extraction) list the reason under
+    'limitations' in summary.json.
+    """
+
+    enabled = True
+
+    def __init__(self, job_id: str, profile_dir: Optional[str] = None):
+        """
+        Args:
+            job_id: ID of the job being profiled
+            profile_dir: Root directory for reports (defaults to PROFILE_DIR)
+        """
+        self.job_id = job_id
+        self.report_dir = os.path.join(profile_dir or get_profile_dir(), os.path.basename(job_id))
+        os.makedirs(self.report_dir, exist_ok=True)
+        self.top_n = int(os.getenv('PROFILE_TOP_FUNCTIONS', '40'))
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.started_at = time.time()
+        self._finished = False
+
+    @classmethod
+    def for_job(cls, job_id: str, requested: bool = False):
+        """
+        Create a profiler for a job if it was requested or sampled
+
+        A profiled job runs alone in the process: jobs starting meanwhile
+        wait for it to finish, a requested job waits for the running jobs
+        before it starts, and a sampled job is not profiled if other jobs
+        are running.
+
+        Args:
+            job_id: ID of the job
+            requested: Whether the queue message asked for profiling
+
+        Returns:
+            A JobProfiler, or a NullProfiler when the job isn't profiled;
+            either way, write_summary must be called when the job ends
+        """
+        sample_rate = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+        sampled = sample_rate > 0 and random.random() < sample_rate
+        if not _job_started(job_id, requested, sampled):
+            return NullProfiler()
+        try:
+            profiler = cls(job_id)
+        except Exception:
+            _job_finished(True)
+            raise
+        logger.info(f"Profiling job {job_id}")
+        return profiler
+
+    @contextmanager
+    def stage(self, name: str):
+        """Profile one pipeline stage"""
+        profile = cProfile.Profile()
+        tracemalloc.start(int(os.getenv('PROFILE_TRACEMALLOC_FRAMES', '10')))
+        start_memory, _ = tracemalloc.get_traced_memory()
+        start_time = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            duration = time.perf_counter() - start_time
+            _, peak_memory = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+
+            self.stages[name] = {
+                'duration_seconds': round(duration, 4),
+                'peak_memory_bytes': peak_memory,
+                'peak_memory_delta_bytes': peak_memory - start_memory,
+                'limitations': self.stages.get(name, {}).get('limitations', [])
+            }
+            self._write_stage_reports(name, profile, snapshot)
+
+    def flag(self, stage: str, limitation: str) -> None:
+        """
+        Record why a stage's figures are incomplete or include other work
+
+        Args:
+            stage: Name of a profiled stage
+            limitation: What the stage's report misses or overcounts
+        """
+        self.stages.setdefault(stage, {'limitations': []})['limitations'].append(limitation)
+        logger.info(f"Profile of job {self.job_id}, stage {stage}: {limitation}")
+
+    def _write_stage_reports(self, name: str, profile: cProfile.Profile,
+                             snapshot: tracemalloc.Snapshot) -> None:
+        profile.dump_stats(os.path.join(self.report_dir, f"{name}.prof"))
+
+        stream = io.StringIO()
+        pstats.Stats(profile, stream=stream).sort_stats('cumulative').print_stats(self.top_n)
+        with open(os.path.join(self.report_dir, f"{name}.txt"), 'w') as f:
+            f.write(stream.getvalue())
+
+        with open(os.path.join(self.report_dir, f"{name}.mem.txt"), 'w') as f:
+            for stat in snapshot.statistics('lineno')[:self.top_n]:
+                f.write(f"{stat}\n")
+
+    def write_summary(self, status: str) -> None:
+        """
+        Write the per-stage summary for the job
+
+        Args:
+            status: Final status of the job (success or failed)
+        """
+        if not self._finished:
+            self._finished = True
+            _job_finished(True)
+        summary = {
+            'job_id': self.job_id,
+            'status': status,
+            'started_at': self.started_at,
+            'finished_at': time.time(),
+            'scope': SCOPE,
+            'stages': self.stages
+        }
+        with open(os.path.join(self.report_dir, 'summary.json'), 'w') as f:
+            json.dump(summary, f, indent=2)
+        logger.info(f"Profiling report for job {self.job_id} written to {self.report_dir}")
+
+
+class ProfileReports:
+    """Read access to the profiling reports written by JobProfiler"""
+
+    def __init__(self, profile_dir: Optional[str] = None):
+        self.profile_dir = profile_dir or get_profile_dir()
+
+    def list_reports(self) -> List[Dict[str, Any]]:
+        """
+        List profiled jobs, most recent first
+
+        Returns:
+            List of job summaries
+        """
+        if not os.path.isdir(self.profile_dir):
+            return []
+
+        reports = []
+        for job_id in os.listdir(self.profile_dir):
+            summary = self.get_summary(job_id)
+            if summary is not None:
+                reports.append(summary)
+        return sorted(reports, key=lambda r: r.get('started_at', 0), reverse=True)
+
+    def get_summary(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get the summary of a profiled job, or None if it doesn't exist"""
+        path = os.path.join(self.profile_dir, os.path.basename(job_id), 'summary.json')
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            summary = json.load(f)
+        summary['files'] = sorted(os.listdir(os.path.dirname(path)))
+        return summary
+
+    def get_file_path(self, job_id: str, file_name: str) -> Optional[str]:
+        """Resolve a report file of a job, or None if it doesn't exist"""
+        path = os.path.join(self.profile_dir, os.path.basename(job_id), os.path.basename(file_name))
+        return path if os.path.isfile(path) else None
@@ -0,0 +1,378 @@
+# processing-service/src/process_pipeline/backfill.py
+"""
+Bulk backfill of a directory of PDFs, without the queue
+
+Loading an existing archive through RabbitMQ means a message and a full
+single-document pipeline run per file. The backfill walks a directory and
+runs the pipeline in bulk instead:
+
+- docling conversion and chunking run on a process pool, one file per
+  worker (page sharding is off; the files themselves are the parallelism)
+- finished documents are buffered until BACKFILL_FLUSH_CHUNKS chunks are
+  pending; their chunks are then embedded together (provider calls are
+  packed across documents) and written with COPY in one transaction
+- every file is fingerprinted (SHA-256); the fingerprint is the document's
+  job id, so identical files are loaded once and a re-run updates the same
+  document instead of adding another
+- progress is appended to a manifest (JSON lines) after each commit; a run
+  with the same manifest skips files already loaded, so an interrupted
+  backfill resumes where it stopped
+
+Throughput (files, pages and chunks per second) and an ETA based on the
+bytes left are logged every --report-interval seconds.
+
+Usage (from processing-service/src):
+    python -m process_pipeline.backfill /data/archive --manifest archive.jsonl
+    python -m process_pipeline.backfill /data/archive --manifest archive.jsonl --workers 8 --collection-id 3
+"""
+import os
+import json
+import time
+import fnmatch
+import hashlib
+import argparse
+import datetime
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from process_pipeline.chunk_batch import ChunkBatch
+from process_pipeline.embed import TextEmbedder
+from embeddings.providers import get_embedding_provider
+from storage.db_manager import DatabaseManager, get_db_manager
+from storage.document_store import DocumentStore
+from storage.vectors import check_corpus_model
+from monitoring.metrics import PAGES_PROCESSED
+
+logger = logging.getLogger(__name__)
+
+# Extractor and chunker of the current pool worker process, reused across files
+_pipeline = None
+
+
+def _get_pipeline():
+    global _pipeline
+    if _pipeline is None:
+        from process_pipeline.extract import TextExtractor
+        from process_pipeline.chunk import TextChunker
+        _pipeline = (TextExtractor(), TextChunker())
+    return _pipeline
+
+
+def convert_file(file_path: str, extraction: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Convert and chunk one file (runs in a pool worker)
+
+    Returns:
+        Dict with the conversion ('document', as a dict), the number of pages
+        and the chunks as a ChunkBatch without a document yet (or None)
+    """
+    extractor, chunker = _get_pipeline()
+    extracted = extractor.extract(file_path, {'mode': extraction, 'shard_pages': 0})
+    document = extracted['document']
+    chunks = chunker.chunk_text(document)
+    batch = None
+    if chunks:
+        batch = ChunkBatch.from_chunks(chunks, None, None, chunker.assign_parents(chunks))
+    return {'document': extracted['json'], 'pages': len(document.pages), 'batch': batch}
+
+
+def fingerprint(file_path: str, block_size: int = 1 << 20) -> str:
+    """SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _format_duration(seconds: float) -> str:
+    return str(datetime.timedelta(seconds=int(seconds)))
+
+
+class Backfill:
+    """Loads every matching file under a directory, resumably"""
+
+    def __init__(self, db_manager: DatabaseManager, directory: str, manifest_path: str,
+                 collection_id: Optional[int] = None, workers: Optional[int] = None,
+                 pattern: str = '*.pdf', extraction: Optional[str] = None,
+                 flush_chunks: Optional[int] = None, report_interval: float = 30.0):
+        """
+        Args:
+            db_manager: Database connection manager
+            directory: Directory to walk (recursively)
+            manifest_path: JSON lines file recording loaded and failed files
+            collection_id: Collection to load the documents into (defaults to the default collection)
+            workers: Conversion processes (defaults to BACKFILL_WORKERS, or the number of CPUs)
+            pattern: Filename pattern of the files to load
+            extraction: Extraction mode (defaults to EXTRACTION_MODE)
+            flush_chunks: Pending chunks that trigger an embed + store round
+                (defaults to BACKFILL_FLUSH_CHUNKS, or 2000)
+            report_interval: Seconds between progress reports
+        """
+        self.db_manager = db_manager
+        self.directory = directory
+        self.manifest_path = manifest_path
+        self.collection_id = collection_id
+        self.workers = workers or int(os.getenv('BACKFILL_WORKERS', str(os.cpu_count() or 1)))
+        self.pattern = pattern
+        self.extraction = extraction
+        self.flush_chunks = flush_chunks or int(os.getenv('BACKFILL_FLUSH_CHUNKS', '2000'))
+        self.report_interval = report_interval
+
+        self.document_store = DocumentStore(db_manager)
+        self.embedder = TextEmbedder(db_manager, provider=get_embedding_provider())
+
+        # Documents converted but not stored yet: (file entry, batch or None)
+        self.buffer: List[Tuple[Dict[str, Any], Optional[ChunkBatch]]] = []
+        self.buffered_chunks = 0
+        # Fingerprints of the files stored, and files waiting on an earlier
+        # file of the same content that is still being loaded (by fingerprint)
+        self.fingerprints: set = set()
+        self.duplicates: Dict[str, List[Dict[str, Any]]] = {}
+        self.stats = {'files_total': 0, 'bytes_total': 0, 'files_done': 0, 'files_failed': 0,
+                      'files_skipped': 0, 'bytes_done': 0, 'pages': 0, 'chunks': 0}
+        self.start_time = None
+
+    def _load_manifest(self) -> Tuple[Dict[str, Dict[str, Any]], set]:
+        """Loaded files by path and the fingerprints of all loaded files"""
+        loaded, fingerprints = {}, set()
+        if not os.path.exists(self.manifest_path):
+            return loaded, fingerprints
+        with open(self.manifest_path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                # Failed files are retried on the next run
+                if record['status'] == 'done':
+                    loaded[record['path']] = record
+                    fingerprints.add(record['sha256'])
+        return loaded, fingerprints
+
+    def _write_manifest(self, records: List[Dict[str, Any]]) -> None:
+        with open(self.manifest_path, 'a') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def plan(self) -> List[Dict[str, Any]]:
+        """
+        Files under the directory that aren't in the manifest yet
+
+        A file is recognized by path, size and modification time; anything
+        else is fingerprinted when it is submitted.
+        """
+        loaded, _ = self._load_manifest()
+        files = []
+        for root, dirs, names in os.walk(self.directory):
+            dirs.sort()
+            for name in sorted(names):
+                if not fnmatch.fnmatch(name.lower(), self.pattern.lower()):
+                    continue
+                path = os.path.abspath(os.path.join(root, name))
+                stat = os.stat(path)
+                record = loaded.get(path)
+                if record and record['size'] == stat.st_size and record['mtime_ns'] == stat.st_mtime_ns:
+                    self.stats['files_skipped'] += 1
+                    continue
+                files.append({'path': path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns})
+        return files
+
+    def _record(self, entry: Dict[str, Any], status: str, **fields) -> Dict[str, Any]:
+        return {**entry, 'status': status, **fields, 'finished_at': time.time()}
+
+    def _fail(self, entry: Dict[str, Any], error: Exception) -> Dict[str, Any]:
+        logger.error(f"✗ {entry['path']}: {error}")
+        self.stats['files_failed'] += 1
+        self.stats['bytes_done'] += entry['size']
+        return self._record(entry, 'failed', error=str(error))
+
+    def _duplicate(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Record a file with the same content as a stored one; it isn't loaded again"""
+        self.stats['files_skipped'] += 1
+        self.stats['bytes_total'] -= entry['size']
+        self.stats['files_total'] -= 1
+        return self._record(entry, 'done', duplicate=True, chunks=0)
+
+    def _settle(self, entry: Dict[str, Any], error: Optional[Exception] = None) -> List[Dict[str, Any]]:
+        """
+        Manifest records of a loaded or failed file and of the files waiting on it
+
+        Duplicates are only recorded as done once the original is stored;
+        when it fails they fail too, so a resumed run loads them again.
+        """
+        duplicates = self.duplicates.pop(entry['sha256'], [])
+        if error is not None:
+            duplicate_error = RuntimeError(f"same content as {entry['path']}, which failed: {error}")
+            return [self._fail(entry, error)] + [self._fail(duplicate, duplicate_error) for duplicate in duplicates]
+        self.fingerprints.add(entry['sha256'])
+        return [self._record(entry, 'done', chunks=entry['chunks'])] + \
+            [self._duplicate(duplicate) for duplicate in duplicates]
+
+    def _add(self, entry: Dict[str, Any], result: Dict[str, Any]) -> None:
+        """Create the document of a converted file and buffer its chunks"""
+        document_id = self.document_store.get_or_create_document(
+            f"backfill-{entry['sha256']}", os.path.basename(entry['path']), self.collection_id
+        )
+        self.document_store.save(document_id, result['document'])
+        entry['document_id'] = document_id
+        entry['pages'] = result['pages']
+        PAGES_PROCESSED.inc(result['pages'])
+
+        batch = result['batch']
+        if batch is not None:
+            batch.document_id = document_id
+            self.buffered_chunks += len(batch)
+        self.buffer.append((entry, batch))
+
+    def flush(self) -> None:
+        """Embed and store the buffered documents, then record them in the manifest"""
+        if not self.buffer:
+            return
+        buffer, self.buffer, self.buffered_chunks = self.buffer, [], 0
+        batches = [batch for _, batch in buffer if batch is not None]
+        try:
+            if batches:
+                self.embedder.embed_batches(batches)
+                self.embedder.store_batches(batches)
+        except Exception as e:
+            self._write_manifest([record for entry, _ in buffer for record in self._settle(entry, e)])
+            return
+
+        records = []
+        for entry, batch in buffer:
+            entry['chunks'] = len(batch) if batch is not None else 0
+            self.stats['files_done'] += 1
+            self.stats['bytes_done'] += entry['size']
+            self.stats['pages'] += entry['pages']
+            self.stats['chunks'] += entry['chunks']
+            records.extend(self._settle(entry))
+        self._write_manifest(records)
+
+    def report(self) -> Dict[str, Any]:
+        """Log and return progress, throughput and ETA"""
+        elapsed = max(time.time() - self.start_time, 1e-9)
+        stats = self.stats
+        bytes_left = stats['bytes_total'] - stats['bytes_done']
+        bytes_rate = stats['bytes_done'] / elapsed
+        progress = {
+            **stats,
+            'elapsed_seconds': round(elapsed, 1),
+            'files_per_second': round((stats['files_done'] + stats['files_failed']) / elapsed, 3),
+            'pages_per_second': round(stats['pages'] / elapsed, 2),
+            'chunks_per_second': round(stats['chunks'] / elapsed, 2),
+            'eta_seconds': round(bytes_left / bytes_rate) if bytes_rate else None
+        }
+        eta = _format_duration(progress['eta_seconds']) if progress['eta_seconds'] is not None else 'unknown'
+        logger.info(
+            f"Backfill: {stats['files_done'] + stats['files_failed']}/{stats['files_total']} files "
+            f"({stats['files_failed']} failed), {stats['pages']} pages, {stats['chunks']} chunks in "
+            f"{_format_duration(elapsed)} - {progress['files_per_second']} files/s, "
+            f"{progress['pages_per_second']} pages/s, {progress['chunks_per_second']} chunks/s, ETA {eta}"
+        )
+        return progress
+
+    def run(self) -> Dict[str, Any]:
+        """
+        Load every file not loaded yet
+
+        Returns:
+            Final progress (see report)
+        """
+        check_corpus_model(self.db_manager, self.embedder.provider.model)
+        files = self.plan()
+        _, self.fingerprints = self._load_manifest()
+        self.stats['files_total'] = len(files)
+        self.stats['bytes_total'] = sum(entry['size'] for entry in files)
+        logger.info(f"Backfill of {self.directory}: {len(files)} files to load "
+                    f"({self.stats['files_skipped']} already loaded), {self.workers} workers")
+
+        self.start_time = time.time()
+        last_report = self.start_time
+        queued = iter(files)
+        pending = {}
+        # Spawned, not forked: torch threads in the parent don't survive a fork
+        pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+        try:
+            while True:
+                # Keep every worker busy with one file queued behind it
+                while len(pending) < self.workers * 2:
+                    entry = next(queued, None)
+                    if entry is None:
+                        break
+                    entry['sha256'] = fingerprint(entry['path'])
+                    if entry['sha256'] in self.fingerprints:
+                        # Same content as a file stored before (or earlier in this run)
+                        self._write_manifest([self._duplicate(entry)])
+                        continue
+                    if entry['sha256'] in self.duplicates:
+                        # Same content as a file still being loaded; settled with it
+                        self.duplicates[entry['sha256']].append(entry)
+                        continue
+                    self.duplicates[entry['sha256']] = []
+                    pending[pool.submit(convert_file, entry['path'], self.extraction)] = entry
+                if not pending:
+                    break
+
+                done, _ = wait(pending, timeout=self.report_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    entry = pending.pop(future)
+                    try:
+                        self._add(entry, future.result())
+                    except Exception as e:
+                        self._write_manifest(self._settle(entry, e))
+
+                if self.buffered_chunks >= self.flush_chunks or (not pending and self.buffer):
+                    self.flush()
+                if time.time() - last_report >= self.report_interval:
+                    self.report()
+                    last_report = time.time()
+            self.flush()
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        logger.info("=== Backfill Complete ===")
+        return self.report()
+
+
+def main():
+    """Command line entry point"""
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Load a directory of PDFs without the queue")
+    parser.add_argument('directory')
+    parser.add_argument('--manifest', required=True, help="Progress file; reuse it to resume")
+    parser.add_argument('--collection-id', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--pattern', default='*.pdf')
+    parser.add_argument('--extraction', choices=('auto', 'full'), default=None)
+    parser.add_argument('--flush-chunks', type=int, default=None)
+    parser.add_argument('--report-interval', type=float, default=30.0)
+    args = parser.parse_args()
+
+    db_manager = get_db_manager()
+    try:
+        backfill = Backfill(
+            db_manager,
+            directory=args.directory,
+            manifest_path=args.manifest,
+            collection_id=args.collection_id,
+            workers=args.workers,
+            pattern=args.pattern,
+            extraction=args.extraction,
+            flush_chunks=args.flush_chunks,
+            report_interval=args.report_interval
+        )
+        print(json.dumps(backfill.run(), indent=2))
+    finally:
+        db_manager.close()
+
+
+if __name__ == '__main__':
+    main()
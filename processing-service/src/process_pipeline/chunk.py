@@ -1,14 +1,30 @@
-from typing import List
+import os
+from typing import List, Optional
 from docling.chunking import HybridChunker
 from utils.tokenizer import OpenAITokenizerWrapper
 
 class TextChunker:
-    def __init__(self):
-        """Initialize the text chunker with HybridChunker from docling"""
+    def __init__(self, max_tokens: Optional[int] = None, parent_max_tokens: Optional[int] = None):
+        """
+        Initialize the text chunker with HybridChunker from docling
+
+        Chunks are kept small so their embeddings stay specific; consecutive
+        chunks of the same section are grouped into larger parent sections,
+        which searches can return for context without embedding them.
+
+        Args:
+            max_tokens: Maximum tokens per (embedded) chunk (defaults to
+                CHUNK_MAX_TOKENS, or 512)
+            parent_max_tokens: Maximum tokens per parent section (defaults to
+                CHUNK_PARENT_MAX_TOKENS, or 2048; 0 disables parent sections)
+        """
+        self.max_tokens = max_tokens or int(os.getenv('CHUNK_MAX_TOKENS', '512'))
+        self.parent_max_tokens = parent_max_tokens if parent_max_tokens is not None \
+            else int(os.getenv('CHUNK_PARENT_MAX_TOKENS', '2048'))
         self.tokenizer = OpenAITokenizerWrapper()
         self.chunker = HybridChunker(
             tokenizer=self.tokenizer,
-            max_tokens=8191,  # text-embedding-3-large's maximum context length
+            max_tokens=self.max_tokens,
             merge_peers=True,
         )
 
@@ -28,3 +44,34 @@ class TextChunker:
         except Exception as e:
             print(f"Error during chunking: {e}")
             raise
+
+    def assign_parents(self, chunks: List) -> Optional[List[int]]:
+        """
+        Group consecutive chunks under the same headings into parent sections
+
+        A section is closed when the headings change or when adding the next
+        chunk would exceed parent_max_tokens.
+
+        Args:
+            chunks: DocChunk objects from chunk_text, in document order
+
+        Returns:
+            Index of each chunk's parent section, or None if parent sections are disabled
+        """
+        if not self.parent_max_tokens:
+            return None
+
+        parents = []
+        parent = -1
+        headings = None
+        tokens = 0
+        for chunk in chunks:
+            chunk_tokens = len(self.tokenizer.tokenize(chunk.text))
+            chunk_headings = chunk.meta.headings or []
+            if parent < 0 or chunk_headings != headings or tokens + chunk_tokens > self.parent_max_tokens:
+                parent += 1
+                headings = chunk_headings
+                tokens = 0
+            tokens += chunk_tokens
+            parents.append(parent)
+        return parents
@@ -0,0 +1,207 @@
+# processing-service/src/process_pipeline/chunk_batch.py
+"""
+Compact representation of one document's chunks on their way to storage
+
+A dict per chunk holding a list of 1536 Python floats costs about 50 KB
+per chunk, so a large document held hundreds of MB of boxed floats through
+embedding and storage. ChunkBatch keeps the chunk attributes in parallel
+columns and the new embeddings in one contiguous float32 matrix (6 KB per
+chunk); reused chunks get no row in the matrix at all. SQL parameters are
+built lazily, one insert page at a time.
+
+Chunks can belong to parent sections (consecutive chunks of the same
+section, see TextChunker.assign_parents). Parents are stored without
+embeddings and built from their chunks when the batch is stored.
+"""
+import json
+import hashlib
+from typing import List, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+from storage.vectors import to_vector_literal
+
+
+# Characters with a meaning in COPY's text format
+_COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def _copy_field(value) -> str:
+    """Format a value as a field of COPY's text format"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, list):
+        return '{' + ','.join(str(item) for item in value) + '}'
+    return str(value).translate(_COPY_ESCAPES)
+
+
+def chunk_hash(text: str) -> str:
+    """Content hash identifying a chunk's text across document versions"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ChunkBatch:
+    """Column-oriented chunks of one document plus a float32 embedding matrix"""
+    __slots__ = ('document_id', 'collection_id', 'texts', 'hashes', 'page_numbers', 'metadata',
+                 'parents', 'parent_ids', 'reused_ids', 'previous_collection_ids', 'new_rows',
+                 'embeddings', 'chunk_ids')
+
+    def __init__(self, document_id: int, collection_id: int, texts: List[str],
+                 page_numbers: List[Optional[List[int]]], metadata: List[str],
+                 parents: Optional[List[int]] = None):
+        """
+        Args:
+            document_id: Document the chunks belong to
+            collection_id: Collection (chunks partition) of the document
+            texts: Chunk texts
+            page_numbers: Sorted page numbers of each chunk, or None
+            metadata: JSON-encoded metadata of each chunk
+            parents: Parent section index of each chunk (consecutive, from 0), or None
+        """
+        self.document_id = document_id
+        self.collection_id = collection_id
+        self.texts = texts
+        self.hashes = [chunk_hash(text) for text in texts]
+        self.page_numbers = page_numbers
+        self.metadata = metadata
+        self.parents = np.asarray(parents if parents is not None else [-1] * len(texts), dtype=np.int32)
+        self.parent_ids: Optional[np.ndarray] = None
+        # Stored row reused for each chunk (-1 for new chunks) and its current collection
+        self.reused_ids = np.full(len(texts), -1, dtype=np.int64)
+        self.previous_collection_ids = np.zeros(len(texts), dtype=np.int32)
+        self.new_rows = np.arange(len(texts))
+        self.embeddings: Optional[np.ndarray] = None
+        self.chunk_ids: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_chunks(cls, chunks: List, document_id: int, collection_id: int,
+                    parents: Optional[List[int]] = None) -> 'ChunkBatch':
+        """
+        Build a batch from docling DocChunk objects
+
+        Args:
+            chunks: DocChunk objects from the chunker
+            document_id: Document the chunks belong to
+            collection_id: Collection (chunks partition) of the document
+            parents: Parent section index of each chunk, or None
+
+        Returns:
+            The batch
+        """
+        texts, page_numbers, metadata = [], [], []
+        for chunk in chunks:
+            texts.append(chunk.text)
+            page_numbers.append(sorted(
+                set(
+                    prov.page_no
+                    for item in chunk.meta.doc_items
+                    for prov in item.prov
+                )
+            ) or None)
+            metadata.append(json.dumps({
+                "filename": chunk.meta.origin.filename,
+                "title": chunk.meta.headings[0] if chunk.meta.headings else None,
+            }))
+        return cls(document_id, collection_id, texts, page_numbers, metadata, parents)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    @property
+    def reused_count(self) -> int:
+        return len(self.texts) - len(self.new_rows)
+
+    def mark_reused(self, reusable: Dict[str, List[Tuple[int, int]]]) -> None:
+        """
+        Assign stored rows to chunks with the same text
+
+        Args:
+            reusable: Chunk hash to (id, collection_id) of matching stored rows;
+                consumed as rows are assigned
+        """
+        for row, hash_ in enumerate(self.hashes):
+            rows = reusable.get(hash_)
+            if rows:
+                self.reused_ids[row], self.previous_collection_ids[row] = rows.pop()
+        self.new_rows = np.flatnonzero(self.reused_ids < 0)
+
+    def texts_to_embed(self, start: int, stop: int) -> List[str]:
+        """Texts of new chunks start..stop, in new-row order"""
+        return [self.texts[row] for row in self.new_rows[start:stop]]
+
+    def set_embeddings(self, start: int, vectors: np.ndarray) -> None:
+        """Copy the vectors of new chunks start.. into the matrix, allocating it on first use"""
+        if self.embeddings is None:
+            self.embeddings = np.empty((len(self.new_rows), vectors.shape[1]), dtype=np.float32)
+        self.embeddings[start:start + len(vectors)] = vectors
+
+    @property
+    def parent_count(self) -> int:
+        return int(self.parents.max()) + 1 if len(self.parents) else 0
+
+    def parent_rows(self) -> List[tuple]:
+        """INSERT parameters of the parent sections, in parent order"""
+        rows = []
+        for parent in range(self.parent_count):
+            members = np.flatnonzero(self.parents == parent)
+            pages = sorted(set(
+                page for row in members for page in (self.page_numbers[row] or [])
+            )) or None
+            rows.append((
+                self.document_id,
+                '\n'.join(self.texts[row] for row in members),
+                pages,
+                # Chunks of a section share its filename and title
+                self.metadata[members[0]]
+            ))
+        return rows
+
+    def set_parent_ids(self, parent_ids: List[int]) -> None:
+        """Record the ids of the stored parent sections"""
+        self.parent_ids = np.asarray(parent_ids, dtype=np.int64)
+
+    def _parent_id(self, row: int) -> Optional[int]:
+        parent = self.parents[row]
+        if parent < 0 or self.parent_ids is None:
+            return None
+        return int(self.parent_ids[parent])
+
+    def insert_rows(self, model: str) -> Iterator[tuple]:
+        """INSERT parameters of the new chunks, formatted as they are consumed"""
+        for position, row in enumerate(self.new_rows):
+            yield (
+                self.collection_id,
+                self.document_id,
+                self.texts[row],
+                to_vector_literal(self.embeddings[position]),
+                self.page_numbers[row],
+                self.metadata[row],
+                self.hashes[row],
+                model,
+                self._parent_id(row)
+            )
+
+    def copy_rows(self, model: str) -> Iterator[str]:
+        """insert_rows() as lines of COPY's text format"""
+        for row in self.insert_rows(model):
+            yield '\t'.join(_copy_field(value) for value in row) + '\n'
+
+    def relink_rows(self) -> List[tuple]:
+        """UPDATE parameters moving the reused rows to this document"""
+        return [
+            (
+                int(self.reused_ids[row]),
+                int(self.previous_collection_ids[row]),
+                self.collection_id,
+                self.document_id,
+                self.page_numbers[row],
+                self.metadata[row],
+                self._parent_id(row)
+            )
+            for row in np.flatnonzero(self.reused_ids >= 0)
+        ]
+
+    def set_inserted_ids(self, inserted_ids: List[int]) -> None:
+        """Record the ids of the inserted rows, so every chunk has its stored id"""
+        self.chunk_ids = self.reused_ids.copy()
+        self.chunk_ids[self.new_rows] = inserted_ids
@@ -1,123 +1,165 @@
 # processing-service/src/process_pipeline/embed.py
+import io
 import os
-import json
+import time
 import logging
 from typing import List, Dict, Any, Optional
 import psycopg2
 from psycopg2.extras import execute_values
-from openai import OpenAI
+import numpy as np
 
 from storage.db_manager import DatabaseManager
+from storage.notifications import notify_chunks_changed
+from process_pipeline.chunk_batch import ChunkBatch
+from embeddings.providers import EmbeddingProvider, get_embedding_provider
+from embeddings.scheduler import EmbeddingScheduler, INGEST
+from monitoring.metrics import PIPELINE_STAGE_SECONDS, CHUNKS_PROCESSED, CHUNKS_REUSED, EMBEDDING_TOKENS
 
 logger = logging.getLogger(__name__)
 
 class TextEmbedder:
     """Generates and stores embeddings for text chunks"""
     
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: DatabaseManager, provider: Optional[EmbeddingProvider] = None,
+                 scheduler: Optional[EmbeddingScheduler] = None):
         """
-        Initialize the embedder with OpenAI client and database manager
+        Initialize the embedder with an embedding provider and database manager
         
         Args:
             db_manager: Database connection manager
+            provider: Embedding provider (defaults to the one configured by EMBEDDING_PROVIDER)
+            scheduler: Rate-limit scheduler (defaults to the process-wide one)
         """
         # Store the database manager
         self.db_manager = db_manager
         
-        # Initialize OpenAI client
-        api_key = os.getenv('OPENAI_API_KEY')
-        if not api_key:
-            logger.warning("OPENAI_API_KEY environment variable not set")
-            
-        self.client = OpenAI(api_key=api_key)
+        # Initialize embedding provider
+        self.provider = provider or get_embedding_provider()
+        self.scheduler = scheduler or EmbeddingScheduler.get_instance()
         logger.info("Text embedder initialized")
     
-    def create_embeddings(self, chunks: List, metadata: Dict = None) -> List[Dict]:
+    def create_embeddings(self, chunks: List, document_id: int, metadata: Dict = None,
+                          batch_size: Optional[int] = None, min_batch_interval: float = 0.0,
+                          previous_document_id: Optional[int] = None,
+                          parents: Optional[List[int]] = None) -> Dict[str, Any]:
         """
         Create embeddings for text chunks and store them in PostgreSQL with pgvector.
         
+        Chunks whose text (by hash) is already stored for this document, or for
+        the previous version of it, with the same embedding model are not
+        embedded again: their rows are kept and relinked to this document.
+        
         Args:
             chunks: A list of DocChunk objects. Each DocChunk contains text and metadata.
+            document_id: ID of the document record the chunks belong to.
             metadata: Additional metadata for the document (optional).
+            batch_size: Number of chunks sent to the provider per call (defaults
+                to the provider's preferred batch size).
+            min_batch_interval: Minimum seconds between provider calls, to throttle bulk jobs.
+            previous_document_id: Document this one is a revised version of; its
+                chunks are reused where unchanged and the rest are deleted.
+            parents: Parent section index of each chunk (see TextChunker.assign_parents);
+                the sections are stored with the chunks, without embeddings.
             
         Returns:
-            A list of dictionaries, where each dictionary represents a processed chunk.
+            Dict with the number of chunks stored, embedded and reused, and the
+            stored chunk ids in chunk order.
         """
         if not chunks:
             raise ValueError("The chunks list is empty.")
         
-        # First, create a document record in the database
-        document_id = self._create_document_record(metadata.get('filename'))
-        
-        # Process chunks into a structured format
-        processed_chunks = []
-        for i, chunk in enumerate(chunks):
-            # Generate embeddings for the chunk text
-            response = self.client.embeddings.create(
-                model="text-embedding-3-large",
-                input=chunk.text,
-                dimensions=1536
-            )
-            embedding = response.data[0].embedding  # Get the embedding vector
+        # Match unchanged chunks against the stored versions
+        source_document_ids = [document_id]
+        if previous_document_id is not None and previous_document_id != document_id:
+            source_document_ids.append(previous_document_id)
+        collections = self._document_collections(source_document_ids)
+        batch = ChunkBatch.from_chunks(chunks, document_id, collections[document_id], parents)
+        batch.mark_reused(self._find_reusable_chunks(collections, batch.hashes))
+        
+        batch_size = batch_size or self.provider.preferred_batch_size
+        embed_start = time.perf_counter()
+        last_call = 0.0
+        for start in range(0, len(batch.new_rows), batch_size):
+            wait = min_batch_interval - (time.monotonic() - last_call)
+            if wait > 0:
+                time.sleep(wait)
+            last_call = time.monotonic()
             
-            # Prepare the chunk data for insertion
-            processed_chunk = {
-                "document_id": document_id,
-                "chunk_text": chunk.text,
-                "embedding": embedding,
-                "page_numbers": sorted(
-                    set(
-                        prov.page_no
-                        for item in chunk.meta.doc_items
-                        for prov in item.prov
-                    )
-                )
-                or None,
-                "metadata": {
-                    "filename": chunk.meta.origin.filename,
-                    "title": chunk.meta.headings[0] if chunk.meta.headings else None,
-                },
-            }
-            processed_chunks.append(processed_chunk)
-        
-        # Insert the processed chunks into the database
-        self._store_chunks(processed_chunks)
-        
-        return processed_chunks
+            # Generate embeddings for the chunk texts
+            vectors, tokens = self.scheduler.embed(
+                self.provider, batch.texts_to_embed(start, start + batch_size), priority=INGEST, as_array=True
+            )
+            EMBEDDING_TOKENS.labels(source='ingest').inc(tokens)
+            batch.set_embeddings(start, vectors)
+        PIPELINE_STAGE_SECONDS.labels(stage='embed').observe(time.perf_counter() - embed_start)
+        
+        # Insert the new chunks and relink the reused ones
+        with PIPELINE_STAGE_SECONDS.labels(stage='store').time():
+            self._store_chunks(batch, collections)
+        embedded = len(batch.new_rows)
+        CHUNKS_PROCESSED.inc(embedded)
+        CHUNKS_REUSED.inc(batch.reused_count)
+        logger.info(f"Embedded {embedded} chunks, reused {batch.reused_count} of {len(batch)}")
+        
+        return {
+            'chunks': len(batch),
+            'embedded': embedded,
+            'reused': batch.reused_count,
+            'chunk_ids': batch.chunk_ids.tolist()
+        }
+    
+    def _document_collections(self, document_ids: List[int]) -> Dict[int, int]:
+        """Collection of each document, to route chunk reads and writes to its partition"""
+        sql = "SELECT id, collection_id FROM documents WHERE id = ANY(%s)"
+        return dict(self.db_manager.execute_query(sql, (document_ids,)))
     
-    def _create_document_record(self, filename: str) -> int:
+    def _find_reusable_chunks(self, collections: Dict[int, int],
+                              hashes: List[str]) -> Dict[str, List[tuple]]:
         """
-        Create a new document record in the database
+        Find stored chunks of the given documents with the same text and embedding model
         
         Args:
-            filename: The filename of the document
-            
+            collections: Collection of each source document
+            hashes: Hashes of the new chunks
+        
         Returns:
-            The ID of the newly created document
+            Dict mapping chunk hash to (id, collection_id) of matching rows
+        """
+        sql = """
+        SELECT id, collection_id, chunk_hash FROM chunks
+        WHERE collection_id = ANY(%s) AND document_id = ANY(%s)
+          AND embedding_model = %s AND chunk_hash = ANY(%s)
+        ORDER BY id DESC
         """
-        sql = 'INSERT INTO documents (filename) VALUES (%s) RETURNING id'
-        result = self.db_manager.execute_query(sql, (filename,), fetch_one=True)
-        return result
+        rows = self.db_manager.execute_query(
+            sql, (list(set(collections.values())), list(collections), self.provider.model, list(set(hashes)))
+        )
+        reusable = {}
+        for row_id, collection_id, row_hash in rows:
+            reusable.setdefault(row_hash, []).append((row_id, collection_id))
+        return reusable
     
-    def _store_chunks(self, processed_chunks: List[Dict]) -> None:
+    def _store_chunks(self, batch: ChunkBatch, collections: Optional[Dict[int, int]] = None) -> None:
         """
-        Store processed chunks in the database
+        Store a chunk batch in the database
+        
+        Reused rows are relinked to the document, new chunks are inserted and
+        every other chunk of the source documents (an earlier attempt of the
+        same job, or the previous version) is deleted, and so are their parent
+        sections, which are replaced by the batch's; all in one transaction,
+        so retries never duplicate chunks and searches never see a mix.
+        Every statement names the collections involved, so Postgres only
+        touches their chunk partitions. The ids of the stored rows are
+        recorded on the batch.
         
         Args:
-            processed_chunks: List of processed chunk data
+            batch: Chunks of the document, with embeddings for the new ones
+            collections: Collection of each document whose chunks are replaced
+                (defaults to just the batch document's)
         """
+        collections = collections or self._document_collections([batch.document_id])
         try:
-            # Prepare the data for insertion
-            data = [
-                (
-                    chunk["document_id"],
-                    chunk["chunk_text"],
-                    chunk["embedding"],
-                    chunk["page_numbers"],
-                    json.dumps(chunk["metadata"])
-                )
-                for chunk in processed_chunks
-            ]
+            kept_ids = batch.reused_ids[batch.reused_ids >= 0].tolist()
             
             # Connect to the database
             conn = self.db_manager.get_connection()
@@ -125,18 +167,63 @@ class TextEmbedder:
             try:
                 # Use execute_values for efficient bulk insertion
                 with conn.cursor() as cur:
-                    execute_values(
-                        cur,
-                        '''
-                        INSERT INTO chunks 
-                        (document_id, chunk_text, embedding, page_numbers, metadata)
-                        VALUES %s
-                        ''',
-                        data
+                    cur.execute(
+                        'DELETE FROM chunks WHERE collection_id = ANY(%s) AND document_id = ANY(%s) '
+                        'AND NOT (id = ANY(%s))',
+                        (list(set(collections.values())), list(collections), kept_ids)
                     )
+                    cur.execute('DELETE FROM chunk_parents WHERE document_id = ANY(%s)', (list(collections),))
+                    if batch.parent_count:
+                        parent_ids = execute_values(
+                            cur,
+                            'INSERT INTO chunk_parents (document_id, parent_text, page_numbers, metadata) '
+                            'VALUES %s RETURNING id',
+                            batch.parent_rows(),
+                            template='(%s, %s, %s::integer[], %s::jsonb)',
+                            fetch=True
+                        )
+                        batch.set_parent_ids([row[0] for row in parent_ids])
+                    # Formatted after the parents are stored, so rows carry their parent ids
+                    relinked = batch.relink_rows()
+                    if relinked:
+                        execute_values(
+                            cur,
+                            '''
+                            UPDATE chunks AS c
+                            SET collection_id = v.collection_id, document_id = v.document_id,
+                                page_numbers = v.page_numbers, metadata = v.metadata,
+                                parent_id = v.parent_id
+                            FROM (VALUES %s) AS v (id, previous_collection_id, collection_id, document_id,
+                                                   page_numbers, metadata, parent_id)
+                            WHERE c.id = v.id AND c.collection_id = v.previous_collection_id
+                            ''',
+                            relinked,
+                            template='(%s, %s, %s, %s, %s::integer[], %s::jsonb, %s::integer)'
+                        )
+                    inserted = []
+                    if len(batch.new_rows):
+                        # Rows are formatted page by page from the float32 matrix
+                        inserted = execute_values(
+                            cur,
+                            '''
+                            INSERT INTO chunks 
+                            (collection_id, document_id, chunk_text, embedding, page_numbers, metadata,
+                             chunk_hash, embedding_model, parent_id)
+                            VALUES %s
+                            RETURNING id
+                            ''',
+                            batch.insert_rows(self.provider.model),
+                            template='(%s, %s, %s, %s::vector, %s::integer[], %s::jsonb, %s, %s, %s::integer)',
+                            fetch=True
+                        )
+                    # Cached search results over these documents are now stale
+                    for source_document_id, collection_id in collections.items():
+                        notify_chunks_changed(cur, collection_id, source_document_id)
                 # Commit the transaction
                 conn.commit()
-                logger.info(f"Successfully stored {len(processed_chunks)} chunks")
+                batch.set_inserted_ids([row[0] for row in inserted])
+                logger.info(f"Successfully stored {len(inserted)} new and {len(relinked)} reused chunks "
+                            f"in {batch.parent_count} sections")
             except Exception as e:
                 # Rollback the transaction in case of an error
                 conn.rollback()
@@ -147,4 +234,104 @@ class TextEmbedder:
                 self.db_manager.return_connection(conn)
         except Exception as e:
             logger.error(f"Error in _store_chunks: {e}", exc_info=True)
-            raise
\ No newline at end of file
+            raise
+    
+    def embed_batches(self, batches: List[ChunkBatch], batch_size: Optional[int] = None) -> int:
+        """
+        Embed the new chunks of several documents, packing provider calls across documents
+        
+        Small documents would otherwise each make a partly filled call.
+        
+        Args:
+            batches: Chunk batches of the documents
+            batch_size: Number of chunks sent to the provider per call (defaults
+                to the provider's preferred batch size)
+        
+        Returns:
+            Number of chunks embedded
+        """
+        texts = [text for batch in batches for text in batch.texts_to_embed(0, len(batch.new_rows))]
+        if not texts:
+            return 0
+        
+        batch_size = batch_size or self.provider.preferred_batch_size
+        embeddings = None
+        with PIPELINE_STAGE_SECONDS.labels(stage='embed').time():
+            for start in range(0, len(texts), batch_size):
+                vectors, tokens = self.scheduler.embed(
+                    self.provider, texts[start:start + batch_size], priority=INGEST, as_array=True
+                )
+                EMBEDDING_TOKENS.labels(source='ingest').inc(tokens)
+                if embeddings is None:
+                    embeddings = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+                embeddings[start:start + len(vectors)] = vectors
+        
+        offset = 0
+        for batch in batches:
+            count = len(batch.new_rows)
+            if count:
+                batch.set_embeddings(0, embeddings[offset:offset + count])
+            offset += count
+        return len(texts)
+    
+    def store_batches(self, batches: List[ChunkBatch]) -> None:
+        """
+        Store the embedded chunks of several documents in one transaction with COPY
+        
+        For bulk loads of new documents: nothing is reused, any chunks and
+        parent sections the documents already have (from an interrupted
+        earlier load) are replaced. Each batch's collection is looked up
+        from its document.
+        
+        Args:
+            batches: Chunk batches with embeddings for all their chunks
+        """
+        document_ids = [batch.document_id for batch in batches]
+        collections = self._document_collections(document_ids)
+        for batch in batches:
+            batch.collection_id = collections[batch.document_id]
+        
+        conn = self.db_manager.get_connection()
+        try:
+            with PIPELINE_STAGE_SECONDS.labels(stage='store').time(), conn.cursor() as cur:
+                cur.execute(
+                    'DELETE FROM chunks WHERE collection_id = ANY(%s) AND document_id = ANY(%s)',
+                    (list(set(collections.values())), document_ids)
+                )
+                cur.execute('DELETE FROM chunk_parents WHERE document_id = ANY(%s)', (document_ids,))
+                
+                parent_rows = [row for batch in batches for row in batch.parent_rows()]
+                if parent_rows:
+                    parent_ids = [row[0] for row in execute_values(
+                        cur,
+                        'INSERT INTO chunk_parents (document_id, parent_text, page_numbers, metadata) '
+                        'VALUES %s RETURNING id',
+                        parent_rows,
+                        template='(%s, %s, %s::integer[], %s::jsonb)',
+                        fetch=True
+                    )]
+                    offset = 0
+                    for batch in batches:
+                        batch.set_parent_ids(parent_ids[offset:offset + batch.parent_count])
+                        offset += batch.parent_count
+                
+                # One COPY per document keeps only one document's rows formatted at a time
+                for batch in batches:
+                    if len(batch.new_rows):
+                        cur.copy_expert(
+                            'COPY chunks (collection_id, document_id, chunk_text, embedding, page_numbers, '
+                            'metadata, chunk_hash, embedding_model, parent_id) FROM STDIN',
+                            io.StringIO(''.join(batch.copy_rows(self.provider.model)))
+                        )
+                    notify_chunks_changed(cur, batch.collection_id, batch.document_id)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error bulk storing chunks of {len(batches)} documents: {e}", exc_info=True)
+            raise
+        finally:
+            self.db_manager.return_connection(conn)
+        
+        stored = sum(len(batch.new_rows) for batch in batches)
+        CHUNKS_PROCESSED.inc(stored)
+        logger.info(f"Bulk stored {stored} chunks of {len(batches)} documents")
@@ -0,0 +1,19 @@
+# processing-service/src/process_pipeline/errors.py
+
+# Pipeline stages in execution order
+STAGES = ('extracting', 'chunking', 'embedding')
+
+
+class PipelineStageError(Exception):
+    """
+    Raised when a stage of the document processing pipeline fails
+
+    Carries the name of the failed stage so the queue consumer can decide
+    whether a retry has to start from scratch or can resume from a later
+    stage using the saved conversion output.
+    """
+
+    def __init__(self, stage: str, cause: Exception):
+        super().__init__(f"{stage} failed: {cause}")
+        self.stage = stage
+        self.cause = cause
@@ -1,42 +1,178 @@
 import os
-from docling.document_converter import DocumentConverter
+from typing import Dict, List, Optional, Tuple, Union
+from docling.datamodel.base_models import InputFormat
+from docling.datamodel.pipeline_options import PdfPipelineOptions
+from docling.document_converter import DocumentConverter, PdfFormatOption
+from docling_core.types.doc import DoclingDocument
+
+from process_pipeline.prescan import PdfPrescan, models_for_pages
+from process_pipeline.sharding import ShardedConverter, plan_shards
+from monitoring.metrics import EXTRACTION_PAGES
+
+# auto: pre-scan the PDF and only run OCR / table models where needed
+# full: always run every model (docling's defaults); the default until auto's
+# pages/s gain has been measured against full with benchmarks/ingest_benchmark.py
+# --compare. On the benchmark corpus (born-digital, a ruled table in every
+# document) auto skips OCR on every page and keeps the table model, for a
+# pre-scan of under 1ms per page (benchmarks/prescan_benchmark.py)
+EXTRACTION_MODES = ('auto', 'full')
 
 class TextExtractor:
     def __init__(self):
-        self.converter = DocumentConverter()
+        # One converter per pipeline configuration; docling loads its models
+        # when a converter is first used, so they are kept for later jobs
+        self.converters = {}
+        self.prescan = PdfPrescan()
+        self.default_mode = os.getenv('EXTRACTION_MODE', 'full')
+        # Documents longer than this are converted in page-range shards on a
+        # process pool (0 disables sharding)
+        self.shard_pages = int(os.getenv('EXTRACTION_SHARD_PAGES', '0'))
+
+    def _get_converter(self, do_ocr: bool, do_table_structure: bool) -> DocumentConverter:
+        key = (do_ocr, do_table_structure)
+        if key not in self.converters:
+            pipeline_options = PdfPipelineOptions(do_ocr=do_ocr, do_table_structure=do_table_structure)
+            self.converters[key] = DocumentConverter(
+                format_options={InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options)}
+            )
+        return self.converters[key]
+
+    def _normalize_config(self, config: Optional[Union[str, Dict]]) -> Dict:
+        if isinstance(config, str):
+            config = {'mode': config}
+        config = dict(config or {})
+        config['mode'] = config.get('mode') or self.default_mode
+        if config['mode'] not in EXTRACTION_MODES:
+            raise ValueError(f"Unknown extraction mode {config['mode']}, expected one of {EXTRACTION_MODES}")
+        return config
+
+    def _options_for_pages(self, pages: Optional[List[Dict]], config: Dict) -> Dict:
+        """Models to run for a set of pre-scanned pages (None: not scanned)"""
+        options = {'do_ocr': True, 'do_table_structure': True}
+        if pages is not None:
+            options.update(models_for_pages(pages))
+        if config.get('ocr') is not None:
+            options['do_ocr'] = bool(config['ocr'])
+        if config.get('tables') is not None:
+            options['do_table_structure'] = bool(config['tables'])
+        return options
 
-    def extract(self, file_path: str) -> dict:
+    def resolve_options(self, file_path: str, config: Optional[Union[str, Dict]] = None) -> Dict:
+        """
+        Decide which docling models to run for a file
+
+        Args:
+            file_path: Path to the PDF file
+            config: Per-job extraction settings: a mode name, or a dict with
+                'mode' and optional 'ocr' / 'tables' booleans that override
+                the pre-scan
+
+        Returns:
+            Dict with do_ocr, do_table_structure, the mode used and the pre-scan summary
+        """
+        return self._resolve(file_path, self._normalize_config(config))[0]
+
+    def _resolve(self, file_path: str, config: Dict) -> Tuple[Dict, Optional[List[Dict]]]:
+        """Resolve the options of a normalized config, also returning the pre-scanned pages"""
+        options = {'mode': config['mode'], 'prescan': None, **self._options_for_pages(None, config)}
+        pages = None
+        if config['mode'] == 'auto':
+            try:
+                scan = self.prescan.scan(file_path)
+                pages = scan['pages']
+                options.update(self._options_for_pages(pages, config))
+                options['prescan'] = {key: value for key, value in scan.items() if key != 'pages'}
+            except Exception as e:
+                # Unreadable for pdfium: let docling try with everything enabled
+                print(f"✗ Pre-scan failed, using the full pipeline: {e}")
+                options['mode'] = 'full'
+        return options, pages
+
+    def _plan_shards(self, file_path: str, options: Dict, config: Dict) -> List[Tuple[int, int]]:
+        """Page ranges to convert in parallel, or an empty list to convert in one go"""
+        shard_pages = int(config.get('shard_pages', self.shard_pages) or 0)
+        if shard_pages <= 0 or config.get('max_parallel') == 1:
+            return []
+        if options['prescan'] is not None:
+            num_pages = options['prescan']['num_pages']
+        else:
+            try:
+                num_pages = self.prescan.count_pages(file_path)
+            except Exception:
+                return []
+        if num_pages <= shard_pages:
+            return []
+        return plan_shards(num_pages, shard_pages)
+
+    def _convert_sharded(self, file_path: str, shards: List[Tuple[int, int]],
+                         pages: Optional[List[Dict]], config: Dict) -> Dict:
+        """Convert page-range shards in parallel, each with the models its own pages need"""
+        def options_for_shard(page_range):
+            first, last = page_range
+            shard_options = self._options_for_pages(pages[first - 1:last] if pages else None, config)
+            EXTRACTION_PAGES.labels(
+                ocr=str(shard_options['do_ocr']).lower(),
+                tables=str(shard_options['do_table_structure']).lower()
+            ).inc(last - first + 1)
+            return shard_options
+
+        return ShardedConverter.get_instance().convert(
+            file_path, shards, options_for_shard, max_parallel=config.get('max_parallel')
+        )
+
+    def extract(self, file_path: str, config: Optional[Union[str, Dict]] = None) -> dict:
         """
         Extract text and structure from a PDF file using docling
+
+        Args:
+            file_path: Path to the PDF file
+            config: Per-job extraction settings (see resolve_options), plus
+                optional 'shard_pages' and 'max_parallel' for page-sharded conversion
         """
         try:
             print(f"\n=== PDF Extraction Started ===")
             print(f"Processing file: {file_path}")
-            
+
             if not os.path.exists(file_path):
                 print(f"✗ File not found: {file_path}")
                 raise FileNotFoundError(f"PDF file not found: {file_path}")
 
-            print("✓ File exists, converting PDF...")
-            result = self.converter.convert(file_path)
+            config = self._normalize_config(config)
+            options, pages = self._resolve(file_path, config)
+            shards = self._plan_shards(file_path, options, config)
+            options['shards'] = len(shards) or 1
 
-            document = result.document
+            if shards:
+                print(f"✓ File exists, converting PDF in {len(shards)} shards ({options['mode']} mode)...")
+                json_output = self._convert_sharded(file_path, shards, pages, config)
+                document = DoclingDocument.model_validate(json_output)
+            else:
+                print(f"✓ File exists, converting PDF ({options['mode']} mode, "
+                      f"ocr={options['do_ocr']}, tables={options['do_table_structure']})...")
+                converter = self._get_converter(options['do_ocr'], options['do_table_structure'])
+                result = converter.convert(file_path)
+                document = result.document
+                json_output = document.export_to_dict()
+                EXTRACTION_PAGES.labels(
+                    ocr=str(options['do_ocr']).lower(),
+                    tables=str(options['do_table_structure']).lower()
+                ).inc(len(document.pages))
             markdown_output = document.export_to_markdown()
-            json_output = document.export_to_dict()
-            
+
             print("✓ Successfully converted document")
-            
+
             output = {
                 'markdown': markdown_output,
                 'json': json_output,
                 'file_path': file_path,
-                'document': document
+                'document': document,
+                'options': options
             }
-            
+
             print("=== PDF Extraction Complete ===\n")
             return output
 
         except Exception as e:
             print(f"✗ Error extracting text from PDF: {e}")
             print("=== PDF Extraction Failed ===\n")
-            raise 
\ No newline at end of file
+            raise
\ No newline at end of file
@@ -0,0 +1,260 @@
+# processing-service/src/process_pipeline/migration.py
+"""
+Re-chunk / re-embed migration engine
+
+Rebuilds the chunks of every stored document from its persisted docling
+conversion, so changing the chunk size or the embedding model never
+requires re-uploading PDFs or running docling again.
+
+Each document's new chunk set is computed in memory and swapped in with a
+single transaction (delete old chunks + insert new ones), so searches keep
+being served from the old chunks until the swap commits. Progress is
+recorded in chunk_migrations after every document and a migration can be
+resumed by name after it was stopped or crashed.
+
+Searches only compare chunks embedded by their own provider's model
+(chunks.embedding_model), so while a migration changes the embedding model
+the API keeps answering from the documents not migrated yet, and once the
+API is switched to the new model, from the migrated ones only. Neither side
+ever ranks vectors of the other model.
+
+Usage (from processing-service/src):
+    python -m process_pipeline.migration start --name chunks-512 --max-tokens 512
+    python -m process_pipeline.migration start --name sections-2048 --parent-max-tokens 2048
+    python -m process_pipeline.migration resume --name chunks-512
+    python -m process_pipeline.migration status
+"""
+import json
+import time
+import argparse
+import logging
+from typing import Dict, Any, Optional, List
+
+from dotenv import load_dotenv
+
+from process_pipeline.chunk import TextChunker
+from process_pipeline.embed import TextEmbedder
+from embeddings.providers import get_embedding_provider
+from storage.db_manager import DatabaseManager, get_db_manager
+from storage.document_store import DocumentStore
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkMigration:
+    """Re-chunks and re-embeds all stored documents with a new configuration"""
+
+    def __init__(self, db_manager: DatabaseManager, name: str,
+                 max_tokens: Optional[int] = None, parent_max_tokens: Optional[int] = None,
+                 batch_size: int = 64,
+                 max_batches_per_minute: float = 60):
+        """
+        Args:
+            db_manager: Database connection manager
+            name: Unique migration name, used to resume it
+            max_tokens: New maximum tokens per chunk (defaults to CHUNK_MAX_TOKENS)
+            parent_max_tokens: New maximum tokens per parent section (defaults to
+                CHUNK_PARENT_MAX_TOKENS, 0 disables them)
+            batch_size: Chunks per embedding call
+            max_batches_per_minute: Throttle for embedding calls
+        """
+        self.db_manager = db_manager
+        self.name = name
+        self.batch_size = batch_size
+        self.min_batch_interval = 60.0 / max_batches_per_minute if max_batches_per_minute else 0.0
+
+        self.document_store = DocumentStore(db_manager)
+        self.chunker = TextChunker(max_tokens=max_tokens, parent_max_tokens=parent_max_tokens)
+        self.embedder = TextEmbedder(db_manager, provider=get_embedding_provider())
+        self.config = {
+            'max_tokens': self.chunker.max_tokens,
+            'parent_max_tokens': self.chunker.parent_max_tokens,
+            'embedding_model': self.embedder.provider.model,
+            'embedding_dimensions': self.embedder.provider.dimensions,
+            'batch_size': batch_size
+        }
+
+    def _check_dimensions(self) -> None:
+        """Fail early if the provider's vectors don't fit the chunks.embedding column"""
+        sql = """
+        SELECT atttypmod FROM pg_attribute
+        WHERE attrelid = 'chunks'::regclass AND attname = 'embedding'
+        """
+        column_dimensions = self.db_manager.execute_query(sql, fetch_one=True)[0]
+        if column_dimensions != self.config['embedding_dimensions']:
+            raise ValueError(
+                f"Embedding dimensions {self.config['embedding_dimensions']} don't match the "
+                f"chunks.embedding column ({column_dimensions}); change the column type first"
+            )
+
+    def _load_state(self) -> Optional[Dict[str, Any]]:
+        sql = "SELECT * FROM chunk_migrations WHERE name = %s"
+        return self.db_manager.execute_query(sql, (self.name,), fetch_one=True, dict_cursor=True)
+
+    def _create_state(self) -> Dict[str, Any]:
+        sql = """
+        INSERT INTO chunk_migrations (name, config, status, documents_total)
+        VALUES (%s, %s, 'running', (SELECT count(*) FROM documents))
+        RETURNING *
+        """
+        return self.db_manager.execute_query(
+            sql, (self.name, json.dumps(self.config)), fetch_one=True, dict_cursor=True
+        )
+
+    def _update_state(self, **fields) -> None:
+        assignments = ', '.join(f"{key} = %s" for key in fields)
+        sql = f"UPDATE chunk_migrations SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE name = %s"
+        self.db_manager.execute_query(sql, (*fields.values(), self.name))
+
+    def _next_documents(self, after_id: int, limit: int = 100) -> List[int]:
+        sql = "SELECT id FROM documents WHERE id > %s ORDER BY id LIMIT %s"
+        return [row[0] for row in self.db_manager.execute_query(sql, (after_id, limit))]
+
+    def migrate_document(self, document_id: int) -> Optional[int]:
+        """
+        Rebuild the chunks of one document and swap them in atomically
+
+        Returns:
+            Number of chunks written, or None if the document has no stored conversion
+        """
+        document = self.document_store.load(document_id)
+        if document is None:
+            return None
+
+        chunks = self.chunker.chunk_text(document)
+        if not chunks:
+            return 0
+
+        # create_embeddings replaces the document's chunks in one transaction
+        stored = self.embedder.create_embeddings(
+            chunks=chunks,
+            document_id=document_id,
+            batch_size=self.batch_size,
+            min_batch_interval=self.min_batch_interval,
+            parents=self.chunker.assign_parents(chunks)
+        )
+        return stored['chunks']
+
+    def run(self, resume: bool = False) -> Dict[str, Any]:
+        """
+        Run (or resume) the migration until every document is migrated
+
+        Args:
+            resume: Continue an existing migration with the same name
+
+        Returns:
+            The final migration state
+        """
+        self._check_dimensions()
+
+        state = self._load_state()
+        if state is None:
+            if resume:
+                raise ValueError(f"No migration named {self.name} to resume")
+            state = self._create_state()
+        elif not resume:
+            raise ValueError(f"Migration {self.name} already exists; use resume")
+        elif state['status'] == 'completed':
+            logger.info(f"Migration {self.name} is already completed")
+            return state
+        elif state['config'] != self.config:
+            logger.warning(f"Resuming {self.name} with a different configuration than it started with: "
+                           f"{state['config']} -> {self.config}")
+
+        self._update_state(status='running', error=None)
+        last_document_id = state['last_document_id']
+        documents_done = state['documents_done']
+        documents_skipped = state['documents_skipped']
+        chunks_written = state['chunks_written']
+        start_time = time.time()
+
+        logger.info(f"Running migration {self.name} from document {last_document_id} with {self.config}")
+        try:
+            # New documents ingested while the migration runs have higher ids
+            # and are picked up by the next batch
+            while True:
+                document_ids = self._next_documents(last_document_id)
+                if not document_ids:
+                    break
+
+                for document_id in document_ids:
+                    written = self.migrate_document(document_id)
+                    if written is None:
+                        documents_skipped += 1
+                        logger.warning(f"Document {document_id} has no stored conversion; skipped")
+                    else:
+                        documents_done += 1
+                        chunks_written += written
+
+                    last_document_id = document_id
+                    self._update_state(
+                        last_document_id=last_document_id,
+                        documents_done=documents_done,
+                        documents_skipped=documents_skipped,
+                        chunks_written=chunks_written
+                    )
+
+                elapsed = time.time() - start_time
+                logger.info(f"Migration {self.name}: {documents_done} documents, {chunks_written} chunks, "
+                            f"{documents_skipped} skipped, {elapsed:.0f}s")
+
+            self._update_state(status='completed', finished_at=time.strftime('%Y-%m-%d %H:%M:%S'))
+        except KeyboardInterrupt:
+            self._update_state(status='paused')
+            logger.info(f"Migration {self.name} paused at document {last_document_id}")
+            raise
+        except Exception as e:
+            self._update_state(status='failed', error=str(e))
+            logger.error(f"Migration {self.name} failed at document {last_document_id}: {e}", exc_info=True)
+            raise
+
+        return self._load_state()
+
+
+def list_migrations(db_manager: DatabaseManager) -> List[Dict[str, Any]]:
+    """All chunk migrations with their progress, most recent first"""
+    sql = "SELECT * FROM chunk_migrations ORDER BY started_at DESC"
+    return db_manager.execute_query(sql, dict_cursor=True)
+
+
+def main():
+    """Command line entry point"""
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Re-chunk and re-embed stored documents")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for command in ('start', 'resume'):
+        command_parser = subparsers.add_parser(command)
+        command_parser.add_argument('--name', required=True)
+        command_parser.add_argument('--max-tokens', type=int, default=None)
+        command_parser.add_argument('--parent-max-tokens', type=int, default=None)
+        command_parser.add_argument('--batch-size', type=int, default=64)
+        command_parser.add_argument('--max-batches-per-minute', type=float, default=60)
+    subparsers.add_parser('status')
+    args = parser.parse_args()
+
+    db_manager = get_db_manager()
+    try:
+        if args.command == 'status':
+            for migration in list_migrations(db_manager):
+                print(f"{migration['name']}\t{migration['status']}\t"
+                      f"{migration['documents_done']}/{migration['documents_total']} documents\t"
+                      f"{migration['chunks_written']} chunks\tlast={migration['last_document_id']}")
+            return
+
+        migration = ChunkMigration(
+            db_manager,
+            name=args.name,
+            max_tokens=args.max_tokens,
+            parent_max_tokens=args.parent_max_tokens,
+            batch_size=args.batch_size,
+            max_batches_per_minute=args.max_batches_per_minute
+        )
+        migration.run(resume=(args.command == 'resume'))
+    finally:
+        db_manager.close()
+
+
+if __name__ == '__main__':
+    main()
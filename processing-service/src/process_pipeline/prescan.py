@@ -0,0 +1,138 @@
+# processing-service/src/process_pipeline/prescan.py
+"""
+Cheap per-page pre-scan of a PDF before conversion
+
+Reads each page's text layer and page objects with pdfium (milliseconds per
+page, no models) to tell born-digital pages from scanned ones and to spot
+pages with ruled tables. The extractor uses the result to only enable
+docling's OCR and table-structure models where they are needed.
+
+Counting vector paths only recognizes ruled tables. Pages with fewer paths
+than the threshold but some (a table ruled by a few lines, a boxed figure)
+are reported as unsure, and the extractor runs the table model on them too;
+only pages without any vector paths skip it. Borderless tables on such pages
+are still missed, which is why EXTRACTION_MODE defaults to full.
+"""
+import os
+import time
+import logging
+from typing import Dict, Any, List, Optional
+
+import pypdfium2 as pdfium
+import pypdfium2.raw as pdfium_c
+
+logger = logging.getLogger(__name__)
+
+TEXT_PAGE = 'text'
+SCANNED_PAGE = 'scanned'
+
+
+def models_for_pages(pages: List[Dict[str, Any]]) -> Dict[str, bool]:
+    """
+    docling models needed for a set of pre-scanned pages
+
+    OCR runs when any page is scanned; table structure when any page has a
+    ruled table or might have one.
+    """
+    return {
+        'do_ocr': any(page['kind'] == SCANNED_PAGE for page in pages),
+        'do_table_structure': any(page['has_table'] or page.get('table_unsure', False) for page in pages)
+    }
+
+
+class PdfPrescan:
+    """Classifies the pages of a PDF as text-layer or scanned"""
+
+    def __init__(self, min_text_chars: Optional[int] = None,
+                 min_image_coverage: Optional[float] = None,
+                 min_table_paths: Optional[int] = None):
+        """
+        Args:
+            min_text_chars: Pages with fewer text-layer characters are OCR candidates
+            min_image_coverage: Fraction of an OCR candidate page that images must
+                cover for it to count as scanned (blank pages are not)
+            min_table_paths: Vector path objects (lines, rectangles) from which a
+                page is considered to contain a ruled table; pages with fewer
+                (but some) are unsure
+        """
+        self.min_text_chars = min_text_chars if min_text_chars is not None \
+            else int(os.getenv('PRESCAN_MIN_TEXT_CHARS', '50'))
+        self.min_image_coverage = min_image_coverage if min_image_coverage is not None \
+            else float(os.getenv('PRESCAN_MIN_IMAGE_COVERAGE', '0.3'))
+        self.min_table_paths = min_table_paths if min_table_paths is not None \
+            else int(os.getenv('PRESCAN_MIN_TABLE_PATHS', '8'))
+
+    def _scan_page(self, page) -> Dict[str, Any]:
+        width, height = page.get_size()
+        page_area = (width * height) or 1.0
+
+        text_page = page.get_textpage()
+        try:
+            chars = len(text_page.get_text_range().strip())
+        finally:
+            text_page.close()
+
+        image_area = 0.0
+        paths = 0
+        for obj in page.get_objects(filter=[pdfium_c.FPDF_PAGEOBJ_IMAGE, pdfium_c.FPDF_PAGEOBJ_PATH]):
+            if obj.type == pdfium_c.FPDF_PAGEOBJ_IMAGE:
+                left, bottom, right, top = obj.get_pos()
+                image_area += max(0.0, right - left) * max(0.0, top - bottom)
+            else:
+                paths += 1
+        image_coverage = min(1.0, image_area / page_area)
+
+        scanned = chars < self.min_text_chars and image_coverage >= self.min_image_coverage
+        return {
+            'kind': SCANNED_PAGE if scanned else TEXT_PAGE,
+            'chars': chars,
+            'image_coverage': round(image_coverage, 3),
+            'paths': paths,
+            'has_table': paths >= self.min_table_paths,
+            'table_unsure': 0 < paths < self.min_table_paths
+        }
+
+    def count_pages(self, file_path: str) -> int:
+        """Number of pages of a PDF, without scanning them"""
+        pdf = pdfium.PdfDocument(file_path)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+
+    def scan(self, file_path: str) -> Dict[str, Any]:
+        """
+        Scan every page of a PDF
+
+        Args:
+            file_path: Path to the PDF file
+
+        Returns:
+            Dict with the per-page results (1-based page_no) and totals
+        """
+        start = time.perf_counter()
+        pdf = pdfium.PdfDocument(file_path)
+        try:
+            pages: List[Dict[str, Any]] = []
+            for index in range(len(pdf)):
+                page = pdf[index]
+                try:
+                    pages.append({'page_no': index + 1, **self._scan_page(page)})
+                finally:
+                    page.close()
+        finally:
+            pdf.close()
+
+        result = {
+            'num_pages': len(pages),
+            'text_pages': sum(1 for page in pages if page['kind'] == TEXT_PAGE),
+            'scanned_pages': sum(1 for page in pages if page['kind'] == SCANNED_PAGE),
+            'table_pages': sum(1 for page in pages if page['has_table']),
+            'unsure_table_pages': sum(1 for page in pages if page['table_unsure']),
+            'seconds': round(time.perf_counter() - start, 4),
+            'pages': pages
+        }
+        logger.info(f"Pre-scanned {file_path}: {result['text_pages']} text, {result['scanned_pages']} scanned, "
+                    f"{result['table_pages']} with tables, {result['unsure_table_pages']} maybe with tables "
+                    f"in {result['seconds']}s")
+        return result
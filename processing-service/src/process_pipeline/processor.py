@@ -1,28 +1,44 @@
-from typing import Dict
+import os
+from typing import Dict, Union
 import time
 from process_pipeline.extract import TextExtractor
 from process_pipeline.chunk import TextChunker
 from process_pipeline.embed import TextEmbedder  # We'll create this next
+from process_pipeline.errors import PipelineStageError, STAGES
 from notifier.notifier import StatusNotifier  # We'll create this next
+from monitoring.metrics import PIPELINE_STAGE_SECONDS, PAGES_PROCESSED
+from monitoring.profiler import JobProfiler
 from storage.db_manager import DatabaseManager, get_db_manager
+from storage.document_store import DocumentStore
+from docling_core.types.doc import DocItemLabel
 
 class DocumentProcessor:
-    def __init__(self, db_manager:DatabaseManager):
+    def __init__(self, db_manager:DatabaseManager, embedder: TextEmbedder = None,
+                 notifier: StatusNotifier = None):
         """
         Initialize the complete document processing pipeline
          Args:
             db_manager: Database connection manager
+            embedder: Embedder to use instead of the default TextEmbedder
+            notifier: Notifier to use instead of the default StatusNotifier
         """
         print("\n=== Initializing Document Processor ===")
         self.db_manager = db_manager
         self.extractor = TextExtractor()
         self.chunker = TextChunker()
-        self.embedder = TextEmbedder(db_manager)
-        self.notifier = StatusNotifier()
+        self.embedder = embedder or TextEmbedder(db_manager)
+        self.notifier = notifier or StatusNotifier()
+        self.document_store = DocumentStore(db_manager)
+        # Opt-in: a file uploaded again under the same name replaces the earlier
+        # upload, even when the two are unrelated documents
+        self.version_by_filename = os.getenv('DOCUMENT_VERSION_BY_FILENAME', 'false').lower() == 'true'
         print("✓ Initialized all pipeline components")
         print("=== Initialization Complete ===\n")
 
-    def process_document(self,file_id:str, file_path: str, metadata: Dict = None) -> Dict:
+    def process_document(self,file_id:str, file_path: str, metadata: Dict = None,
+                         resume_from: str = None, profile: bool = False,
+                         extraction: Union[str, Dict] = None, previous_job_id: str = None,
+                         collection_id: int = None) -> Dict:
         """
         Run the complete document processing pipeline:
         1. Extract text and structure using docling
@@ -32,10 +48,26 @@ class DocumentProcessor:
         Args:
             file_path: Path to the document file
             metadata: Additional document metadata
+            resume_from: Stage to resume a retried job from; stages after
+                extraction reuse the stored conversion when available
+            profile: Capture a per-stage profiling report for this job
+                (jobs are also sampled at PROFILE_SAMPLE_RATE)
+            extraction: Per-job extraction settings, e.g. "full" or
+                {"mode": "auto", "ocr": true} (defaults to EXTRACTION_MODE)
+            previous_job_id: Job that ingested the previous version of this
+                document; its unchanged chunks are reused instead of re-embedded
+                (with DOCUMENT_VERSION_BY_FILENAME=true, defaults to the latest
+                earlier upload with the same filename in the same collection);
+                the previous version's chunks move to this document and its
+                emptied document record is deleted
+            collection_id: Collection to add the document to (defaults to the
+                default collection)
             
         Returns:
             Dict containing processing results and status
         """
+        stage = STAGES[0]
+        profiler = JobProfiler.for_job(file_id, requested=profile)
         try:
             print("\n=== Starting Document Processing Pipeline ===")
             print(f"Processing file: {file_path}")
@@ -46,55 +78,116 @@ class DocumentProcessor:
                 "timestamp": time.time()
             })
 
-            # Step 1: Extract text using docling
-            # Notify processing started
-            self.notifier.send_notification(file_id, "processing", {"stage": "extracting"})
-            print("Step 1: Extracting text...")
-            extracted_data = self.extractor.extract(file_path) # docling
-            document = extracted_data['document']
-            json_data = extracted_data['json']
+            # The document record is keyed by job, so retries reuse it
+            metadata = metadata or {}
+            document_id = self.document_store.get_or_create_document(
+                file_id, metadata.get('filename') or metadata.get('original_filename'), collection_id
+            )
+
+            # Step 1: Extract text using docling, unless a previous attempt
+            # already did and stored the result
+            document = None
+            if resume_from in STAGES[1:]:
+                document = self.document_store.load(document_id)
+                if document is not None:
+                    print(f"✓ Resuming from {resume_from}, skipping extraction")
+
+            if document is None:
+                # Notify processing started
+                self.notifier.send_notification(file_id, "processing", {"stage": "extracting"})
+                print("Step 1: Extracting text...")
+                with PIPELINE_STAGE_SECONDS.labels(stage='extract').time(), profiler.stage('extract'):
+                    extracted_data = self.extractor.extract(file_path, extraction) # docling
+                document = extracted_data['document']
+                PAGES_PROCESSED.inc(len(document.pages))
+                shards = extracted_data.get('options', {}).get('shards', 1)
+                if shards > 1:
+                    profiler.flag('extract', f"converted in {shards} page shards on other processes; "
+                                             "their CPU time and memory are not included")
+                # Persist the conversion once; only the document id travels
+                # through the rest of the pipeline
+                self.document_store.save(document_id, extracted_data['json'])
+                del extracted_data
+            title = self._document_title(document)
                         
             # Step 2: Chunk the text
+            stage = 'chunking'
             self.notifier.send_notification(file_id, "processing", {"stage": "chunking"})
             print("\nStep 2: Chunking text...")
-            chunks = self.chunker.chunk_text(document)
+            with PIPELINE_STAGE_SECONDS.labels(stage='chunk').time(), profiler.stage('chunk'):
+                chunks = self.chunker.chunk_text(document)
             print(f"✓ Created {len(chunks)} chunks")
             
             # Step 3: Create and store embeddings
+            stage = 'embedding'
             self.notifier.send_notification(file_id, "processing", {"stage": "embedding"})
             print("\nStep 3: Creating embeddings...")
             # Combine metadata with document info
             enhanced_metadata = {
-                **(metadata or {}),
-                'title': json_data.get('title'),
-                'document_structure': json_data
+                **metadata,
+                'title': title,
+                'document_id': document_id
             }
             
-            processed_chunks = self.embedder.create_embeddings(
-                chunks=chunks,
-                metadata=enhanced_metadata
-            )
-            print(f"✓ Created and stored embeddings for {len(processed_chunks)} chunks")
+            previous_document_id = None
+            if previous_job_id:
+                previous_document_id = self.document_store.find_document_id(previous_job_id)
+            elif self.version_by_filename:
+                previous_document_id = self.document_store.find_previous_version(document_id)
+            if previous_document_id is not None:
+                print(f"✓ Reusing unchanged chunks of document {previous_document_id}")
+            
+            with profiler.stage('embed'):
+                stored = self.embedder.create_embeddings(
+                    chunks=chunks,
+                    document_id=document_id,
+                    metadata=enhanced_metadata,
+                    previous_document_id=previous_document_id,
+                    parents=self.chunker.assign_parents(chunks)
+                )
+            if previous_document_id is not None and previous_document_id != document_id:
+                # Its chunks and parent sections were moved or deleted with the store
+                self.document_store.delete(previous_document_id)
+            reused = stored['reused']
+            reuse_ratio = round(reused / stored['chunks'], 3)
+            print(f"✓ Created and stored embeddings for {stored['chunks']} chunks "
+                  f"({reused} reused, ratio {reuse_ratio})")
             
             self.notifier.send_notification(file_id, "completed", {
-                "chunkCount": len(processed_chunks),
+                "chunkCount": stored['chunks'],
+                "reusedChunkCount": reused,
+                "reuseRatio": reuse_ratio,
                 "ready": True
             })
+            profiler.write_summary('success')
 
             print("=== Document Processing Complete ===\n")
             return {
                 'status': 'success',
                 'document_info': {
-                    'title': json_data.get('title'),
-                    'num_chunks': len(chunks),
+                    'document_id': document_id,
+                    'title': title,
+                    'num_chunks': stored['chunks'],
+                    'reused_chunks': reused,
+                    'chunk_ids': stored['chunk_ids'],
+                    'reuse_ratio': reuse_ratio,
                     'metadata': enhanced_metadata
                 }
             }
             
         except Exception as e:
-            print(f"✗ Error in document processing pipeline: {e}")
+            print(f"✗ Error in document processing pipeline ({stage}): {e}")
             print("=== Document Processing Failed ===\n")
+            profiler.write_summary('failed')
             self.notifier.send_notification(file_id, "failed", {
-                "error": e
+                "error": e,
+                "stage": stage
             })
-            raise
\ No newline at end of file
+            raise PipelineStageError(stage, e) from e
+
+    def _document_title(self, document) -> str:
+        """Text of the first item docling labelled as the document title, if any"""
+        for item in document.texts:
+            if item.label == DocItemLabel.TITLE:
+                return item.text
+        return None
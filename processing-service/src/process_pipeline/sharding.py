@@ -0,0 +1,215 @@
+# processing-service/src/process_pipeline/sharding.py
+"""
+Page-sharded parallel conversion of a single large PDF
+
+A DocumentConverter.convert call converts its pages on one core, so a
+300-page document takes 300 pages' worth of wall time no matter how many
+workers are running. Here the PDF is split into page-range shards that are
+converted on a process pool and merged back, in page order, into a single
+DoclingDocument before chunking. Because the chunker walks the merged
+document, the running section heading carries over shard boundaries
+instead of each shard starting without one.
+
+Page numbers in a page-range conversion are absolute, so merging only has
+to shift the "#/texts/N"-style references of later shards past the items of
+the earlier ones.
+"""
+import os
+import re
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, List, Tuple, Callable, Optional
+from docling.datamodel.base_models import InputFormat
+from docling.datamodel.pipeline_options import AcceleratorOptions, PdfPipelineOptions
+from docling.document_converter import DocumentConverter, PdfFormatOption
+
+logger = logging.getLogger(__name__)
+
+# DoclingDocument collections that items reference by index
+REF_COLLECTIONS = ('groups', 'texts', 'pictures', 'tables', 'key_value_items', 'form_items')
+_REF_PATTERN = re.compile(r'^#/(' + '|'.join(REF_COLLECTIONS) + r')/(\d+)(.*)$')
+
+# Converters of the current pool worker process, reused across shards and jobs
+_converters = {}
+
+
+def _get_converter(do_ocr: bool, do_table_structure: bool, num_threads: int) -> DocumentConverter:
+    key = (do_ocr, do_table_structure, num_threads)
+    if key not in _converters:
+        pipeline_options = PdfPipelineOptions(
+            do_ocr=do_ocr,
+            do_table_structure=do_table_structure,
+            accelerator_options=AcceleratorOptions(num_threads=num_threads)
+        )
+        _converters[key] = DocumentConverter(
+            format_options={InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options)}
+        )
+    return _converters[key]
+
+
+def convert_shard(file_path: str, page_range: Tuple[int, int], do_ocr: bool,
+                  do_table_structure: bool, num_threads: int) -> Dict[str, Any]:
+    """
+    Convert one page range of a PDF (runs in a pool worker)
+
+    Returns:
+        The shard's DoclingDocument as a dict
+    """
+    converter = _get_converter(do_ocr, do_table_structure, num_threads)
+    result = converter.convert(file_path, page_range=page_range)
+    return result.document.export_to_dict()
+
+
+def plan_shards(num_pages: int, shard_pages: int) -> List[Tuple[int, int]]:
+    """
+    Split a document into page ranges
+
+    Args:
+        num_pages: Number of pages of the document
+        shard_pages: Pages per shard
+
+    Returns:
+        List of 1-based, inclusive (first, last) page ranges
+    """
+    return [(first, min(first + shard_pages - 1, num_pages))
+            for first in range(1, num_pages + 1, shard_pages)]
+
+
+def _offset_refs(node: Any, offsets: Dict[str, int]) -> None:
+    """Shift every collection reference in a document dict, in place"""
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key in ('$ref', 'self_ref') and isinstance(value, str):
+                match = _REF_PATTERN.match(value)
+                if match:
+                    collection, index, rest = match.groups()
+                    node[key] = f"#/{collection}/{int(index) + offsets[collection]}{rest}"
+            else:
+                _offset_refs(value, offsets)
+    elif isinstance(node, list):
+        for value in node:
+            _offset_refs(value, offsets)
+
+
+def merge_documents(documents: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merge shard documents into one, in the given (page) order
+
+    The first shard's dict is extended in place; later shards' items are
+    appended after it with their references shifted accordingly.
+
+    Args:
+        documents: Shard documents as dicts, ordered by page range
+
+    Returns:
+        The merged document dict
+    """
+    merged = documents[0]
+    for document in documents[1:]:
+        offsets = {collection: len(merged.get(collection, [])) for collection in REF_COLLECTIONS}
+        _offset_refs(document, offsets)
+
+        for collection in REF_COLLECTIONS:
+            merged.setdefault(collection, []).extend(document.get(collection, []))
+        merged['body']['children'].extend(document['body']['children'])
+        if 'furniture' in merged and 'furniture' in document:
+            merged['furniture']['children'].extend(document['furniture']['children'])
+        merged.setdefault('pages', {}).update(document.get('pages', {}))
+    return merged
+
+
+class ShardedConverter:
+    """Converts page-range shards of PDFs on a shared process pool"""
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls) -> 'ShardedConverter':
+        """Singleton access method; all lane workers share one pool"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = ShardedConverter()
+            return cls._instance
+
+    def __init__(self, max_workers: Optional[int] = None):
+        """
+        Args:
+            max_workers: Size of the process pool (defaults to EXTRACTION_SHARD_WORKERS,
+                or the number of CPUs up to 4); each worker loads its own models
+        """
+        self.max_workers = max_workers or int(
+            os.getenv('EXTRACTION_SHARD_WORKERS', str(min(4, os.cpu_count() or 1)))
+        )
+        # Models are split evenly over the workers' cores instead of each
+        # worker starting docling's default number of threads
+        self.num_threads = max(1, (os.cpu_count() or 1) // self.max_workers)
+        self.pool = None
+        self.pool_lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self.pool_lock:
+            if self.pool is None:
+                # Spawned, not forked: torch threads in the parent don't survive a fork
+                self.pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self.pool
+
+    def convert(self, file_path: str, shards: List[Tuple[int, int]],
+                options_for_shard: Callable[[Tuple[int, int]], Dict[str, bool]],
+                max_parallel: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Convert the shards of a PDF in parallel and merge them
+
+        Args:
+            file_path: Path to the PDF file
+            shards: Page ranges from plan_shards
+            options_for_shard: Returns do_ocr / do_table_structure for a page range
+            max_parallel: Maximum shards of this document converted at once
+
+        Returns:
+            The merged document dict
+        """
+        pool = self._get_pool()
+        max_parallel = min(max_parallel or self.max_workers, self.max_workers)
+        results = {}
+        pending = {}
+        queued = list(shards)
+
+        try:
+            while queued or pending:
+                while queued and len(pending) < max_parallel:
+                    page_range = queued.pop(0)
+                    options = options_for_shard(page_range)
+                    future = pool.submit(
+                        convert_shard, file_path, page_range,
+                        options['do_ocr'], options['do_table_structure'], self.num_threads
+                    )
+                    pending[future] = page_range
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    page_range = pending.pop(future)
+                    results[page_range] = future.result()
+                    print(f"✓ Converted pages {page_range[0]}-{page_range[1]}")
+        except BrokenProcessPool:
+            # A worker died (usually out of memory); start a fresh pool next time
+            self.close()
+            raise
+        except Exception:
+            for future in pending:
+                future.cancel()
+            raise
+
+        return merge_documents([results[page_range] for page_range in sorted(results)])
+
+    def close(self) -> None:
+        """Shut the process pool down"""
+        with self.pool_lock:
+            if self.pool is not None:
+                self.pool.shutdown(wait=False, cancel_futures=True)
+                self.pool = None
@@ -2,10 +2,23 @@
 import pika
 import json
 import os
+import time
+import signal
 import logging
+import threading
+import functools
+from typing import Dict, List, Optional
 from dotenv import load_dotenv
 from process_pipeline.processor import DocumentProcessor
+from process_pipeline.errors import PipelineStageError
+from process_pipeline.sharding import ShardedConverter
+from scheduling.job_cost import JobCostEstimator, FAST_LANE, SLOW_LANE
+from scheduling.retry_policy import RetryPolicy, classify_error
+from scheduling.dead_letters import dead_letter_queue_name
 from storage.db_manager import get_db_manager, DatabaseManager
+from storage.vectors import check_corpus_model
+from embeddings.providers import get_embedding_provider
+from monitoring.metrics import QUEUE_JOBS_IN_FLIGHT
 
 # Load environment variables
 load_dotenv()
@@ -13,30 +26,342 @@ load_dotenv()
 # Configure logging
 logger = logging.getLogger(__name__)
 
+class LaneWorker(threading.Thread):
+    """
+    Worker thread that processes jobs from a single lane queue
+
+    Each worker owns its RabbitMQ connection (pika connections are not
+    thread-safe) and its own DocumentProcessor, so workers in different
+    lanes never wait on each other.
+
+    The worker thread only does connection I/O: each job runs on its own
+    thread while start_consuming keeps servicing heartbeats, so the broker
+    doesn't drop the connection (and redeliver the job) during a long
+    conversion. The job's ack, retry or dead-letter publish is handed back
+    to the I/O thread with add_callback_threadsafe.
+    """
+
+    def __init__(self, lane: str, queue_name: str, dead_letter_queue: str, rabbitmq_url: str,
+                 uploads_dir: str, db_manager: DatabaseManager, index: int = 0):
+        """
+        Initialize the lane worker
+
+        Args:
+            lane: Lane this worker belongs to (fast or slow)
+            queue_name: Lane queue to consume from
+            dead_letter_queue: Queue for jobs that exhausted their retries
+            rabbitmq_url: RabbitMQ connection URL
+            uploads_dir: Directory where uploaded files are stored
+            db_manager: Database connection manager
+            index: Index of the worker within its lane
+        """
+        super().__init__(name=f"{lane}-lane-worker-{index}", daemon=True)
+        self.lane = lane
+        self.queue_name = queue_name
+        self.dead_letter_queue = dead_letter_queue
+        self.rabbitmq_url = rabbitmq_url
+        self.uploads_dir = uploads_dir
+        self.processor = DocumentProcessor(db_manager)
+        self.retry_policy = RetryPolicy()
+
+        self.connection = None
+        self.channel = None
+        self.consumer_tag = None
+        self.job_thread: Optional[threading.Thread] = None
+        # Only read and written on the I/O thread
+        self._job_pending = False
+        self._stopping = threading.Event()
+
+    def run(self):
+        """Consume the lane queue, reconnecting after connection failures"""
+        while not self._stopping.is_set():
+            if self.job_thread is not None and self.job_thread.is_alive():
+                # The job of a lost connection can't be acked any more and will
+                # be redelivered; don't start it twice side by side
+                logger.warning(f"{self.name} waiting for the job of its lost connection to finish")
+                self.job_thread.join()
+            self._job_pending = False
+            try:
+                self.connection = pika.BlockingConnection(
+                    pika.URLParameters(self.rabbitmq_url)
+                )
+                self.channel = self.connection.channel()
+                self.channel.queue_declare(queue=self.queue_name, durable=True)
+                self._declare_retry_queues()
+                self.channel.queue_declare(queue=self.dead_letter_queue, durable=True)
+                # One job at a time per worker; lane concurrency is the number of workers
+                self.channel.basic_qos(prefetch_count=1)
+                self.consumer_tag = self.channel.basic_consume(
+                    queue=self.queue_name,
+                    on_message_callback=self.process_message
+                )
+                logger.info(f"✓ {self.name} consuming from queue: {self.queue_name}")
+                self.channel.start_consuming()
+            except Exception as e:
+                if self._stopping.is_set():
+                    break
+                logger.error(f"✗ {self.name} lost its connection: {e}")
+                time.sleep(5)
+            finally:
+                if self.connection and self.connection.is_open:
+                    self.connection.close()
+
+    def _retry_queue(self, retries: int) -> str:
+        return f"{self.queue_name}.retry.{retries}"
+
+    def _declare_retry_queues(self):
+        """
+        Declare one delay queue per retry attempt
+
+        Messages wait in a delay queue until their per-message TTL expires and
+        are then dead-lettered back onto the lane queue. Using one queue per
+        attempt keeps TTLs within a queue close to each other, so a message
+        is never held back by a much longer delay ahead of it.
+        """
+        for retries in range(self.retry_policy.max_retries):
+            self.channel.queue_declare(
+                queue=self._retry_queue(retries),
+                durable=True,
+                arguments={
+                    'x-dead-letter-exchange': '',
+                    'x-dead-letter-routing-key': self.queue_name
+                }
+            )
+
+    def _schedule_retry(self, ch, data: dict, retries: int, error: Exception) -> None:
+        """Publish a failed job to its delay queue"""
+        delay_ms = self.retry_policy.delay_ms(retries)
+        data['retries'] = retries + 1
+        if isinstance(error, PipelineStageError):
+            # Later stages can reuse the saved conversion output
+            data['resumeFrom'] = error.stage
+
+        logger.warning(f"✗ Retrying message in {delay_ms / 1000:.1f}s "
+                       f"(attempt {retries + 1}/{self.retry_policy.max_retries})")
+        ch.basic_publish(
+            exchange='',
+            routing_key=self._retry_queue(retries),
+            body=json.dumps(data),
+            properties=pika.BasicProperties(delivery_mode=2, expiration=str(delay_ms))
+        )
+
+    def _dead_letter(self, ch, data: dict, error: Exception) -> None:
+        """Publish a job that won't be retried to the dead-letter queue"""
+        data['failure'] = {
+            'error': str(error),
+            'stage': getattr(error, 'stage', None),
+            'category': classify_error(error),
+            'retries': data.get('retries', 0),
+            'lane': self.lane,
+            'failedAt': time.time()
+        }
+        ch.basic_publish(
+            exchange='',
+            routing_key=self.dead_letter_queue,
+            body=json.dumps(data),
+            properties=pika.BasicProperties(delivery_mode=2)
+        )
+        logger.error(f"✗ Job moved to dead-letter queue {self.dead_letter_queue}")
+
+    def stop(self):
+        """Ask the worker to stop consuming once its current job is finished"""
+        self._stopping.set()
+        if self.connection and self.connection.is_open:
+            try:
+                self.connection.add_callback_threadsafe(self._begin_drain)
+            except Exception as e:
+                logger.warning(f"{self.name} could not be asked to drain: {e}")
+
+    def _begin_drain(self):
+        """Stop new deliveries, then stop consuming once no job is in flight (I/O thread)"""
+        if self.consumer_tag is not None and self.channel.is_open:
+            self.channel.basic_cancel(self.consumer_tag)
+            self.consumer_tag = None
+        if self._job_pending:
+            logger.info(f"{self.name} draining: waiting for its in-flight job")
+        else:
+            self.channel.stop_consuming()
+
+    def process_message(self, ch, method, properties, body):
+        """
+        Validate a message from the lane queue and start its job
+
+        Runs on the I/O thread, so it returns right away; the job itself
+        runs on a separate thread (one at a time, prefetch is 1).
+        """
+        try:
+            data = json.loads(body)
+        except ValueError as e:
+            # Unparseable message, nothing to retry
+            logger.error(f"✗ Error parsing message: {e} - rejecting message")
+            ch.basic_reject(delivery_tag=method.delivery_tag, requeue=False)
+            return
+
+        # Validate required fields
+        if not isinstance(data, dict) or not all([data.get('jobId'), data.get('filePath')]):
+            logger.error("✗ Missing required fields - rejecting message")
+            ch.basic_reject(delivery_tag=method.delivery_tag, requeue=False)
+            return
+
+        self._job_pending = True
+        QUEUE_JOBS_IN_FLIGHT.labels(lane=self.lane).inc()
+        self.job_thread = threading.Thread(
+            target=self._run_job,
+            args=(self.connection, ch, method.delivery_tag, data),
+            name=f"{self.name}-job",
+            daemon=True
+        )
+        self.job_thread.start()
+
+    def _run_job(self, connection, ch, delivery_tag: int, data: dict):
+        """Run a job through the pipeline and report the outcome to the I/O thread"""
+        error = None
+        try:
+            logger.info(f"\n=== Processing New Message ({self.lane} lane) ===")
+            logger.info(f"Received message data: {data}")
+
+            # Extract message data
+            job_id = data.get('jobId')
+            file_path = data.get('filePath')
+            metadata = data.get('metadata', {})
+
+            logger.info(f"- Job ID: {job_id}")
+            logger.info(f"- Original File Path: {file_path}")
+            logger.info(f"- Retry Attempt: {data.get('retries', 0)}")
+            logger.info(f"- Estimated Cost: {data.get('cost')}")
+
+            # Get full file path
+            file_name = os.path.basename(file_path)
+            full_path = os.path.join(self.uploads_dir, file_name)
+            logger.info(f"- Full File Path: {full_path}")
+
+            # Add job info to metadata
+            metadata.update({
+                'job_id': job_id,
+                'original_filename': file_name
+            })
+            # Uploaded files are stored under the job id; the name the user
+            # gave identifies new versions of a document
+            if data.get('originalName'):
+                metadata.setdefault('filename', data['originalName'])
+
+            # Process document through pipeline
+            result = self.processor.process_document(
+                file_id=job_id,
+                file_path=full_path,
+                metadata=metadata,
+                resume_from=data.get('resumeFrom'),
+                profile=bool(data.get('profile', False)),
+                extraction=data.get('extraction'),
+                previous_job_id=data.get('previousJobId'),
+                collection_id=data.get('collectionId')
+            )
+
+            logger.info(f"✓ Document processing complete:")
+            logger.info(f"  - Title: {result['document_info']['title']}")
+            logger.info(f"  - Chunks: {result['document_info']['num_chunks']}")
+            logger.info(f"  - Reuse Ratio: {result['document_info']['reuse_ratio']}")
+        except Exception as e:
+            logger.error(f"✗ Error processing message: {e}")
+            error = e
+            if not self.retry_policy.should_retry(e, data.get('retries', 0)):
+                # The job is about to be dead-lettered; don't leave its
+                # document listed and counted in its collection
+                self._discard_document(data.get('jobId'))
+        finally:
+            QUEUE_JOBS_IN_FLIGHT.labels(lane=self.lane).dec()
+
+        try:
+            connection.add_callback_threadsafe(
+                functools.partial(self._finish_job, ch, delivery_tag, data, error)
+            )
+        except Exception as e:
+            # The connection is gone; the broker redelivers the unacked message
+            logger.error(f"✗ Could not report job {data.get('jobId')} to the broker "
+                         f"({e}); it will be redelivered")
+
+    def _discard_document(self, job_id: str) -> None:
+        """Delete the document a failed job created, with its chunks and conversion (job thread)"""
+        try:
+            document_id = self.processor.document_store.find_document_id(job_id)
+            if document_id is not None:
+                self.processor.document_store.delete(document_id)
+                logger.info(f"✓ Deleted document {document_id} of failed job {job_id}")
+        except Exception as e:
+            logger.error(f"✗ Could not delete the document of failed job {job_id}: {e}")
+
+    def _finish_job(self, ch, delivery_tag: int, data: dict, error: Optional[Exception]):
+        """Ack, retry or dead-letter a finished job (I/O thread)"""
+        self._job_pending = False
+        if not ch.is_open:
+            logger.error(f"✗ Channel closed before job {data.get('jobId')} was acknowledged; "
+                         f"it will be redelivered")
+            return
+
+        if error is None:
+            ch.basic_ack(delivery_tag=delivery_tag)
+            logger.info("✓ Message acknowledged")
+            logger.info("=== Message Processing Complete ===\n")
+        else:
+            # Publish the follow-up before acking so the job is never lost
+            retries = data.get('retries', 0)
+            if self.retry_policy.should_retry(error, retries):
+                self._schedule_retry(ch, data, retries, error)
+            else:
+                self._dead_letter(ch, data, error)
+            ch.basic_ack(delivery_tag=delivery_tag)
+            logger.error("=== Message Processing Failed ===\n")
+
+        if self._stopping.is_set():
+            ch.stop_consuming()
+
+
 class QueueConsumer:
     def __init__(self):
         """Initialize the queue consumer"""
         logger.info("\n=== Initializing Queue Consumer ===")
-        
+
         # Queue setup
         self.connection = None
         self.channel = None
         self.queue_name = os.getenv('RABBITMQ_QUEUE_NAME', 'document_processing')
         self.rabbitmq_url = os.getenv('RABBITMQ_URL', 'amqp://localhost:5672')
-        
+        self.dead_letter_queue = dead_letter_queue_name(self.queue_name)
+
+        # Lanes: small documents never wait behind large ones because each
+        # lane has its own queue and its own pool of workers
+        self.lanes = {
+            FAST_LANE: {
+                'queue': f"{self.queue_name}.{FAST_LANE}",
+                'concurrency': int(os.getenv('FAST_LANE_CONCURRENCY', '1'))
+            },
+            SLOW_LANE: {
+                'queue': f"{self.queue_name}.{SLOW_LANE}",
+                'concurrency': int(os.getenv('SLOW_LANE_CONCURRENCY', '1'))
+            }
+        }
+        self.workers: List[LaneWorker] = []
+        # Seconds to wait for in-flight jobs on shutdown (0 waits for as long as they take)
+        self.drain_timeout = float(os.getenv('SHUTDOWN_DRAIN_TIMEOUT_SECONDS', '0'))
+
         # Get the database manager
         self.db_manager = get_db_manager()
-        
-        # Initialize document processor with dependency injection
-        self.processor = DocumentProcessor(self.db_manager)
-        
+        # Chunks embedded now must be comparable with the stored ones
+        check_corpus_model(self.db_manager, get_embedding_provider().model)
+
+        # Cost estimation used to route jobs to a lane
+        self.cost_estimator = JobCostEstimator()
+
         # File paths
         self.uploads_dir = os.path.abspath(os.getenv('UPLOADS_DIR', '../server/uploads'))
-        
+
         logger.info(f"Configuration:")
         logger.info(f"- Queue Name: {self.queue_name}")
         logger.info(f"- RabbitMQ URL: {self.rabbitmq_url}")
+        logger.info(f"- Dead-Letter Queue: {self.dead_letter_queue}")
         logger.info(f"- Upload Directory: {self.uploads_dir}")
+        for lane, config in self.lanes.items():
+            logger.info(f"- {lane.capitalize()} Lane: {config['queue']} (concurrency={config['concurrency']})")
         logger.info("=== Initialization Complete ===\n")
 
     def connect(self):
@@ -47,29 +372,22 @@ class QueueConsumer:
                 pika.URLParameters(self.rabbitmq_url)
             )
             self.channel = self.connection.channel()
-            # Ensure queue exists
+            # Ensure queues exist
             self.channel.queue_declare(queue=self.queue_name, durable=True)
+            for config in self.lanes.values():
+                self.channel.queue_declare(queue=config['queue'], durable=True)
+            self.channel.queue_declare(queue=self.dead_letter_queue, durable=True)
             logger.info("✓ Successfully connected to RabbitMQ")
         except Exception as e:
             logger.error(f"✗ Error connecting to RabbitMQ: {e}")
             raise
 
-    def process_message(self, ch, method, properties, body):
-        """Process a message from the queue"""
+    def route_message(self, ch, method, properties, body):
+        """Estimate the cost of an incoming job and forward it to its lane"""
         try:
-            logger.info("\n=== Processing New Message ===")
             data = json.loads(body)
-            logger.info(f"Received message data: {data}")
-
-            # Extract message data
             job_id = data.get('jobId')
             file_path = data.get('filePath')
-            retries = data.get('retries', 0)
-            metadata = data.get('metadata', {})
-
-            logger.info(f"- Job ID: {job_id}")
-            logger.info(f"- Original File Path: {file_path}")
-            logger.info(f"- Retry Attempt: {retries}")
 
             # Validate required fields
             if not all([job_id, file_path]):
@@ -77,69 +395,90 @@ class QueueConsumer:
                 ch.basic_reject(delivery_tag=method.delivery_tag, requeue=False)
                 return
 
-            # Check max retries
-            if retries >= 3:
-                logger.error("✗ Max retries reached - rejecting message")
-                ch.basic_reject(delivery_tag=method.delivery_tag, requeue=False)
-                return
+            full_path = os.path.join(self.uploads_dir, os.path.basename(file_path))
+            cost = self.cost_estimator.estimate(full_path)
+            data['cost'] = cost
 
-            # Get full file path
-            file_name = os.path.basename(file_path)
-            full_path = os.path.join(self.uploads_dir, file_name)
-            logger.info(f"- Full File Path: {full_path}")
-            
-            # Add job info to metadata
-            metadata.update({
-                'job_id': job_id,
-                'original_filename': file_name
-            })
-            
-            # Process document through pipeline
-            result = self.processor.process_document(
-                file_id=job_id,
-                file_path=full_path,
-                metadata=metadata
+            lane_queue = self.lanes[cost['lane']]['queue']
+            ch.basic_publish(
+                exchange='',
+                routing_key=lane_queue,
+                body=json.dumps(data),
+                properties=pika.BasicProperties(delivery_mode=2)
             )
-            
-            logger.info(f"✓ Document processing complete:")
-            logger.info(f"  - Title: {result['document_info']['title']}")
-            logger.info(f"  - Chunks: {result['document_info']['num_chunks']}")
-            
             ch.basic_ack(delivery_tag=method.delivery_tag)
-            logger.info("✓ Message acknowledged")
-            logger.info("=== Message Processing Complete ===\n")
+            logger.info(f"✓ Routed job {job_id} to {lane_queue} "
+                        f"({cost['pages']} pages, {cost['size_bytes']} bytes)")
 
         except Exception as e:
-            logger.error(f"✗ Error processing message: {e}")
-            # Handle retries
-            data['retries'] = retries + 1
-            if retries < 3:
-                logger.warning(f"✗ Retrying message (attempt {retries + 1}/3)")
-                self.channel.basic_publish(
-                    exchange='',
-                    routing_key=self.queue_name,
-                    body=json.dumps(data)
-                )
+            # Routing only fails on malformed messages or broker errors;
+            # requeueing a malformed message would loop forever
+            logger.error(f"✗ Error routing message: {e}")
             ch.basic_reject(delivery_tag=method.delivery_tag, requeue=False)
-            logger.error("✗ Original message rejected")
-            logger.error("=== Message Processing Failed ===\n")
+
+    def _start_workers(self):
+        """Start the worker threads for every lane"""
+        for lane, config in self.lanes.items():
+            for i in range(config['concurrency']):
+                worker = LaneWorker(
+                    lane=lane,
+                    queue_name=config['queue'],
+                    dead_letter_queue=self.dead_letter_queue,
+                    rabbitmq_url=self.rabbitmq_url,
+                    uploads_dir=self.uploads_dir,
+                    db_manager=self.db_manager,
+                    index=i
+                )
+                worker.start()
+                self.workers.append(worker)
+        logger.info(f"✓ Started {len(self.workers)} lane workers")
+
+    def _stop_workers(self):
+        """Stop all lane workers, letting in-progress jobs finish"""
+        for worker in self.workers:
+            worker.stop()
+        # Jobs still running at the deadline are left unacked and redelivered
+        deadline = time.monotonic() + self.drain_timeout if self.drain_timeout else None
+        for worker in self.workers:
+            worker.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+            if worker.is_alive():
+                logger.warning(f"✗ {worker.name} did not finish its job within {self.drain_timeout:.0f}s; "
+                               f"it will be redelivered")
+        self.workers = []
+        # Page-shard conversion processes are only started by large jobs
+        ShardedConverter.get_instance().close()
+
+    def _on_sigterm(self, signum, frame):
+        """Drain on SIGTERM (docker stop) like on Ctrl+C"""
+        # A second SIGTERM during the drain exits right away
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        raise KeyboardInterrupt
 
     def start_consuming(self):
-        """Start consuming messages from the queue"""
+        """
+        Start the lane workers and route messages from the main queue
+
+        Ctrl+C and SIGTERM stop routing and wait for the in-flight jobs
+        (SHUTDOWN_DRAIN_TIMEOUT_SECONDS) before returning.
+        """
+        previous_sigterm = None
+        if threading.current_thread() is threading.main_thread():
+            previous_sigterm = signal.signal(signal.SIGTERM, self._on_sigterm)
         try:
             logger.info("\n=== Starting Consumer ===")
-            # Set how many messages to process at once
-            self.channel.basic_qos(prefetch_count=1)
-            logger.info("✓ QoS prefetch set to 1")
-            
-            # Start consuming messages from the queue
+            self._start_workers()
+
+            # Routing is cheap, so the router can prefetch more than one message
+            self.channel.basic_qos(prefetch_count=10)
+
+            # Start routing messages from the queue the API server publishes to
             self.channel.basic_consume(
                 queue=self.queue_name,
-                on_message_callback=self.process_message
+                on_message_callback=self.route_message
             )
-            logger.info(f"✓ Consuming from queue: {self.queue_name}")
+            logger.info(f"✓ Routing from queue: {self.queue_name}")
             logger.info("=== Consumer Ready ===\n")
-            
+
             logger.info("Waiting for messages... (Press CTRL+C to exit)")
             # Start the consumer (blocks the thread until stopped)
             self.channel.start_consuming()
@@ -147,7 +486,10 @@ class QueueConsumer:
             logger.info("\n=== Shutting Down Consumer ===")
             self.channel.stop_consuming()
         finally:
+            self._stop_workers()
             if self.connection:
                 self.connection.close()
                 logger.info("✓ Connection closed")
-                logger.info("=== Shutdown Complete ===\n")
\ No newline at end of file
+                logger.info("=== Shutdown Complete ===\n")
+            if previous_sigterm is not None:
+                signal.signal(signal.SIGTERM, previous_sigterm)
@@ -0,0 +1,254 @@
+# processing-service/src/rag/hot_documents.py
+"""
+Search frequency of documents and queries
+
+Every search counts once for each document in its results and once for its
+query (text, filters and embedding). Counts are kept in memory and added to
+document_heat and query_heat every HOT_DOCUMENTS_FLUSH_SECONDS (a failed
+flush puts them back for the next one); stored
+counts decay with a half-life of HOT_DOCUMENTS_HALF_LIFE_SECONDS, so the
+hottest rows are the ones searched most often lately. The cache warmer (see
+rag/warmer.py) reads them to decide what to load after a restart.
+
+Queries are keyed by a hash of their text and filters. The text is only
+stored, truncated to HOT_QUERIES_TEXT_CHARS characters, when that is above
+0; the warmer only needs the embedding and filters.
+
+HOT_DOCUMENTS_FLUSH_SECONDS=0 disables tracking.
+"""
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import Counter
+from typing import List, Dict, Any, Optional, Tuple
+
+from storage.db_manager import DatabaseManager, get_db_manager
+from storage.vectors import to_vector_literal
+
+logger = logging.getLogger(__name__)
+
+# Decayed heat of a row as of now; %(half_life)s is bound by the caller
+DECAYED_HEAT = "{table}.heat * power(0.5, extract(epoch FROM CURRENT_TIMESTAMP - {table}.updated_at) / %(half_life)s)"
+
+DOCUMENT_HEAT_SQL = f"""
+INSERT INTO document_heat (document_id, heat, updated_at)
+SELECT v.document_id, v.heat, CURRENT_TIMESTAMP
+FROM unnest(%(document_ids)s::int[], %(counts)s::float8[]) AS v (document_id, heat)
+JOIN documents d ON d.id = v.document_id
+ON CONFLICT (document_id) DO UPDATE SET
+    heat = {DECAYED_HEAT.format(table='document_heat')} + EXCLUDED.heat,
+    updated_at = EXCLUDED.updated_at
+"""
+
+QUERY_HEAT_SQL = f"""
+INSERT INTO query_heat (query_hash, query, filters, embedding, embedding_model, heat, updated_at)
+SELECT v.query_hash, v.query, v.filters::jsonb, v.embedding::vector, v.embedding_model, v.heat, CURRENT_TIMESTAMP
+FROM unnest(%(hashes)s::text[], %(queries)s::text[], %(filters)s::text[], %(embeddings)s::text[],
+            %(models)s::text[], %(counts)s::float8[])
+     AS v (query_hash, query, filters, embedding, embedding_model, heat)
+ON CONFLICT (query_hash) DO UPDATE SET
+    query = EXCLUDED.query,
+    filters = EXCLUDED.filters,
+    embedding = EXCLUDED.embedding,
+    embedding_model = EXCLUDED.embedding_model,
+    heat = {DECAYED_HEAT.format(table='query_heat')} + EXCLUDED.heat,
+    updated_at = EXCLUDED.updated_at
+"""
+
+# Rows untouched for ten half-lives have decayed below 0.1% of their heat
+PRUNE_SQL = "DELETE FROM {table} WHERE updated_at < CURRENT_TIMESTAMP - make_interval(secs => %(half_life)s * 10)"
+
+HOT_DOCUMENTS_SQL = f"""
+SELECT h.document_id, d.collection_id, {DECAYED_HEAT.format(table='h')} AS heat
+FROM document_heat h
+JOIN documents d ON d.id = h.document_id
+ORDER BY heat DESC
+LIMIT %(limit)s
+"""
+
+HOT_QUERIES_SQL = f"""
+SELECT h.query_hash, h.query, h.filters, h.embedding::real[] AS embedding, {DECAYED_HEAT.format(table='h')} AS heat
+FROM query_heat h
+WHERE h.embedding_model = %(model)s
+ORDER BY heat DESC
+LIMIT %(limit)s
+"""
+
+# (query, document_id, collection_id, top_k, min_score, include_embeddings)
+QueryKey = Tuple[str, Optional[int], Optional[int], int, float, bool]
+
+
+def _filters_json(key: QueryKey) -> str:
+    _, document_id, collection_id, top_k, min_score, include_embeddings = key
+    return json.dumps({
+        'document_id': document_id, 'collection_id': collection_id, 'top_k': top_k,
+        'min_score': min_score, 'include_embeddings': include_embeddings
+    }, sort_keys=True)
+
+
+def _query_hash(key: QueryKey) -> str:
+    return hashlib.sha256(f"{key[0]}\0{_filters_json(key)}".encode('utf-8')).hexdigest()
+
+
+def query_label(query: Dict[str, Any]) -> str:
+    """Stored (possibly truncated) text of a hot query, or its hash when the text isn't kept"""
+    return query['query'] if query.get('query') is not None else f"#{query['query_hash'][:12]}"
+
+
+class SearchHeatTracker(threading.Thread):
+    """Counts searches per document and query, and adds them to the database periodically"""
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls) -> 'SearchHeatTracker':
+        """Singleton access method; starts flushing once enabled"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = SearchHeatTracker()
+                if cls._instance.enabled:
+                    cls._instance.start()
+            return cls._instance
+
+    def __init__(self, db_manager: Optional[DatabaseManager] = None,
+                 flush_interval: Optional[float] = None, half_life: Optional[float] = None,
+                 max_queries: Optional[int] = None, query_text_chars: Optional[int] = None):
+        """
+        Args:
+            db_manager: Database connection manager (defaults to the process-wide one)
+            flush_interval: Seconds between flushes (defaults to HOT_DOCUMENTS_FLUSH_SECONDS, 0 disables)
+            half_life: Seconds for stored heat to halve (defaults to HOT_DOCUMENTS_HALF_LIFE_SECONDS)
+            max_queries: Distinct queries kept per flush, most frequent first
+                (defaults to HOT_DOCUMENTS_MAX_QUERIES)
+            query_text_chars: Characters of the query text stored with its heat
+                (defaults to HOT_QUERIES_TEXT_CHARS, 0 stores none)
+        """
+        super().__init__(name="search-heat-tracker", daemon=True)
+        self.db_manager = db_manager
+        self.flush_interval = flush_interval if flush_interval is not None \
+            else float(os.getenv('HOT_DOCUMENTS_FLUSH_SECONDS', '60'))
+        self.half_life = half_life or float(os.getenv('HOT_DOCUMENTS_HALF_LIFE_SECONDS', '86400'))
+        self.max_queries = max_queries or int(os.getenv('HOT_DOCUMENTS_MAX_QUERIES', '200'))
+        self.query_text_chars = query_text_chars if query_text_chars is not None \
+            else int(os.getenv('HOT_QUERIES_TEXT_CHARS', '0'))
+        self.lock = threading.Lock()
+        self.documents: Counter = Counter()
+        self.queries: Counter = Counter()
+        # Latest embedding and model of each counted query
+        self.query_embeddings: Dict[QueryKey, Tuple[Any, str]] = {}
+        self._stop_event = threading.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return self.flush_interval > 0
+
+    def record(self, key: QueryKey, embedding, model: str, results: List[Dict[str, Any]]) -> None:
+        """
+        Count one search
+
+        Args:
+            key: Query text and search filters
+            embedding: Query embedding
+            model: Embedding model of the query embedding
+            results: Search results
+        """
+        if not self.enabled:
+            return
+        document_ids = {result['document_id'] for result in results}
+        with self.lock:
+            self.documents.update(document_ids)
+            self.queries[key] += 1
+            self.query_embeddings[key] = (embedding, model)
+
+    def run(self):
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"✗ Search heat flush failed: {e}", exc_info=True)
+
+    def stop(self) -> None:
+        """Stop flushing and write what was counted so far"""
+        self._stop_event.set()
+        if not self.enabled:
+            return
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"✗ Search heat flush failed: {e}", exc_info=True)
+
+    def _restore(self, documents: Counter, queries: List[Tuple[QueryKey, int]],
+                 embeddings: Dict[QueryKey, Tuple[Any, str]]) -> None:
+        """Put back the counts of a failed flush, so the next one writes them"""
+        with self.lock:
+            self.documents.update(documents)
+            for key, count in queries:
+                self.queries[key] += count
+                # Searches counted since the swap have the newer embedding
+                self.query_embeddings.setdefault(key, embeddings[key])
+
+    def flush(self) -> Tuple[int, int]:
+        """
+        Add the counts since the last flush to the stored heat
+
+        Returns:
+            Number of documents and queries written
+        """
+        with self.lock:
+            documents, self.documents = self.documents, Counter()
+            queries, self.queries = self.queries, Counter()
+            embeddings, self.query_embeddings = self.query_embeddings, {}
+        if not documents and not queries:
+            return 0, 0
+
+        kept = queries.most_common(self.max_queries)
+        query_rows = []
+        for key, count in kept:
+            embedding, model = embeddings[key]
+            text = key[0][:self.query_text_chars] if self.query_text_chars > 0 else None
+            query_rows.append((_query_hash(key), text, _filters_json(key), to_vector_literal(embedding), model, count))
+        # Sorted, so concurrent flushes of several workers lock rows in the same order
+        document_rows = sorted(documents.items())
+        query_rows.sort(key=lambda row: row[0])
+
+        db_manager = self.db_manager or get_db_manager()
+        conn = db_manager.get_connection()
+        try:
+            params = {'half_life': self.half_life}
+            with conn.cursor() as cur:
+                if document_rows:
+                    document_ids, counts = zip(*document_rows)
+                    cur.execute(DOCUMENT_HEAT_SQL, {**params, 'document_ids': list(document_ids),
+                                                    'counts': list(counts)})
+                    cur.execute(PRUNE_SQL.format(table='document_heat'), params)
+                if query_rows:
+                    hashes, texts, filters, vectors, models, counts = zip(*query_rows)
+                    cur.execute(QUERY_HEAT_SQL, {**params, 'hashes': list(hashes), 'queries': list(texts),
+                                                 'filters': list(filters), 'embeddings': list(vectors),
+                                                 'models': list(models), 'counts': list(counts)})
+                    cur.execute(PRUNE_SQL.format(table='query_heat'), params)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            self._restore(documents, kept, embeddings)
+            raise
+        finally:
+            db_manager.return_connection(conn)
+        logger.debug(f"Flushed search heat of {len(document_rows)} documents and {len(query_rows)} queries")
+        return len(document_rows), len(query_rows)
+
+
+def hot_documents(db_manager: DatabaseManager, limit: int, half_life: float) -> List[Dict[str, Any]]:
+    """Most searched documents lately, with their collection and decayed heat"""
+    return db_manager.execute_query(
+        HOT_DOCUMENTS_SQL, {'limit': limit, 'half_life': half_life}, dict_cursor=True
+    ) or []
+
+
+def hot_queries(db_manager: DatabaseManager, model: str, limit: int, half_life: float) -> List[Dict[str, Any]]:
+    """Most frequent queries lately whose stored embedding was made by `model`"""
+    return db_manager.execute_query(
+        HOT_QUERIES_SQL, {'model': model, 'limit': limit, 'half_life': half_life}, dict_cursor=True
+    ) or []
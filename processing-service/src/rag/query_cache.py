@@ -0,0 +1,199 @@
+# processing-service/src/rag/query_cache.py
+"""
+Semantic cache of recent search results
+
+Users rephrase the same question ("how are documents processed?" / "how
+does document processing work"), and each variant used to cost a full ANN
+query. The cache keeps the embeddings of recent queries in a small float32
+matrix; a new query whose embedding has a cosine similarity of at least
+SEARCH_CACHE_THRESHOLD to a cached one with the same filters (document,
+collection, top_k, min_score, embeddings) is answered with that query's results.
+
+- Bounded: SEARCH_CACHE_SIZE entries, least recently used evicted first,
+  and entries expire after SEARCH_CACHE_TTL_SECONDS
+- Invalidated on chunk changes: writers NOTIFY the collection and document
+  they changed (see storage/notifications.py) and matching entries are
+  dropped; a search that started before a change never stores its results
+- SEARCH_CACHE_SIZE=0 (the default) disables it
+"""
+import os
+import time
+import logging
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from storage.db_manager import get_db_manager
+from storage.notifications import CHUNKS_CHANGED_CHANNEL, ChangeListener, parse_chunks_changed
+from monitoring.metrics import SEARCH_CACHE_LOOKUPS, SEARCH_CACHE_INVALIDATIONS, SEARCH_CACHE_ENTRIES
+
+logger = logging.getLogger(__name__)
+
+# (document_id, collection_id, top_k, min_score, include_embeddings)
+CacheKey = Tuple[Optional[int], Optional[int], int, float, bool]
+
+
+class SemanticQueryCache:
+    """Near-duplicate query cache over a fixed-size embedding matrix"""
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls) -> 'SemanticQueryCache':
+        """Singleton access method; listens for chunk changes once enabled"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = SemanticQueryCache()
+                if cls._instance.capacity:
+                    cls._instance.listener = ChangeListener(
+                        get_db_manager().db_params, CHUNKS_CHANGED_CHANNEL, cls._instance.on_change
+                    )
+                    cls._instance.listener.start()
+            return cls._instance
+
+    def __init__(self, capacity: Optional[int] = None, threshold: Optional[float] = None,
+                 ttl: Optional[float] = None):
+        """
+        Args:
+            capacity: Maximum cached queries (defaults to SEARCH_CACHE_SIZE, 0 disables)
+            threshold: Minimum cosine similarity for a hit (defaults to SEARCH_CACHE_THRESHOLD)
+            ttl: Seconds an entry stays valid (defaults to SEARCH_CACHE_TTL_SECONDS)
+        """
+        self.capacity = capacity if capacity is not None else int(os.getenv('SEARCH_CACHE_SIZE', '0'))
+        self.threshold = threshold if threshold is not None else float(os.getenv('SEARCH_CACHE_THRESHOLD', '0.97'))
+        self.ttl = ttl if ttl is not None else float(os.getenv('SEARCH_CACHE_TTL_SECONDS', '300'))
+        self.listener: Optional[ChangeListener] = None
+        self.lock = threading.Lock()
+        # Bumped by every invalidation, so searches that started before one don't store stale results
+        self.generation = 0
+
+        # Query vectors are allocated on the first store, when their size is known
+        self.vectors: Optional[np.ndarray] = None
+        self.valid = np.zeros(self.capacity, dtype=bool)
+        self.key_hashes = np.zeros(self.capacity, dtype=np.int64)
+        self.documents = np.full(self.capacity, -1, dtype=np.int64)
+        self.collections = np.full(self.capacity, -1, dtype=np.int64)
+        self.expires = np.zeros(self.capacity, dtype=np.float64)
+        self.last_used = np.zeros(self.capacity, dtype=np.float64)
+        self.keys: List[Optional[CacheKey]] = [None] * self.capacity
+        self.results: List[Optional[List[Dict[str, Any]]]] = [None] * self.capacity
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def lookup(self, embedding, key: CacheKey) -> Optional[List[Dict[str, Any]]]:
+        """
+        Results of a cached query similar enough to this one, with the same filters
+
+        Args:
+            embedding: Query embedding
+            key: Search filters
+
+        Returns:
+            Copies of the cached results, or None on a miss
+        """
+        if not self.enabled:
+            return None
+        vector = self._normalize(embedding)
+        with self.lock:
+            now = time.monotonic()
+            candidates = np.flatnonzero(self.valid & (self.key_hashes == hash(key)) & (self.expires > now))
+            if candidates.size and self.vectors is not None:
+                similarities = self.vectors[candidates] @ vector
+                best = int(np.argmax(similarities))
+                slot = int(candidates[best])
+                if similarities[best] >= self.threshold and self.keys[slot] == key:
+                    self.last_used[slot] = now
+                    SEARCH_CACHE_LOOKUPS.labels(result='hit').inc()
+                    return [dict(result) for result in self.results[slot]]
+        SEARCH_CACHE_LOOKUPS.labels(result='miss').inc()
+        return None
+
+    def store(self, embedding, key: CacheKey, results: List[Dict[str, Any]], generation: int) -> None:
+        """
+        Cache the results of a query
+
+        Args:
+            embedding: Query embedding
+            key: Search filters
+            results: Search results
+            generation: Value of `generation` read before the search ran
+        """
+        if not self.enabled:
+            return
+        vector = self._normalize(embedding)
+        with self.lock:
+            if generation != self.generation:
+                return
+            if self.vectors is None:
+                self.vectors = np.zeros((self.capacity, len(vector)), dtype=np.float32)
+            free = np.flatnonzero(~self.valid)
+            slot = int(free[0]) if free.size else int(np.argmin(self.last_used))
+
+            now = time.monotonic()
+            document_id, collection_id = key[0], key[1]
+            self.vectors[slot] = vector
+            self.valid[slot] = True
+            self.key_hashes[slot] = hash(key)
+            self.documents[slot] = document_id if document_id is not None else -1
+            self.collections[slot] = collection_id if collection_id is not None else -1
+            self.expires[slot] = now + self.ttl
+            self.last_used[slot] = now
+            self.keys[slot] = key
+            self.results[slot] = [dict(result) for result in results]
+            SEARCH_CACHE_ENTRIES.set(int(self.valid.sum()))
+
+    def invalidate(self, collection_id: Optional[int] = None, document_id: Optional[int] = None) -> int:
+        """
+        Drop entries whose results may include chunks of a changed collection or document
+
+        Searches scoped to a document don't record its collection, so a change
+        without a document drops all of them.
+
+        Args:
+            collection_id: Changed collection (None drops everything)
+            document_id: Changed document, if only one changed
+
+        Returns:
+            Number of entries dropped
+        """
+        with self.lock:
+            self.generation += 1
+            if collection_id is None:
+                affected = self.valid.copy()
+            else:
+                unscoped = (self.documents < 0) & (self.collections < 0)
+                affected = self.valid & (unscoped | (self.collections == collection_id))
+                if document_id is None:
+                    affected |= self.valid & (self.documents >= 0)
+                else:
+                    affected |= self.valid & (self.documents == document_id)
+            for slot in np.flatnonzero(affected):
+                self.results[slot] = None
+                self.keys[slot] = None
+            self.valid &= ~affected
+            dropped = int(affected.sum())
+            SEARCH_CACHE_ENTRIES.set(int(self.valid.sum()))
+        if dropped:
+            SEARCH_CACHE_INVALIDATIONS.inc(dropped)
+        return dropped
+
+    def on_change(self, payload: Optional[str]) -> None:
+        """ChangeListener callback"""
+        if payload is None:
+            self.invalidate()
+            return
+        try:
+            collection_id, document_id = parse_chunks_changed(payload)
+        except ValueError:
+            logger.warning(f"Ignoring malformed {CHUNKS_CHANGED_CHANNEL} payload: {payload}")
+            self.invalidate()
+            return
+        self.invalidate(collection_id, document_id)
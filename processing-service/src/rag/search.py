@@ -1,41 +1,111 @@
 # processing-service/src/rag/search.py
 import os
+import re
 import logging
 import json
 import psycopg2
 from psycopg2.extras import RealDictCursor
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator
 import time
-from openai import OpenAI
+
+import numpy as np
 
 from storage.db_manager import DatabaseManager
+from storage.vectors import to_vector_literal
+from embeddings.providers import EmbeddingProvider, get_embedding_provider
+from embeddings.scheduler import EmbeddingScheduler, QUERY
+from rag.query_cache import SemanticQueryCache
+from rag.hot_documents import SearchHeatTracker
+from monitoring.metrics import SEARCH_STAGE_SECONDS, EMBEDDING_TOKENS
 
 logger = logging.getLogger(__name__)
 
+SEARCH_COLUMNS = """
+    c.id, 
+    c.document_id, 
+    c.chunk_text as text, 
+    c.metadata,
+    c.parent_id,
+    1 - (c.embedding <=> $1::vector) as score"""
+
+# Only selected when the caller asked for the chunk embeddings (client-side reranking)
+EMBEDDING_COLUMN = """,
+    c.embedding::real[] as embedding"""
+
+# Ordering by the raw distance (rather than by the derived score) lets
+# Postgres answer the query from the vector index. Only chunks embedded by
+# the query's model are compared: while a migration or a provider change
+# re-embeds the corpus, the other model's vectors are not comparable
+SEARCH_SQL = """
+SELECT {columns}
+FROM chunks c
+WHERE c.embedding_model = $3
+ORDER BY c.embedding <=> $1::vector
+LIMIT $2
+"""
+
+# Scoped searches filter on collection_id so that only that collection's
+# chunks partition (and its vector index) is scanned
+SEARCH_COLLECTION_SQL = """
+SELECT {columns}
+FROM chunks c
+WHERE c.collection_id = $4
+  AND c.embedding_model = $3
+ORDER BY c.embedding <=> $1::vector
+LIMIT $2
+"""
+
+PLACEHOLDER_PATTERN = re.compile(r'\$(\d+)')
+
+PARENTS_SQL = """
+SELECT id, document_id, parent_text as text, page_numbers, metadata
+FROM chunk_parents
+WHERE id = ANY($1)
+"""
+
+SEARCH_DOCUMENT_SQL = """
+SELECT {columns}
+FROM chunks c
+WHERE c.collection_id = (SELECT collection_id FROM documents WHERE id = $4)
+  AND c.document_id = $4
+  AND c.embedding_model = $3
+ORDER BY c.embedding <=> $1::vector
+LIMIT $2
+"""
+
 class VectorSearch:
     """Handles vector search operations using pgvector"""
     
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: DatabaseManager, provider: Optional[EmbeddingProvider] = None,
+                 scheduler: Optional[EmbeddingScheduler] = None, cache: Optional[SemanticQueryCache] = None,
+                 tracker: Optional[SearchHeatTracker] = None):
         """
         Initialize the vector search service
         
         Args:
             db_manager: Database connection manager
+            provider: Embedding provider (defaults to the one configured by EMBEDDING_PROVIDER)
+            scheduler: Rate-limit scheduler (defaults to the process-wide one)
+            cache: Semantic query cache (defaults to the process-wide one, off unless SEARCH_CACHE_SIZE is set)
+            tracker: Search heat tracker (defaults to the process-wide one)
         """
         # Store the database manager
         self.db_manager = db_manager
         
-        # Initialize OpenAI client
-        api_key = os.getenv('OPENAI_API_KEY')
-        if not api_key:
-            logger.warning("OPENAI_API_KEY environment variable not set")
-            
-        self.client = OpenAI(api_key=api_key)
+        # Initialize embedding provider
+        self.provider = provider or get_embedding_provider()
+        # Queries are served ahead of ingestion when the provider's limits are tight
+        self.scheduler = scheduler or EmbeddingScheduler.get_instance()
+        self.cache = cache or SemanticQueryCache.get_instance()
+        # Counts the documents and queries searched, for the cache warmer
+        self.tracker = tracker or SearchHeatTracker.get_instance()
+        # Rows fetched per round trip by search_stream
+        self.stream_batch_size = int(os.getenv('SEARCH_STREAM_BATCH_SIZE', '50'))
         logger.info("Vector search service initialized")
     
     def _generate_embedding(self, text: str) -> List[float]:
         """
-        Generate embedding for a text using OpenAI API
+        Generate embedding for a text using the embedding provider
         
         Args:
             text: Text to generate embedding for
@@ -43,15 +113,54 @@ class VectorSearch:
         Returns:
             List of floats representing the embedding vector
         """
-        response = self.client.embeddings.create(
-            model="text-embedding-3-large",
-            input=[text],
-            dimensions=1536
-        )
-        return response.data[0].embedding
+        embeddings, tokens = self.scheduler.embed(self.provider, [text], priority=QUERY)
+        EMBEDDING_TOKENS.labels(source='query').inc(tokens)
+        return embeddings[0]
+    
+    @staticmethod
+    def _search_statement(query_embedding, model: str, document_id: Optional[int], top_k: int,
+                          collection_id: Optional[int], include_embeddings: bool):
+        """Prepared statement name, SQL ($n placeholders) and parameters of a search with `model`'s embedding"""
+        params = [to_vector_literal(query_embedding), top_k, model]
+        
+        # Add document or collection filter if specified; a document
+        # already determines its collection
+        if document_id is not None:
+            statement, sql = 'search_chunks_by_document', SEARCH_DOCUMENT_SQL
+            params.append(document_id)
+        elif collection_id is not None:
+            statement, sql = 'search_chunks_by_collection', SEARCH_COLLECTION_SQL
+            params.append(collection_id)
+        else:
+            statement, sql = 'search_chunks', SEARCH_SQL
+        columns = SEARCH_COLUMNS
+        if include_embeddings:
+            statement, columns = f"{statement}_with_embeddings", columns + EMBEDDING_COLUMN
+        return statement, sql.format(columns=columns), tuple(params)
+    
+    @staticmethod
+    def _format_result(row, include_embeddings: bool) -> Dict[str, Any]:
+        """Convert a result row to the dict returned to callers"""
+        # Parse metadata if it's a string
+        if isinstance(row['metadata'], str):
+            try:
+                row['metadata'] = json.loads(row['metadata'])
+            except:
+                pass
+                
+        # Ensure text is not too long for response
+        if len(row['text']) > 1000:
+            row['text'] = row['text'][:997] + '...'
+        
+        if include_embeddings:
+            row['embedding'] = np.asarray(row['embedding'], dtype=np.float32)
+        
+        return dict(row)
     
     def search(self, query: str, document_id: Optional[int] = None, 
-               top_k: int = 5, min_score: float = 0.0) -> List[Dict[str, Any]]:
+               top_k: int = 5, min_score: float = 0.0,
+               collection_id: Optional[int] = None,
+               include_embeddings: bool = False) -> List[Dict[str, Any]]:
         """
         Search for similar text chunks using vector similarity
         
@@ -60,6 +169,8 @@ class VectorSearch:
             document_id: Optional ID to limit search to a specific document
             top_k: Number of results to return
             min_score: Minimum similarity score threshold
+            collection_id: Optional ID to limit search to one collection
+            include_embeddings: Add each chunk's embedding (float32 array) as 'embedding'
             
         Returns:
             List of search results with text and metadata
@@ -69,58 +180,144 @@ class VectorSearch:
         try:
             # Generate embedding for the query
             logger.info(f"Generating embedding for query: {query}")
-            query_embedding = self._generate_embedding(query)
-            
-            # Build the query
-            sql = """
-            SELECT 
-                c.id, 
-                c.document_id, 
-                c.chunk_text as text, 
-                c.metadata,
-                1 - (c.embedding <=> %s::vector) as score
-            FROM chunks c
-            """
-            
-            params = [query_embedding]
-            
-            # Add document filter if specified
-            if document_id is not None:
-                sql += " WHERE c.document_id = %s"
-                params.append(document_id)
-            
-            # Order by score
-            sql += " ORDER BY score DESC"
-            
-            # Add limit
-            sql += " LIMIT %s"
-            params.append(top_k)
-            
-            # Execute query using the database manager
-            results = self.db_manager.execute_query(sql, tuple(params), dict_cursor=True)
-            
-            # Filter results by minimum score and convert to list of dicts
-            search_results = []
-            for row in results:
-                if row['score'] < min_score:
-                    continue
-                    
-                # Parse metadata if it's a string
-                if isinstance(row['metadata'], str):
-                    try:
-                        row['metadata'] = json.loads(row['metadata'])
-                    except:
-                        pass
-                        
-                # Ensure text is not too long for response
-                if len(row['text']) > 1000:
-                    row['text'] = row['text'][:997] + '...'
-                    
-                search_results.append(dict(row))
+            with SEARCH_STAGE_SECONDS.labels(stage='embedding').time():
+                query_embedding = self._generate_embedding(query)
             
+            search_results = self.search_embedding(
+                query_embedding, document_id, top_k, min_score, collection_id, include_embeddings
+            )
+            self.tracker.record(
+                (query, document_id, collection_id, top_k, min_score, include_embeddings),
+                query_embedding, self.provider.model, search_results
+            )
             logger.info(f"Found {len(search_results)} results in {time.time() - start_time:.3f}s")
             return search_results
                 
         except Exception as e:
             logger.error(f"Error during vector search: {e}", exc_info=True)
-            raise
\ No newline at end of file
+            raise
+
+    def search_embedding(self, query_embedding, document_id: Optional[int] = None,
+                         top_k: int = 5, min_score: float = 0.0,
+                         collection_id: Optional[int] = None,
+                         include_embeddings: bool = False) -> List[Dict[str, Any]]:
+        """
+        Search like search(), with an already computed query embedding
+
+        Goes through the query cache like search() but isn't counted in the
+        search heat, so the cache warmer can replay queries with it. The
+        embedding must come from this search's provider model.
+
+        Returns:
+            List of search results with text and metadata
+        """
+        # Rephrasings of a recent query with the same filters reuse its results
+        cache_key = (document_id, collection_id, top_k, min_score, include_embeddings)
+        cached = self.cache.lookup(query_embedding, cache_key)
+        if cached is not None:
+            logger.info(f"Served {len(cached)} cached results")
+            return cached
+        cache_generation = self.cache.generation
+        
+        statement, sql, params = self._search_statement(
+            query_embedding, self.provider.model, document_id, top_k, collection_id, include_embeddings
+        )
+        
+        # Execute query using the database manager
+        with SEARCH_STAGE_SECONDS.labels(stage='sql').time():
+            results = self.db_manager.execute_prepared(
+                statement, sql, params, dict_cursor=True
+            )
+        
+        # Filter results by minimum score and convert to list of dicts
+        search_results = [
+            self._format_result(row, include_embeddings)
+            for row in results if row['score'] >= min_score
+        ]
+        
+        self.cache.store(query_embedding, cache_key, search_results, cache_generation)
+        return search_results
+
+    def search_stream(self, query: str, document_id: Optional[int] = None,
+                      top_k: int = 5, min_score: float = 0.0,
+                      collection_id: Optional[int] = None,
+                      include_embeddings: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Search like search(), yielding results as they come off a server-side cursor
+        
+        Rows arrive in score order, so the scan stops at the first row below
+        min_score. Complete result sets are stored in the query cache like
+        search()'s.
+        
+        Args:
+            query: Search query text
+            document_id: Optional ID to limit search to a specific document
+            top_k: Number of results to return
+            min_score: Minimum similarity score threshold
+            collection_id: Optional ID to limit search to one collection
+            include_embeddings: Add each chunk's embedding (float32 array) as 'embedding'
+            
+        Yields:
+            Search results, best first
+        """
+        start_time = time.time()
+        with SEARCH_STAGE_SECONDS.labels(stage='embedding').time():
+            query_embedding = self._generate_embedding(query)
+        
+        heat_key = (query, document_id, collection_id, top_k, min_score, include_embeddings)
+        cache_key = heat_key[1:]
+        cached = self.cache.lookup(query_embedding, cache_key)
+        if cached is not None:
+            self.tracker.record(heat_key, query_embedding, self.provider.model, cached)
+            yield from cached
+            return
+        cache_generation = self.cache.generation
+        
+        _, sql, params = self._search_statement(
+            query_embedding, self.provider.model, document_id, top_k, collection_id, include_embeddings
+        )
+        # Server-side cursors can't run prepared statements; bind $n as %(n)s
+        rows = self.db_manager.stream_query(
+            PLACEHOLDER_PATTERN.sub(r'%(\1)s', sql),
+            {str(position): value for position, value in enumerate(params, 1)},
+            dict_cursor=True, itersize=self.stream_batch_size,
+            # hnsw only returns up to ef_search candidates
+            settings={'hnsw.ef_search': str(min(max(top_k, 40), 1000))}
+        )
+        
+        search_results = []
+        try:
+            for row in rows:
+                if row['score'] < min_score:
+                    break
+                result = self._format_result(row, include_embeddings)
+                search_results.append(result)
+                yield result
+        finally:
+            rows.close()
+        
+        self.cache.store(query_embedding, cache_key, search_results, cache_generation)
+        self.tracker.record(heat_key, query_embedding, self.provider.model, search_results)
+        logger.info(f"Streamed {len(search_results)} results in {time.time() - start_time:.3f}s")
+    
+    def get_parents(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Load the parent sections of search results
+
+        Args:
+            results: Results of search()
+
+        Returns:
+            Each distinct parent section once, in order of its first result
+        """
+        parent_ids = list(dict.fromkeys(
+            result['parent_id'] for result in results if result.get('parent_id') is not None
+        ))
+        if not parent_ids:
+            return []
+        with SEARCH_STAGE_SECONDS.labels(stage='parents').time():
+            rows = self.db_manager.execute_prepared(
+                'search_chunk_parents', PARENTS_SQL, (parent_ids,), dict_cursor=True
+            )
+        parents = {row['id']: dict(row) for row in rows}
+        return [parents[parent_id] for parent_id in parent_ids if parent_id in parents]
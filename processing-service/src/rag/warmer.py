@@ -0,0 +1,306 @@
+# processing-service/src/rag/warmer.py
+"""
+Cache warming for the search path
+
+After a Postgres or service restart the vector indexes and chunk pages of
+popular documents are not in memory, and the first searches against them
+read everything from disk. The warmer runs once at startup
+(PREWARM_ON_STARTUP) and then every PREWARM_INTERVAL_SECONDS, using the
+search heat recorded by rag/hot_documents.py:
+
+- loads the vector indexes of the hottest documents' collections into
+  shared buffers with pg_prewarm (when the extension is installed), as long
+  as they fit in PREWARM_MAX_INDEX_SHARE of shared_buffers
+- reads the hottest documents' chunks and parent sections (heap, TOAST and
+  the document index) with targeted scans
+- replays the hottest queries with their stored embeddings, which walks the
+  index along the paths real searches take and seeds this process's query
+  cache without calling the embedding provider
+
+Every run measures first-query latency with and without warming: the two
+hot queries ranked right after the replayed ones are held out of the
+replay, one is run right before warming and the other right after
+(straight SQL, bypassing the query cache). Running a query loads its own
+pages, so a single query probed twice would always look warm the second
+time. At startup the first probe is the cold first query a user would have
+seen. The two probes are different queries, so compare them over several
+runs, or restart with PREWARM_ON_STARTUP off and on, before drawing
+conclusions.
+
+The buffer cache is shared, so only one process (API worker) at a time
+loads pages; the query cache is per process, so every worker replays.
+
+Usage (from processing-service/src):
+    python -m rag.warmer status
+    python -m rag.warmer run
+"""
+import os
+import json
+import time
+import argparse
+import logging
+import threading
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from rag.search import VectorSearch
+from rag.hot_documents import hot_documents, hot_queries, query_label
+from storage.collections import vector_index_name
+from storage.db_manager import DatabaseManager, get_db_manager
+from monitoring.metrics import SEARCH_PREWARM_PROBE_SECONDS, SEARCH_PREWARM_BLOCKS
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary application-wide key for pg_try_advisory_lock
+PREWARM_LOCK_KEY = 72_040_039
+
+INDEX_SIZE_SQL = """
+SELECT pg_relation_size(to_regclass(%s)),
+       (SELECT setting::bigint FROM pg_settings WHERE name = 'shared_buffers')
+           * current_setting('block_size')::bigint
+"""
+
+CHUNK_PAGES_SQL = """
+SELECT count(*), coalesce(sum(octet_length(c.chunk_text) + vector_dims(c.embedding)), 0)
+FROM chunks c
+WHERE c.collection_id = ANY(%s) AND c.document_id = ANY(%s)
+"""
+
+PARENT_PAGES_SQL = """
+SELECT count(*), coalesce(sum(octet_length(p.parent_text)), 0)
+FROM chunk_parents p
+WHERE p.document_id = ANY(%s)
+"""
+
+
+class CacheWarmer(threading.Thread):
+    """Loads the hottest documents' pages and seeds the query cache, at startup and periodically"""
+
+    def __init__(self, db_manager: DatabaseManager, vector_search: Optional[VectorSearch] = None,
+                 interval: Optional[float] = None, documents: Optional[int] = None,
+                 queries: Optional[int] = None):
+        """
+        Args:
+            db_manager: Database connection manager
+            vector_search: Search service whose query cache is seeded (defaults to a new one)
+            interval: Seconds between runs after the startup one (defaults to
+                PREWARM_INTERVAL_SECONDS, 0 runs only at startup)
+            documents: Hottest documents to load (defaults to PREWARM_DOCUMENTS)
+            queries: Hottest queries to replay (defaults to PREWARM_QUERIES)
+        """
+        super().__init__(name="cache-warmer", daemon=True)
+        self.db_manager = db_manager
+        self.vector_search = vector_search
+        self.interval = interval if interval is not None else float(os.getenv('PREWARM_INTERVAL_SECONDS', '300'))
+        self.documents = documents if documents is not None else int(os.getenv('PREWARM_DOCUMENTS', '50'))
+        self.queries = queries if queries is not None else int(os.getenv('PREWARM_QUERIES', '20'))
+        self.on_startup = os.getenv('PREWARM_ON_STARTUP', 'true').lower() == 'true'
+        # Indexes are only prewarmed while they fit in this share of shared_buffers
+        self.max_index_share = float(os.getenv('PREWARM_MAX_INDEX_SHARE', '0.5'))
+        self.half_life = float(os.getenv('HOT_DOCUMENTS_HALF_LIFE_SECONDS', '86400'))
+        self.last_report: Optional[Dict[str, Any]] = None
+        self._stop_event = threading.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return self.on_startup or self.interval > 0
+
+    def run(self):
+        if self.on_startup:
+            self._run_logged()
+        if self.interval <= 0:
+            return
+        while not self._stop_event.wait(self.interval):
+            self._run_logged()
+
+    def _run_logged(self) -> None:
+        try:
+            self.run_once()
+        except Exception as e:
+            logger.error(f"✗ Cache warming failed: {e}", exc_info=True)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def _get_vector_search(self) -> VectorSearch:
+        if self.vector_search is None:
+            self.vector_search = VectorSearch(self.db_manager)
+        return self.vector_search
+
+    @staticmethod
+    def _query_filters(query: Dict[str, Any]) -> Dict[str, Any]:
+        filters = query['filters']
+        return json.loads(filters) if isinstance(filters, str) else filters
+
+    def _probe(self, query: Dict[str, Any]) -> float:
+        """Seconds the SQL of a hot query takes right now, bypassing the query cache"""
+        filters = self._query_filters(query)
+        statement, sql, params = VectorSearch._search_statement(
+            query['embedding'], self._get_vector_search().provider.model, filters['document_id'], filters['top_k'],
+            filters['collection_id'], filters['include_embeddings']
+        )
+        start = time.perf_counter()
+        self.db_manager.execute_prepared(statement, sql, params)
+        return time.perf_counter() - start
+
+    def _prewarm_indexes(self, cur, collection_ids: List[int], report: Dict[str, Any]) -> None:
+        """Load the collections' vector indexes into shared buffers, hottest first, within budget"""
+        cur.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_prewarm')")
+        if not cur.fetchone()[0]:
+            report['pg_prewarm'] = False
+            return
+        report['pg_prewarm'] = True
+
+        budget = None
+        for collection_id in collection_ids:
+            index = vector_index_name(collection_id)
+            cur.execute(INDEX_SIZE_SQL, (index,))
+            size, shared_buffers = cur.fetchone()
+            if size is None:
+                # Collection without a vector index
+                continue
+            if budget is None:
+                budget = shared_buffers * self.max_index_share
+            if size > budget:
+                report['indexes'].append({'index': index, 'bytes': size, 'blocks': 0, 'skipped': 'over budget'})
+                continue
+            start = time.perf_counter()
+            cur.execute("SELECT pg_prewarm(%s)", (index,))
+            blocks = cur.fetchone()[0]
+            budget -= size
+            SEARCH_PREWARM_BLOCKS.labels(relation=index).inc(blocks)
+            report['indexes'].append({'index': index, 'bytes': size, 'blocks': blocks,
+                                      'seconds': round(time.perf_counter() - start, 3)})
+
+    def _read_documents(self, cur, documents: List[Dict[str, Any]], report: Dict[str, Any]) -> None:
+        """Read the documents' chunks (text and embeddings) and parent sections"""
+        document_ids = [document['document_id'] for document in documents]
+        collection_ids = sorted({document['collection_id'] for document in documents})
+        start = time.perf_counter()
+        # collection_id lets Postgres skip the other collections' partitions
+        cur.execute(CHUNK_PAGES_SQL, (collection_ids, document_ids))
+        chunks, chunk_bytes = cur.fetchone()
+        cur.execute(PARENT_PAGES_SQL, (document_ids,))
+        parents, parent_bytes = cur.fetchone()
+        report['documents'] = {
+            'count': len(document_ids), 'chunks': chunks, 'parents': parents,
+            'bytes': int(chunk_bytes + parent_bytes), 'seconds': round(time.perf_counter() - start, 3)
+        }
+
+    def _load_pages(self, documents: List[Dict[str, Any]], report: Dict[str, Any]) -> None:
+        """Load the hot documents' index and heap pages, unless another process is already at it"""
+        conn = self.db_manager.get_connection()
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_try_advisory_lock(%s)", (PREWARM_LOCK_KEY,))
+                if not cur.fetchone()[0]:
+                    report['skipped'] = 'another process is loading pages'
+                    return
+                try:
+                    # Hottest collection first, so its index gets the buffer budget
+                    collection_ids = list(dict.fromkeys(document['collection_id'] for document in documents))
+                    self._prewarm_indexes(cur, collection_ids, report)
+                    self._read_documents(cur, documents, report)
+                finally:
+                    cur.execute("SELECT pg_advisory_unlock(%s)", (PREWARM_LOCK_KEY,))
+        finally:
+            conn.autocommit = False
+            self.db_manager.return_connection(conn)
+
+    def _replay_queries(self, queries: List[Dict[str, Any]], report: Dict[str, Any]) -> None:
+        """Run the hot queries again, storing their results in the query cache"""
+        vector_search = self._get_vector_search()
+        start = time.perf_counter()
+        for query in queries:
+            try:
+                vector_search.search_embedding(
+                    np.asarray(query['embedding'], dtype=np.float32), **self._query_filters(query)
+                )
+                report['queries']['replayed'] += 1
+            except Exception as e:
+                logger.warning(f"Couldn't replay query {query_label(query)!r}: {e}")
+        report['queries']['seconds'] = round(time.perf_counter() - start, 3)
+
+    def run_once(self) -> Dict[str, Any]:
+        """
+        Warm the buffer cache and the query cache once
+
+        Returns:
+            Report with what was loaded and the probe latencies (seconds)
+        """
+        report = {'timestamp': time.time(), 'pg_prewarm': None, 'indexes': [], 'documents': None,
+                  'queries': {'replayed': 0, 'cache_enabled': False},
+                  'probe': None, 'skipped': None}
+        vector_search = self._get_vector_search()
+        report['queries']['cache_enabled'] = vector_search.cache.enabled
+        documents = hot_documents(self.db_manager, self.documents, self.half_life) if self.documents > 0 else []
+        # Two more than are replayed, held out as probes
+        queries = hot_queries(self.db_manager, vector_search.provider.model,
+                              self.queries + 2, self.half_life) if self.queries > 0 else []
+
+        # Held-out queries, never replayed: one probed cold, the other once warmed
+        probes = None
+        if len(queries) > 2:
+            probes = {'before': queries[-2], 'after': queries[-1]}
+            queries = queries[:-2]
+            report['probe'] = {'before': {'query': query_label(probes['before']),
+                                          'seconds': self._probe(probes['before'])}}
+
+        if documents:
+            self._load_pages(documents, report)
+        if queries:
+            self._replay_queries(queries, report)
+
+        if probes is not None:
+            report['probe']['after'] = {'query': query_label(probes['after']),
+                                        'seconds': self._probe(probes['after'])}
+            for phase in ('before', 'after'):
+                SEARCH_PREWARM_PROBE_SECONDS.labels(phase=phase).set(report['probe'][phase]['seconds'])
+            logger.info(
+                f"✓ Warmed {len(documents)} documents and {report['queries']['replayed']} queries: "
+                f"first unwarmed query took {report['probe']['before']['seconds'] * 1000:.1f}ms before, "
+                f"{report['probe']['after']['seconds'] * 1000:.1f}ms after"
+            )
+        elif documents:
+            logger.info(f"✓ Warmed {len(documents)} documents")
+        else:
+            logger.info("No search heat recorded yet, nothing to warm")
+
+        self.last_report = report
+        return report
+
+
+def main():
+    """Command line entry point"""
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Search cache warming")
+    parser.add_argument('command', choices=['status', 'run'],
+                        help="status: list the hottest documents and queries; run: warm the buffer cache now")
+    args = parser.parse_args()
+
+    db_manager = get_db_manager()
+    try:
+        warmer = CacheWarmer(db_manager)
+        if args.command == 'status':
+            model = warmer._get_vector_search().provider.model
+            report = {
+                'documents': hot_documents(db_manager, warmer.documents, warmer.half_life),
+                'queries': [
+                    {'query': query_label(query), 'filters': warmer._query_filters(query), 'heat': query['heat']}
+                    for query in hot_queries(db_manager, model, warmer.queries, warmer.half_life)
+                ]
+            }
+        else:
+            report = warmer.run_once()
+        print(json.dumps(report, indent=2, default=str))
+    finally:
+        db_manager.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+# processing-service/src/scheduling/dead_letters.py
+import os
+import json
+import argparse
+import logging
+from typing import List, Dict, Any, Optional
+import pika
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+
+def dead_letter_queue_name(queue_name: str) -> str:
+    """Name of the dead-letter queue for a processing queue"""
+    return os.getenv('RABBITMQ_DEAD_LETTER_QUEUE', f"{queue_name}.dead")
+
+
+class DeadLetterQueue:
+    """
+    Inspect and replay jobs that exhausted their retries
+
+    Messages in the dead-letter queue are the original job payload plus
+    a `failure` entry describing the last error. The document a job created
+    is deleted when it is dead-lettered, so a replayed job starts over with
+    extraction.
+    """
+
+    def __init__(self, rabbitmq_url: Optional[str] = None, queue_name: Optional[str] = None):
+        """
+        Initialize the dead-letter queue client
+
+        Args:
+            rabbitmq_url: RabbitMQ connection URL
+            queue_name: Processing queue that replayed jobs are sent back to
+        """
+        self.rabbitmq_url = rabbitmq_url or os.getenv('RABBITMQ_URL', 'amqp://localhost:5672')
+        self.queue_name = queue_name or os.getenv('RABBITMQ_QUEUE_NAME', 'document_processing')
+        self.dead_letter_queue = dead_letter_queue_name(self.queue_name)
+
+    def _open_channel(self):
+        connection = pika.BlockingConnection(pika.URLParameters(self.rabbitmq_url))
+        channel = connection.channel()
+        channel.queue_declare(queue=self.dead_letter_queue, durable=True)
+        return connection, channel
+
+    def inspect(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        List dead-lettered jobs without removing them
+
+        Args:
+            limit: Maximum number of jobs to return
+
+        Returns:
+            List of job payloads
+        """
+        connection, channel = self._open_channel()
+        jobs = []
+        try:
+            for _ in range(limit):
+                method, _, body = channel.basic_get(queue=self.dead_letter_queue)
+                if method is None:
+                    break
+                jobs.append(json.loads(body))
+            # Closing the channel without acking returns every message to the queue
+        finally:
+            connection.close()
+        return jobs
+
+    def replay(self, limit: Optional[int] = None, job_ids: Optional[List[str]] = None) -> int:
+        """
+        Move dead-lettered jobs back to the processing queue
+
+        Args:
+            limit: Maximum number of jobs to replay (all if None)
+            job_ids: Only replay these jobs (all if None)
+
+        Returns:
+            Number of jobs replayed
+        """
+        connection, channel = self._open_channel()
+        channel.confirm_delivery()
+        replayed = 0
+        try:
+            while limit is None or replayed < limit:
+                method, _, body = channel.basic_get(queue=self.dead_letter_queue)
+                if method is None:
+                    break
+
+                data = json.loads(body)
+                if job_ids is not None and data.get('jobId') not in job_ids:
+                    # Leave other jobs in place; they are requeued when the channel closes
+                    continue
+
+                # Start over with a fresh retry budget; the stored conversion
+                # was deleted with the job's document
+                data.pop('failure', None)
+                data.pop('resumeFrom', None)
+                data['retries'] = 0
+                channel.basic_publish(
+                    exchange='',
+                    routing_key=self.queue_name,
+                    body=json.dumps(data),
+                    properties=pika.BasicProperties(delivery_mode=2)
+                )
+                channel.basic_ack(delivery_tag=method.delivery_tag)
+                replayed += 1
+        finally:
+            connection.close()
+
+        logger.info(f"Replayed {replayed} jobs from {self.dead_letter_queue}")
+        return replayed
+
+
+def main():
+    """Command line entry point: python -m scheduling.dead_letters {list,replay}"""
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Inspect and replay dead-lettered ingestion jobs")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    list_parser = subparsers.add_parser('list', help="List dead-lettered jobs")
+    list_parser.add_argument('--limit', type=int, default=50)
+
+    replay_parser = subparsers.add_parser('replay', help="Send dead-lettered jobs back for processing")
+    replay_parser.add_argument('--limit', type=int, default=None)
+    replay_parser.add_argument('--job-id', action='append', dest='job_ids')
+
+    args = parser.parse_args()
+    dlq = DeadLetterQueue()
+
+    if args.command == 'list':
+        for job in dlq.inspect(args.limit):
+            failure = job.get('failure', {})
+            print(f"{job.get('jobId')}\t{failure.get('stage')}\t{failure.get('category')}\t{failure.get('error')}")
+    else:
+        count = dlq.replay(limit=args.limit, job_ids=args.job_ids)
+        print(f"Replayed {count} jobs")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+# processing-service/src/scheduling/job_cost.py
+import os
+import re
+import logging
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Matches page objects ("/Type /Page") but not the page tree ("/Type /Pages")
+PAGE_OBJECT_PATTERN = re.compile(rb'/Type\s*/Page(?![a-zA-Z])')
+
+# Rough size of one page when the page tree lives in compressed object streams
+# and can't be counted without decompressing the file
+AVERAGE_BYTES_PER_PAGE = 100 * 1024
+
+# Bytes read at a time while counting, and kept from the previous block so
+# a page marker split across two blocks is still matched
+SCAN_BLOCK_BYTES = 1024 * 1024
+SCAN_OVERLAP_BYTES = 64
+
+FAST_LANE = 'fast'
+SLOW_LANE = 'slow'
+
+
+class JobCostEstimator:
+    """
+    Estimates how expensive a document will be to process before docling runs
+
+    The estimate only reads the raw PDF bytes, so it costs a fraction of a
+    second even for large files and can be done by the router before the job
+    is handed to a worker lane.
+    """
+
+    def __init__(self):
+        """Load lane thresholds from the environment"""
+        self.fast_lane_max_pages = int(os.getenv('FAST_LANE_MAX_PAGES', '30'))
+        self.fast_lane_max_bytes = int(os.getenv('FAST_LANE_MAX_BYTES', str(5 * 1024 * 1024)))
+
+    def count_pages(self, file_path: str) -> Optional[int]:
+        """
+        Count the pages of a PDF by scanning for page objects
+
+        The file is read in blocks of SCAN_BLOCK_BYTES, so memory stays
+        bounded whatever its size.
+
+        Args:
+            file_path: Path to the PDF file
+
+        Returns:
+            Number of pages, or None if the page objects are not visible in
+            the raw bytes (e.g. packed into compressed object streams)
+        """
+        pages = 0
+        tail = b''
+        # Absolute offset of the first byte of `tail`, and the end of the last counted match
+        base = counted_until = 0
+        with open(file_path, 'rb') as f:
+            while True:
+                block = f.read(SCAN_BLOCK_BYTES)
+                buffer = tail + block
+                # Until the end of the file, a match ending on the last byte may
+                # still be "/Pages" once the next block is read
+                limit = base + len(buffer) - (1 if block else 0)
+                for match in PAGE_OBJECT_PATTERN.finditer(buffer):
+                    if counted_until < base + match.end() <= limit:
+                        pages += 1
+                counted_until = limit
+                if not block:
+                    break
+                tail = buffer[-SCAN_OVERLAP_BYTES:]
+                base += len(buffer) - len(tail)
+        return pages or None
+
+    def estimate(self, file_path: str) -> Dict[str, Any]:
+        """
+        Estimate the cost of processing a document and pick its lane
+
+        Args:
+            file_path: Path to the PDF file
+
+        Returns:
+            Dict with pages, size_bytes, whether the page count was estimated
+            from the file size, and the lane the job should run in
+        """
+        size_bytes = 0
+        pages = None
+
+        try:
+            size_bytes = os.path.getsize(file_path)
+            # Too large for the fast lane whatever its page count; don't read it
+            if size_bytes <= self.fast_lane_max_bytes:
+                pages = self.count_pages(file_path)
+        except OSError as e:
+            # A missing file will fail in the worker anyway; send it to the
+            # fast lane so the failure is reported quickly
+            logger.warning(f"Could not inspect {file_path} for cost estimation: {e}")
+
+        estimated = pages is None
+        if estimated:
+            pages = max(1, size_bytes // AVERAGE_BYTES_PER_PAGE)
+
+        if pages <= self.fast_lane_max_pages and size_bytes <= self.fast_lane_max_bytes:
+            lane = FAST_LANE
+        else:
+            lane = SLOW_LANE
+
+        return {
+            'pages': pages,
+            'size_bytes': size_bytes,
+            'pages_estimated': estimated,
+            'lane': lane
+        }
@@ -0,0 +1,98 @@
+# processing-service/src/scheduling/retry_policy.py
+import os
+import random
+import psycopg2
+from psycopg2 import pool
+import openai
+
+from process_pipeline.errors import PipelineStageError
+from embeddings.providers import EmbeddingRateLimitError, EmbeddingTransientError
+
+TRANSIENT = 'transient'
+PERMANENT = 'permanent'
+
+# Errors caused by a dependency being briefly unavailable or throttling us;
+# retrying them later is expected to succeed
+TRANSIENT_ERRORS = (
+    openai.RateLimitError,
+    EmbeddingRateLimitError,
+    EmbeddingTransientError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+    psycopg2.OperationalError,
+    psycopg2.InterfaceError,
+    pool.PoolError,
+    ConnectionError,
+    TimeoutError,
+)
+
+# Errors that will fail the same way on every attempt
+PERMANENT_ERRORS = (
+    FileNotFoundError,
+    IsADirectoryError,
+    ValueError,
+    openai.BadRequestError,
+    openai.AuthenticationError,
+    psycopg2.DataError,
+    psycopg2.IntegrityError,
+    psycopg2.ProgrammingError,
+)
+
+
+def classify_error(error: Exception) -> str:
+    """
+    Classify a job failure as transient or permanent
+
+    Unknown errors are treated as transient so they keep the previous
+    behaviour of being retried.
+
+    Args:
+        error: The exception raised while processing the job
+
+    Returns:
+        TRANSIENT or PERMANENT
+    """
+    if isinstance(error, PipelineStageError):
+        error = error.cause
+
+    if isinstance(error, TRANSIENT_ERRORS):
+        return TRANSIENT
+    if isinstance(error, PERMANENT_ERRORS):
+        return PERMANENT
+    return TRANSIENT
+
+
+class RetryPolicy:
+    """Exponential backoff with jitter for failed ingestion jobs"""
+
+    def __init__(self):
+        """Load retry settings from the environment"""
+        self.max_retries = int(os.getenv('JOB_MAX_RETRIES', '3'))
+        self.base_delay_ms = int(os.getenv('JOB_RETRY_BASE_DELAY_MS', '10000'))
+        self.max_delay_ms = int(os.getenv('JOB_RETRY_MAX_DELAY_MS', '300000'))
+        self.jitter = float(os.getenv('JOB_RETRY_JITTER', '0.2'))
+
+    def should_retry(self, error: Exception, retries: int) -> bool:
+        """
+        Decide whether a failed job gets another attempt
+
+        Args:
+            error: The exception raised while processing the job
+            retries: Number of retries the job has already had
+        """
+        return retries < self.max_retries and classify_error(error) == TRANSIENT
+
+    def delay_ms(self, retries: int) -> int:
+        """
+        Delay before the next attempt
+
+        Args:
+            retries: Number of retries the job has already had
+
+        Returns:
+            Delay in milliseconds: base * 2^retries, capped, with +/- jitter
+        """
+        delay = min(self.base_delay_ms * (2 ** retries), self.max_delay_ms)
+        spread = delay * self.jitter
+        return max(0, int(delay + random.uniform(-spread, spread)))
@@ -0,0 +1,176 @@
+# processing-service/src/storage/collections.py
+import os
+import logging
+from typing import Dict, Any, List, Optional
+
+from storage.db_manager import DatabaseManager
+from storage.notifications import notify_chunks_changed
+
+logger = logging.getLogger(__name__)
+
+# Documents uploaded without a collection belong to the default one
+DEFAULT_COLLECTION_ID = 1
+
+INDEX_TYPES = ('hnsw', 'ivfflat', 'none')
+
+# Whether a partition is still attached to chunks, and if so whether a
+# concurrent detach of it was interrupted (no row: already detached)
+DETACH_STATE_SQL = """
+SELECT i.inhdetachpending
+FROM pg_inherits i
+WHERE i.inhrelid = to_regclass(%s) AND i.inhparent = 'chunks'::regclass
+"""
+
+
+def partition_name(collection_id: int) -> str:
+    """Name of the chunks partition of a collection"""
+    return f"chunks_c{int(collection_id)}"
+
+
+def vector_index_name(collection_id: int) -> str:
+    """Name of the vector index on a collection's chunks partition"""
+    return f"{partition_name(collection_id)}_embedding_idx"
+
+
+class CollectionStore:
+    """
+    Manages collections and their chunk partitions
+
+    Every collection gets its own partition of the chunks table with its own
+    vector index, so searches scoped to a collection only read that index and
+    dropping a collection removes its chunks without a row-by-row delete.
+    """
+
+    def __init__(self, db_manager: DatabaseManager):
+        """
+        Args:
+            db_manager: Database connection manager
+        """
+        self.db_manager = db_manager
+        # hnsw needs no training data, so it suits partitions that start empty
+        self.default_index_type = os.getenv('COLLECTION_INDEX_TYPE', 'hnsw')
+
+    def _index_sql(self, collection_id: int, index_type: str) -> Optional[str]:
+        if index_type == 'hnsw':
+            return (f"CREATE INDEX {vector_index_name(collection_id)} ON {partition_name(collection_id)} "
+                    f"USING hnsw (embedding vector_cosine_ops)")
+        if index_type == 'ivfflat':
+            return (f"CREATE INDEX {vector_index_name(collection_id)} ON {partition_name(collection_id)} "
+                    f"USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100)")
+        return None
+
+    def create(self, name: str, index_type: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Create a collection with its chunks partition and vector index
+
+        Args:
+            name: Unique collection name
+            index_type: hnsw, ivfflat or none (defaults to COLLECTION_INDEX_TYPE)
+
+        Returns:
+            The collection record
+        """
+        index_type = index_type or self.default_index_type
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type {index_type}, expected one of {INDEX_TYPES}")
+
+        conn = self.db_manager.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "INSERT INTO collections (name, index_type) VALUES (%s, %s) RETURNING id, name, index_type, created_at",
+                    (name, index_type)
+                )
+                collection_id, name, index_type, created_at = cur.fetchone()
+                cur.execute(
+                    f"CREATE TABLE {partition_name(collection_id)} PARTITION OF chunks "
+                    f"FOR VALUES IN ({int(collection_id)})"
+                )
+                index_sql = self._index_sql(collection_id, index_type)
+                if index_sql:
+                    cur.execute(index_sql)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error creating collection {name}: {e}", exc_info=True)
+            raise
+        finally:
+            self.db_manager.return_connection(conn)
+
+        logger.info(f"Created collection {name} ({collection_id}) with a {index_type} index")
+        return {'id': collection_id, 'name': name, 'index_type': index_type, 'created_at': created_at}
+
+    def get(self, collection_id: int) -> Optional[Dict[str, Any]]:
+        """Get a collection record, or None if it doesn't exist"""
+        sql = "SELECT id, name, index_type, created_at FROM collections WHERE id = %s"
+        return self.db_manager.execute_query(sql, (collection_id,), fetch_one=True, dict_cursor=True)
+
+    def list(self) -> List[Dict[str, Any]]:
+        """All collections with their document counts"""
+        sql = """
+        SELECT c.id, c.name, c.index_type, c.created_at, count(d.id) AS documents
+        FROM collections c LEFT JOIN documents d ON d.collection_id = c.id
+        GROUP BY c.id
+        ORDER BY c.id
+        """
+        return self.db_manager.execute_query(sql, dict_cursor=True)
+
+    def delete(self, collection_id: int) -> bool:
+        """
+        Delete a collection with all its documents and chunks
+
+        The chunks partition is first detached concurrently, which doesn't
+        block searches of other collections, then dropped as a whole, which
+        is instant and leaves no dead tuples behind. Dropping it while still
+        attached would lock the whole chunks table until the documents are
+        deleted. Needs PostgreSQL 14 or later.
+
+        Returns:
+            False if the collection doesn't exist
+        """
+        if collection_id == DEFAULT_COLLECTION_ID:
+            raise ValueError("The default collection can't be deleted")
+
+        partition = partition_name(collection_id)
+        conn = self.db_manager.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1 FROM collections WHERE id = %s", (collection_id,))
+                if cur.fetchone() is None:
+                    conn.rollback()
+                    return False
+                cur.execute(DETACH_STATE_SQL, (partition,))
+                attached = cur.fetchone()
+            conn.commit()
+
+            if attached is not None:
+                # DETACH ... CONCURRENTLY can't run inside a transaction; a
+                # detach interrupted earlier is left pending and only needs finalizing
+                conn.autocommit = True
+                try:
+                    with conn.cursor() as cur:
+                        mode = 'FINALIZE' if attached[0] else 'CONCURRENTLY'
+                        cur.execute(f"ALTER TABLE chunks DETACH PARTITION {partition} {mode}")
+                finally:
+                    conn.autocommit = False
+
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1 FROM collections WHERE id = %s FOR UPDATE", (collection_id,))
+                if cur.fetchone() is None:
+                    conn.rollback()
+                    return False
+                # Detached: dropping it no longer locks the chunks table
+                cur.execute(f"DROP TABLE IF EXISTS {partition}")
+                cur.execute("DELETE FROM documents WHERE collection_id = %s", (collection_id,))
+                cur.execute("DELETE FROM collections WHERE id = %s", (collection_id,))
+                notify_chunks_changed(cur, collection_id)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error deleting collection {collection_id}: {e}", exc_info=True)
+            raise
+        finally:
+            self.db_manager.return_connection(conn)
+
+        logger.info(f"Deleted collection {collection_id}")
+        return True
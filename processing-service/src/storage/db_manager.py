@@ -1,12 +1,37 @@
 # processing-service/src/storage/db.py
 import os
+import re
+import time
+import uuid
 import logging
-from typing import Dict, Any, Optional
-from psycopg2 import pool
+import threading
+import itertools
+from collections import deque
+from typing import Dict, Any, Optional, Iterator
+import psycopg2
+from psycopg2 import pool, errors
+from psycopg2.extensions import connection as PGConnection
 from psycopg2.extras import RealDictCursor
 
+from monitoring.metrics import DB_POOL_WAIT_SECONDS, record_pool_state, record_pool_timeout
+
 logger = logging.getLogger(__name__)
 
+PREPARED_NAME_PATTERN = re.compile(r'^[a-z_][a-z0-9_]*$')
+
+
+class PoolTimeoutError(pool.PoolError):
+    """Raised when no connection becomes available before the checkout timeout"""
+
+
+class PreparingConnection(PGConnection):
+    """Connection that remembers which statements are prepared in its session"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements = set()
+
+
 class DatabaseManager:
     """
     Database connection manager with connection pooling
@@ -41,6 +66,24 @@ class DatabaseManager:
         min_connections = int(os.getenv('DB_MIN_CONNECTIONS', '1'))
         max_connections = int(os.getenv('DB_MAX_CONNECTIONS', '10'))
         
+        # Callers queue for a connection (first come, first served) instead
+        # of failing as soon as the pool is exhausted
+        self.checkout_timeout = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+        self._pool_condition = threading.Condition()
+        self._waiters = deque()
+        # Connections checked out (or being opened for a caller) and open in the pool
+        self._in_use = 0
+        self._idle = 0
+        self.max_connections = max_connections
+        self._tickets = itertools.count()
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0
+        }
+        
         self.pool = None
         self._create_pool(min_connections, max_connections)
         
@@ -56,8 +99,13 @@ class DatabaseManager:
             self.pool = pool.ThreadedConnectionPool(
                 min_conn,
                 max_conn,
+                connection_factory=PreparingConnection,
                 **self.db_params
             )
+            # The pool opens min_conn connections up front
+            self._in_use = 0
+            self._idle = min_conn
+            self.max_connections = max_conn
             
             logger.info("Database connection pool created successfully")
         except Exception as e:
@@ -104,25 +152,119 @@ class DatabaseManager:
             if conn:
                 self.return_connection(conn)
     
-    def get_connection(self):
-        """Get a connection from the pool"""
+    def get_connection(self, timeout: Optional[float] = None):
+        """
+        Get a connection from the pool, waiting for one if it is exhausted
+        
+        Waiters are served in arrival order so a steady stream of short
+        queries can't starve a caller that has been waiting longer.
+        
+        Args:
+            timeout: Seconds to wait for a connection (defaults to DB_POOL_TIMEOUT)
+            
+        Raises:
+            PoolTimeoutError: If no connection became available in time
+        """
         if not self.pool:
             self._create_pool(1, 10)
         
+        timeout = self.checkout_timeout if timeout is None else timeout
+        start_time = time.perf_counter()
+        deadline = start_time + timeout
+        waited = False
+        
+        with self._pool_condition:
+            ticket = next(self._tickets)
+            self._waiters.append(ticket)
+            try:
+                while self._waiters[0] != ticket or self._in_use >= self.max_connections:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        record_pool_timeout()
+                        logger.error(f"Timed out waiting for a database connection")
+                        raise PoolTimeoutError(
+                            f"No database connection available after {timeout:.1f}s "
+                            f"({self._in_use}/{self.max_connections} in use)"
+                        )
+                    if not waited:
+                        waited = True
+                        # Queued behind others or the pool is exhausted
+                        self._publish_pool_state()
+                    self._pool_condition.wait(remaining)
+                
+                # Reserve the connection; it is taken from the pool, or opened,
+                # without holding the lock
+                self._in_use += 1
+                self._idle = max(0, self._idle - 1)
+            finally:
+                self._waiters.remove(ticket)
+                self._publish_pool_state()
+                # Let the next waiter re-check whether it is now at the head
+                self._pool_condition.notify_all()
+        
         try:
-            return self.pool.getconn()
+            conn = self.pool.getconn()
         except Exception as e:
             logger.error(f"Error getting connection from pool: {e}", exc_info=True)
+            with self._pool_condition:
+                self._in_use -= 1
+                self._publish_pool_state()
+                self._pool_condition.notify_all()
             raise
+        
+        wait_seconds = time.perf_counter() - start_time
+        with self._pool_condition:
+            self._stats['checkouts'] += 1
+            if waited:
+                self._stats['waits'] += 1
+            self._stats['wait_seconds_total'] += wait_seconds
+            self._stats['wait_seconds_max'] = max(self._stats['wait_seconds_max'], wait_seconds)
+        
+        DB_POOL_WAIT_SECONDS.observe(wait_seconds)
+        return conn
     
     def return_connection(self, conn):
         """Return a connection to the pool"""
         if self.pool:
-            self.pool.putconn(conn)
+            try:
+                self.pool.putconn(conn)
+            finally:
+                with self._pool_condition:
+                    self._in_use -= 1
+                    # The pool closes connections above its minimum (and broken ones)
+                    if not conn.closed:
+                        self._idle += 1
+                    self._publish_pool_state()
+                    self._pool_condition.notify_all()
+    
+    def _publish_pool_state(self) -> None:
+        """Update the pool gauges of multi-worker metrics (call with _pool_condition held)"""
+        record_pool_state(self._in_use, self._idle, self.max_connections, len(self._waiters))
+    
+    def pool_stats(self) -> Dict[str, Any]:
+        """
+        Current pool utilization and checkout statistics
+        
+        Returns:
+            Dict with in_use, idle, max and waiting connection counts plus
+            cumulative checkout, wait and timeout counters
+        """
+        if not self.pool:
+            return {'in_use': 0, 'idle': 0, 'max': 0, 'waiting': 0, **self._stats}
+        with self._pool_condition:
+            return {
+                'in_use': self._in_use,
+                'idle': self._idle,
+                'max': self.max_connections,
+                'waiting': len(self._waiters),
+                **self._stats
+            }
     
     def execute_query(self, query: str, params: tuple = None, 
                       fetch_one: bool = False, 
-                      dict_cursor: bool = False) -> Any:
+                      dict_cursor: bool = False,
+                      fetch: Optional[bool] = None) -> Any:
         """
         Execute a query and return results
         
@@ -131,9 +273,11 @@ class DatabaseManager:
             params: Query parameters
             fetch_one: Whether to fetch one result or all results
             dict_cursor: Whether to use a dictionary cursor
+            fetch: Whether to fetch rows; by default rows are fetched whenever
+                the statement returns any (SELECT, INSERT ... RETURNING, ...)
             
         Returns:
-            Query results
+            Query results, or the affected row count for statements without rows
         """
         conn = None
         try:
@@ -142,15 +286,9 @@ class DatabaseManager:
             cursor_factory = RealDictCursor if dict_cursor else None
             with conn.cursor(cursor_factory=cursor_factory) as cur:
                 cur.execute(query, params)
-                
-                if query.strip().upper().startswith(('SELECT', 'WITH')):
-                    if fetch_one:
-                        return cur.fetchone()
-                    else:
-                        return cur.fetchall()
-                else:
-                    conn.commit()
-                    return cur.rowcount
+                result = self._fetch(cur, fetch_one, fetch)
+                conn.commit()
+                return result
                     
         except Exception as e:
             if conn:
@@ -161,6 +299,121 @@ class DatabaseManager:
             if conn:
                 self.return_connection(conn)
     
+    def execute_prepared(self, name: str, query: str, params: tuple = (),
+                         fetch_one: bool = False,
+                         dict_cursor: bool = False,
+                         fetch: Optional[bool] = None) -> Any:
+        """
+        Execute a hot statement through a per-connection prepared statement
+        
+        The statement is parsed and planned once per pooled connection and
+        then only executed, which saves the parse/plan time on every call.
+        
+        Args:
+            name: Statement name, unique per distinct query text
+            query: SQL using $1, $2, ... placeholders
+            params: Query parameters
+            fetch_one: Whether to fetch one result or all results
+            dict_cursor: Whether to use a dictionary cursor
+            fetch: Whether to fetch rows (defaults to whether the statement returns any)
+            
+        Returns:
+            Query results, or the affected row count for statements without rows
+        """
+        if not PREPARED_NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid prepared statement name: {name}")
+        
+        params = tuple(params or ())
+        placeholders = ', '.join(['%s'] * len(params))
+        execute_sql = f"EXECUTE {name} ({placeholders})" if params else f"EXECUTE {name}"
+        
+        conn = None
+        try:
+            conn = self.get_connection()
+            cursor_factory = RealDictCursor if dict_cursor else None
+            
+            for attempt in range(2):
+                try:
+                    with conn.cursor(cursor_factory=cursor_factory) as cur:
+                        if name not in conn.prepared_statements:
+                            cur.execute(f"PREPARE {name} AS {query}")
+                            conn.prepared_statements.add(name)
+                        cur.execute(execute_sql, params)
+                        result = self._fetch(cur, fetch_one, fetch)
+                    conn.commit()
+                    return result
+                except (errors.DuplicatePreparedStatement, errors.InvalidSqlStatementName):
+                    # Our bookkeeping disagrees with the session (e.g. the
+                    # statement was deallocated); resync and try once more
+                    conn.rollback()
+                    if attempt:
+                        raise
+                    conn.prepared_statements.clear()
+                    with conn.cursor() as cur:
+                        cur.execute("DEALLOCATE ALL")
+                    conn.commit()
+                    
+        except Exception as e:
+            if conn:
+                conn.rollback()
+            logger.error(f"Error executing prepared statement {name}: {e}", exc_info=True)
+            raise
+        finally:
+            if conn:
+                self.return_connection(conn)
+    
+    def stream_query(self, query: str, params: tuple = None,
+                     dict_cursor: bool = False,
+                     itersize: int = 1000,
+                     settings: Optional[Dict[str, str]] = None) -> Iterator[Any]:
+        """
+        Stream the rows of a large read through a server-side cursor
+        
+        Rows are fetched from the server in batches of `itersize`, so the
+        full result set is never held in memory. The connection stays
+        checked out until the iterator is exhausted or closed.
+        
+        Args:
+            query: SQL query string
+            params: Query parameters
+            dict_cursor: Whether to use a dictionary cursor
+            itersize: Rows fetched per round trip
+            settings: Configuration parameters set for this query's transaction only
+            
+        Yields:
+            Result rows
+        """
+        conn = self.get_connection()
+        try:
+            if settings:
+                with conn.cursor() as cur:
+                    for name, value in settings.items():
+                        cur.execute("SELECT set_config(%s, %s, true)", (name, value))
+            cursor_factory = RealDictCursor if dict_cursor else None
+            with conn.cursor(name=f"stream_{uuid.uuid4().hex}", cursor_factory=cursor_factory) as cur:
+                cur.itersize = itersize
+                cur.execute(query, params)
+                for row in cur:
+                    yield row
+            conn.commit()
+        except GeneratorExit:
+            conn.rollback()
+            raise
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error streaming query: {e}", exc_info=True)
+            raise
+        finally:
+            self.return_connection(conn)
+    
+    def _fetch(self, cur, fetch_one: bool, fetch: Optional[bool]) -> Any:
+        """Fetch the results of an executed statement"""
+        if fetch is None:
+            fetch = cur.description is not None
+        if not fetch:
+            return cur.rowcount
+        return cur.fetchone() if fetch_one else cur.fetchall()
+    
     def close(self):
         """Close the connection pool"""
         if self.pool:
@@ -0,0 +1,218 @@
+# processing-service/src/storage/document_store.py
+import os
+import json
+import time
+import zlib
+import logging
+from typing import Dict, Any, Optional
+import psycopg2
+from docling_core.types.doc import DoclingDocument
+
+from storage.db_manager import DatabaseManager
+from storage.collections import DEFAULT_COLLECTION_ID
+from storage.notifications import NOTIFY_SQL, CHUNKS_CHANGED_CHANNEL, chunks_changed_payload
+
+logger = logging.getLogger(__name__)
+
+# Bump when the stored payload layout changes; readers can then convert or
+# ignore older rows instead of failing on them
+FORMAT_VERSION = 1
+ENCODING = 'zlib+json'
+
+
+class DocumentStore:
+    """
+    Persists the docling conversion of each document once, compressed
+
+    The pipeline only passes document ids around; the converted document is
+    loaded on demand (for re-chunking, retries or the API) without running
+    docling again.
+    """
+
+    def __init__(self, db_manager: DatabaseManager):
+        """
+        Args:
+            db_manager: Database connection manager
+        """
+        self.db_manager = db_manager
+        self.compression_level = 6
+
+    def get_or_create_document(self, job_id: str, filename: Optional[str],
+                               collection_id: Optional[int] = None) -> int:
+        """
+        Get the document record of a job, creating it on the first attempt
+
+        Args:
+            job_id: ID of the ingestion job
+            filename: The filename of the document
+            collection_id: Collection of the document (defaults to the default
+                collection); a retried job keeps the collection it started in
+
+        Returns:
+            The document ID
+        """
+        sql = """
+        INSERT INTO documents (job_id, filename, collection_id) VALUES ($1, $2, $3)
+        ON CONFLICT (job_id) DO UPDATE SET filename = COALESCE(EXCLUDED.filename, documents.filename)
+        RETURNING id
+        """
+        result = self.db_manager.execute_prepared(
+            'upsert_job_document', sql,
+            (job_id, filename, collection_id or DEFAULT_COLLECTION_ID), fetch_one=True
+        )
+        return result[0]
+
+    def find_document_id(self, job_id: str) -> Optional[int]:
+        """
+        Look up the document created by a job
+
+        Returns:
+            The document ID, or None if the job created no document
+        """
+        sql = "SELECT id FROM documents WHERE job_id = $1"
+        result = self.db_manager.execute_prepared('find_job_document', sql, (job_id,), fetch_one=True)
+        return result[0] if result else None
+
+    def find_previous_version(self, document_id: int) -> Optional[int]:
+        """
+        Look up the latest other document with the same filename in the same collection
+
+        Used when a job doesn't name the job of the previous version: a file
+        uploaded again under the same name is taken as a revision of it.
+
+        Returns:
+            The document ID, or None if there is no earlier upload of the file
+        """
+        sql = """
+        SELECT p.id FROM documents d
+        JOIN documents p ON p.filename = d.filename AND p.collection_id = d.collection_id AND p.id < d.id
+        WHERE d.id = $1
+        ORDER BY p.id DESC
+        LIMIT 1
+        """
+        result = self.db_manager.execute_prepared('find_previous_version', sql, (document_id,), fetch_one=True)
+        return result[0] if result else None
+
+    def delete(self, document_id: int, batch_size: Optional[int] = None) -> Optional[Dict[str, int]]:
+        """
+        Delete a document, its chunks and its stored conversion
+
+        Chunks are deleted in small batches, each in its own transaction, so
+        no lock is held for long and other writers and vacuum can interleave.
+        The document row goes last; its conversion is removed by cascade.
+
+        Args:
+            document_id: ID of the document record
+            batch_size: Chunks deleted per transaction (defaults to DELETE_BATCH_SIZE)
+
+        Returns:
+            Dict with the number of chunks deleted, or None if the document doesn't exist
+        """
+        batch_size = batch_size or int(os.getenv('DELETE_BATCH_SIZE', '1000'))
+        pause = float(os.getenv('DELETE_BATCH_PAUSE_MS', '0')) / 1000
+
+        document = self.db_manager.execute_query(
+            "SELECT collection_id FROM documents WHERE id = %s", (document_id,), fetch_one=True
+        )
+        if document is None:
+            return None
+
+        # The collection filter limits the delete to the document's partition
+        sql = """
+        DELETE FROM chunks
+        WHERE collection_id = $3
+          AND id IN (SELECT id FROM chunks WHERE collection_id = $3 AND document_id = $1 LIMIT $2)
+        """
+        # Searches cached before and during the batched delete are both stale
+        notify_params = (CHUNKS_CHANGED_CHANNEL, chunks_changed_payload(document[0], document_id))
+        self.db_manager.execute_query(NOTIFY_SQL, notify_params)
+        chunks_deleted = 0
+        while True:
+            deleted = self.db_manager.execute_prepared(
+                'delete_document_chunks', sql, (document_id, batch_size, document[0])
+            )
+            chunks_deleted += deleted
+            if deleted < batch_size:
+                break
+            if pause:
+                time.sleep(pause)
+
+        self.db_manager.execute_query("DELETE FROM documents WHERE id = %s", (document_id,))
+        self.db_manager.execute_query(NOTIFY_SQL, notify_params)
+        logger.info(f"Deleted document {document_id} and {chunks_deleted} chunks")
+        return {'document_id': document_id, 'chunks_deleted': chunks_deleted}
+
+    def save(self, document_id: int, document_dict: Dict[str, Any]) -> int:
+        """
+        Store the converted document, replacing any earlier conversion
+
+        Args:
+            document_id: ID of the document record
+            document_dict: Output of DoclingDocument.export_to_dict()
+
+        Returns:
+            Size of the stored payload in bytes
+        """
+        raw = json.dumps(document_dict, separators=(',', ':')).encode('utf-8')
+        payload = zlib.compress(raw, self.compression_level)
+
+        sql = """
+        INSERT INTO document_conversions
+            (document_id, format_version, docling_version, encoding, payload, raw_size, stored_size)
+        VALUES ($1, $2, $3, $4, $5, $6, $7)
+        ON CONFLICT (document_id) DO UPDATE SET
+            format_version = EXCLUDED.format_version,
+            docling_version = EXCLUDED.docling_version,
+            encoding = EXCLUDED.encoding,
+            payload = EXCLUDED.payload,
+            raw_size = EXCLUDED.raw_size,
+            stored_size = EXCLUDED.stored_size,
+            created_at = CURRENT_TIMESTAMP
+        """
+        self.db_manager.execute_prepared(
+            'save_document_conversion', sql,
+            (document_id, FORMAT_VERSION, document_dict.get('version'), ENCODING,
+             psycopg2.Binary(payload), len(raw), len(payload))
+        )
+        logger.info(f"Stored conversion of document {document_id} "
+                    f"({len(raw)} bytes -> {len(payload)} bytes)")
+        return len(payload)
+
+    def load_json(self, document_id: int) -> Optional[bytes]:
+        """
+        Load the converted document as JSON bytes without parsing it
+
+        Returns:
+            The JSON payload, or None if no conversion is stored
+        """
+        sql = """
+        SELECT format_version, encoding, payload
+        FROM document_conversions
+        WHERE document_id = $1
+        """
+        row = self.db_manager.execute_prepared('load_document_conversion', sql, (document_id,), fetch_one=True)
+        if row is None:
+            return None
+
+        format_version, encoding, payload = row
+        if format_version != FORMAT_VERSION or encoding != ENCODING:
+            logger.warning(f"Ignoring conversion of document {document_id} with unsupported "
+                           f"format {format_version}/{encoding}")
+            return None
+        return zlib.decompress(bytes(payload))
+
+    def load(self, document_id: int) -> Optional[DoclingDocument]:
+        """
+        Load the converted document
+
+        Returns:
+            The DoclingDocument, or None if no usable conversion is stored
+        """
+        raw = self.load_json(document_id)
+        if raw is None:
+            return None
+        try:
+            return DoclingDocument.model_validate_json(raw)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable conversion of document {document_id}: {e}")
+            return None
@@ -0,0 +1,223 @@
+# processing-service/src/storage/maintenance.py
+"""
+Table and vector index maintenance
+
+Chunks are deleted and rewritten by deletions, re-ingestion and migrations,
+which leaves dead tuples behind and moves the embedding distribution away
+from the ivfflat centroids trained when the index was built (recall drops
+at the same probes). The scheduler periodically reads pg_stat_user_tables
+and runs, only when a threshold is crossed:
+
+- VACUUM (ANALYZE) when dead tuples exceed a share of the live ones
+- ANALYZE when enough rows changed since the last analyze
+- REINDEX INDEX CONCURRENTLY on tracked indexes once the rows inserted,
+  updated or deleted since their last rebuild exceed a share of the table,
+  which retrains ivfflat centroids on the current data
+
+A session advisory lock makes sure only one process runs maintenance at a time.
+
+Usage (from processing-service/src):
+    python -m storage.maintenance status
+    python -m storage.maintenance run
+"""
+import os
+import json
+import time
+import argparse
+import logging
+import threading
+from typing import Dict, Any, List, Optional
+
+from dotenv import load_dotenv
+
+from storage.db_manager import DatabaseManager, get_db_manager
+from monitoring.metrics import DB_MAINTENANCE_OPERATIONS, DB_TABLE_DEAD_TUPLES, DB_INDEX_CHANGE_RATIO
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary application-wide key for pg_try_advisory_lock
+MAINTENANCE_LOCK_KEY = 72_040_038
+
+TABLE_STATS_SQL = """
+SELECT relname, n_live_tup, n_dead_tup, n_mod_since_analyze,
+       n_tup_ins + n_tup_upd + n_tup_del AS changes
+FROM pg_stat_user_tables
+WHERE relname LIKE ANY(%s)
+"""
+
+INDEX_TABLES_SQL = """
+SELECT indexrelname, relname
+FROM pg_stat_user_indexes
+WHERE indexrelname LIKE ANY(%s)
+"""
+
+
+class MaintenanceScheduler(threading.Thread):
+    """Runs VACUUM, ANALYZE and concurrent reindexing when thresholds are crossed"""
+
+    def __init__(self, db_manager: DatabaseManager, interval: Optional[float] = None):
+        """
+        Args:
+            db_manager: Database connection manager
+            interval: Seconds between checks (defaults to MAINTENANCE_INTERVAL_SECONDS)
+        """
+        super().__init__(name="maintenance-scheduler", daemon=True)
+        self.db_manager = db_manager
+        self.interval = interval if interval is not None else float(os.getenv('MAINTENANCE_INTERVAL_SECONDS', '600'))
+        # LIKE patterns; chunks are stored in one partition per collection
+        self.tables = os.getenv('MAINTENANCE_TABLES', 'chunks_c%,documents,document_conversions').split(',')
+        self.indexes = [name for name in os.getenv('MAINTENANCE_REINDEX_INDEXES', 'chunks_c%_embedding_idx').split(',') if name]
+        self.vacuum_dead_ratio = float(os.getenv('MAINTENANCE_VACUUM_DEAD_RATIO', '0.1'))
+        self.analyze_change_ratio = float(os.getenv('MAINTENANCE_ANALYZE_CHANGE_RATIO', '0.1'))
+        self.reindex_change_ratio = float(os.getenv('MAINTENANCE_REINDEX_CHANGE_RATIO', '0.3'))
+        # Small tables are left to autovacuum
+        self.min_rows = int(os.getenv('MAINTENANCE_MIN_ROWS', '1000'))
+        self.last_report: Optional[Dict[str, Any]] = None
+        self._stop_event = threading.Event()
+
+    def run(self):
+        logger.info(f"Maintenance scheduler started (every {self.interval:.0f}s)")
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"✗ Maintenance run failed: {e}", exc_info=True)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def _table_stats(self, cur) -> Dict[str, Dict[str, Any]]:
+        cur.execute(TABLE_STATS_SQL, (self.tables,))
+        columns = [column[0] for column in cur.description]
+        return {row[0]: dict(zip(columns, row)) for row in cur.fetchall()}
+
+    def _index_state(self, cur, table_stats: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Change ratio of each tracked index since its last rebuild"""
+        cur.execute(INDEX_TABLES_SQL, (self.indexes,))
+        index_tables = dict(cur.fetchall())
+        cur.execute(
+            "SELECT index_name, rows_at_rebuild, changes_at_rebuild FROM index_maintenance WHERE index_name = ANY(%s)",
+            (list(index_tables),)
+        )
+        baselines = {row[0]: row[1:] for row in cur.fetchall()}
+
+        state = []
+        for index_name, table in index_tables.items():
+            stats = table_stats.get(table)
+            if stats is None:
+                continue
+            baseline = baselines.get(index_name)
+            # No baseline yet, or statistics were reset: start counting from now
+            if baseline is None or stats['changes'] < baseline[1]:
+                self._record_rebuild(cur, index_name, stats)
+                baseline = (stats['n_live_tup'], stats['changes'])
+            changed = stats['changes'] - baseline[1]
+            state.append({
+                'index': index_name,
+                'table': table,
+                'changes_since_rebuild': changed,
+                'change_ratio': round(changed / max(baseline[0], self.min_rows), 4)
+            })
+        return state
+
+    def _record_rebuild(self, cur, index_name: str, stats: Dict[str, Any]) -> None:
+        cur.execute(
+            """
+            INSERT INTO index_maintenance (index_name, rows_at_rebuild, changes_at_rebuild, rebuilt_at)
+            VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
+            ON CONFLICT (index_name) DO UPDATE SET
+                rows_at_rebuild = EXCLUDED.rows_at_rebuild,
+                changes_at_rebuild = EXCLUDED.changes_at_rebuild,
+                rebuilt_at = EXCLUDED.rebuilt_at
+            """,
+            (index_name, stats['n_live_tup'], stats['changes'])
+        )
+
+    def _run_operation(self, cur, operation: str, target: str, sql: str, report: Dict[str, Any]) -> None:
+        logger.info(f"Running {sql}")
+        start = time.perf_counter()
+        cur.execute(sql)
+        seconds = round(time.perf_counter() - start, 3)
+        DB_MAINTENANCE_OPERATIONS.labels(operation=operation, target=target).inc()
+        report['operations'].append({'operation': operation, 'target': target, 'seconds': seconds})
+        logger.info(f"✓ {operation} {target} took {seconds}s")
+
+    def run_once(self, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Check the thresholds once and run whatever maintenance is due
+
+        Args:
+            dry_run: Only report what would run
+
+        Returns:
+            Report with table stats, index change ratios and operations run
+        """
+        report = {'timestamp': time.time(), 'tables': {}, 'indexes': [], 'operations': [], 'skipped': None}
+        conn = self.db_manager.get_connection()
+        try:
+            # VACUUM and REINDEX CONCURRENTLY can't run inside a transaction
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_try_advisory_lock(%s)", (MAINTENANCE_LOCK_KEY,))
+                if not cur.fetchone()[0]:
+                    report['skipped'] = 'another process is running maintenance'
+                    return report
+                try:
+                    table_stats = self._table_stats(cur)
+                    for table, stats in table_stats.items():
+                        DB_TABLE_DEAD_TUPLES.labels(table=table).set(stats['n_dead_tup'])
+                        live = max(stats['n_live_tup'], 1)
+                        report['tables'][table] = {
+                            'live_tuples': stats['n_live_tup'],
+                            'dead_tuples': stats['n_dead_tup'],
+                            'dead_ratio': round(stats['n_dead_tup'] / live, 4),
+                            'modified_since_analyze': stats['n_mod_since_analyze']
+                        }
+                        if dry_run:
+                            continue
+                        if (stats['n_dead_tup'] >= self.min_rows
+                                and stats['n_dead_tup'] / live >= self.vacuum_dead_ratio):
+                            self._run_operation(cur, 'vacuum', table, f"VACUUM (ANALYZE) {table}", report)
+                        elif (stats['n_mod_since_analyze'] >= self.min_rows
+                                and stats['n_mod_since_analyze'] / live >= self.analyze_change_ratio):
+                            self._run_operation(cur, 'analyze', table, f"ANALYZE {table}", report)
+
+                    for index in self._index_state(cur, table_stats):
+                        DB_INDEX_CHANGE_RATIO.labels(index=index['index']).set(index['change_ratio'])
+                        report['indexes'].append(index)
+                        if dry_run or index['change_ratio'] < self.reindex_change_ratio:
+                            continue
+                        self._run_operation(cur, 'reindex', index['index'],
+                                            f"REINDEX INDEX CONCURRENTLY {index['index']}", report)
+                        # Rebuilt on the current data: count changes from here
+                        self._record_rebuild(cur, index['index'], self._table_stats(cur)[index['table']])
+                finally:
+                    cur.execute("SELECT pg_advisory_unlock(%s)", (MAINTENANCE_LOCK_KEY,))
+        finally:
+            conn.autocommit = False
+            self.db_manager.return_connection(conn)
+
+        self.last_report = report
+        return report
+
+
+def main():
+    """Command line entry point"""
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Table and vector index maintenance")
+    parser.add_argument('command', choices=['status', 'run'],
+                        help="status: report thresholds only; run: also run what is due")
+    args = parser.parse_args()
+
+    db_manager = get_db_manager()
+    try:
+        report = MaintenanceScheduler(db_manager).run_once(dry_run=(args.command == 'status'))
+        print(json.dumps(report, indent=2, default=str))
+    finally:
+        db_manager.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+# processing-service/src/storage/notifications.py
+"""
+Change notifications for stored chunks
+
+Chunks are written by the queue consumer and the API runs the searches, so
+in-memory state derived from search results (the semantic query cache)
+can't see writes directly. Every transaction that changes chunks sends a
+Postgres NOTIFY on CHUNKS_CHANGED_CHANNEL naming the collection and
+document involved; notifications are delivered to listeners on commit, so
+they never arrive before the change is visible.
+"""
+import select
+import logging
+import threading
+from typing import Callable, Dict, Any, Optional, Tuple
+
+import psycopg2
+import psycopg2.extensions
+
+logger = logging.getLogger(__name__)
+
+CHUNKS_CHANGED_CHANNEL = 'chunks_changed'
+
+NOTIFY_SQL = "SELECT pg_notify(%s, %s)"
+
+
+def chunks_changed_payload(collection_id: int, document_id: Optional[int] = None) -> str:
+    """Payload naming a changed collection, and the document if only one changed"""
+    return f"{collection_id}:{document_id if document_id is not None else ''}"
+
+
+def parse_chunks_changed(payload: str) -> Tuple[int, Optional[int]]:
+    """Inverse of chunks_changed_payload"""
+    collection_id, document_id = payload.split(':', 1)
+    return int(collection_id), int(document_id) if document_id else None
+
+
+def notify_chunks_changed(cur, collection_id: int, document_id: Optional[int] = None) -> None:
+    """Queue a change notification in the cursor's transaction"""
+    cur.execute(NOTIFY_SQL, (CHUNKS_CHANGED_CHANNEL, chunks_changed_payload(collection_id, document_id)))
+
+
+class ChangeListener(threading.Thread):
+    """LISTENs on a channel on its own connection and hands payloads to a callback"""
+
+    def __init__(self, db_params: Dict[str, Any], channel: str, callback: Callable[[Optional[str]], None],
+                 reconnect_delay: float = 5.0):
+        """
+        Args:
+            db_params: psycopg2 connection parameters
+            channel: Channel to listen on
+            callback: Called with each payload, or with None after a reconnect
+                (notifications sent while disconnected are lost)
+            reconnect_delay: Seconds to wait before reconnecting after an error
+        """
+        super().__init__(name=f"listen-{channel}", daemon=True)
+        self.db_params = db_params
+        self.channel = channel
+        self.callback = callback
+        self.reconnect_delay = reconnect_delay
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(**self.db_params)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {self.channel}")
+                logger.info(f"✓ Listening for {self.channel} notifications")
+                # Anything may have changed while we weren't listening
+                self.callback(None)
+                while not self._stop_event.is_set():
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self.callback(conn.notifies.pop(0).payload)
+            except Exception as e:
+                logger.error(f"✗ {self.channel} listener failed: {e}")
+                self._stop_event.wait(self.reconnect_delay)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def stop(self) -> None:
+        self._stop_event.set()
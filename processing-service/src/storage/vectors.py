@@ -0,0 +1,49 @@
+# processing-service/src/storage/vectors.py
+from typing import Sequence
+
+import numpy as np
+
+# Stops at the first matching row; only a corpus without any chunk of the
+# model is scanned in full, once at startup
+MODEL_CHUNKS_SQL = """
+SELECT EXISTS (SELECT 1 FROM chunks WHERE embedding_model = %(model)s),
+       (SELECT embedding_model FROM chunks WHERE embedding_model <> %(model)s LIMIT 1)
+"""
+
+
+def to_vector_literal(values: Sequence[float]) -> str:
+    """
+    Format an embedding as a pgvector text literal ('[0.1,0.2,...]')
+
+    The literal is passed as a plain text parameter and cast with ::vector,
+    which works for ad-hoc queries and prepared statements alike.
+    """
+    if isinstance(values, np.ndarray):
+        # One C-level conversion instead of a float() call per element
+        return '[' + ','.join(map(repr, values.tolist())) + ']'
+    return '[' + ','.join(repr(float(v)) for v in values) + ']'
+
+
+def check_corpus_model(db_manager, model: str) -> None:
+    """
+    Refuse to ingest or search with a model the stored chunks weren't embedded with
+
+    Vectors of different models (or zero-padded ones of a smaller model) are
+    not comparable. A corpus holding chunks of both models, as during a
+    migration, is accepted; switching models on a corpus without any chunk
+    of the new one is not, until a migration has re-embedded it.
+
+    Args:
+        db_manager: Database connection manager
+        model: Embedding model of the configured provider
+
+    Raises:
+        ValueError: If chunks exist and none of them was embedded by `model`
+    """
+    has_model, other_model = db_manager.execute_query(MODEL_CHUNKS_SQL, {'model': model}, fetch_one=True)
+    if not has_model and other_model is not None:
+        raise ValueError(
+            f"Stored chunks were embedded with {other_model}, not with the configured model {model}; "
+            f"re-embed them first (python -m process_pipeline.migration start --name <name>) "
+            f"or switch EMBEDDING_PROVIDER / EMBEDDING_MODEL back"
+        )
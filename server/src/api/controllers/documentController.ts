@@ -47,11 +47,24 @@ export const handleUpload = async (req: Request, res: Response) => {
     console.log(`Original name: ${req.file?.originalname}`);
     console.log(`Job ID: ${jobId}`);
 
+    // Optional form fields: the job of the version this file replaces (its
+    // unchanged chunks are reused; without it, the processing service looks
+    // for an earlier upload with the same name) and the target collection
+    const previousJobId = typeof req.body.previousJobId === 'string' && req.body.previousJobId
+      ? req.body.previousJobId
+      : undefined;
+    const collectionId = req.body.collectionId ? Number(req.body.collectionId) : undefined;
+    if (collectionId !== undefined && !Number.isInteger(collectionId)) {
+      return res.status(400).json({ error: 'collectionId must be an integer' });
+    }
+
     // Send message to processing queue
     await queueService.sendToQueue({
       jobId,
       filePath,
       originalName: req.file?.originalname,
+      previousJobId,
+      collectionId,
       timestamp: new Date().toISOString()
     });
 